@@ -0,0 +1,179 @@
+"""Bulk cleanup that runs as background jobs instead of inside a request.
+
+Both kinds work CLEANUP_BATCH_SIZE rows per transaction, so ingest is never
+stuck behind one huge statement, and are resumable (each batch re-selects
+what is left).
+
+unlink_user_events: after a user is hard-deleted, set event_logs.user_id to
+NULL on their events (history stays, the mapping goes). Only events up to
+max_event_id (the newest id when the user was deleted) are touched: a new
+user that reuses the id keeps their own events.
+
+purge_company: after crud.delete_company marked a company deleted, remove
+its events, users (with faces, device face state and activity rows),
+devices and seen terminals, and finally the company row. Owner accounts
+are kept, unbound.
+"""
+
+import asyncio
+
+from sqlalchemy import delete, func, update
+from starlette.concurrency import run_in_threadpool
+
+from .core.config import settings
+from .core.db import SessionLocal
+from .crud import release_face_blob
+from .jobs import JobContext, job_runner
+from .models import Account, Company, CompanyDeletion, Device, DeviceFace, EventLog, Face, Terminal, User, UserActivity
+
+
+def max_event_id(db) -> int:
+    return db.query(func.max(EventLog.id)).scalar() or 0
+
+
+def _user_events(db, company_id: int, user_id: int, max_id: int):
+    return db.query(EventLog.id).filter(
+        EventLog.company_id == company_id,
+        EventLog.user_id == user_id,
+        EventLog.id <= max_id,
+    )
+
+
+def _count_linked(company_id: int, user_id: int, max_id: int) -> int:
+    db = SessionLocal()
+    try:
+        return _user_events(db, company_id, user_id, max_id).count()
+    finally:
+        db.close()
+
+
+def _unlink_batch(company_id: int, user_id: int, max_id: int, size: int) -> int:
+    db = SessionLocal()
+    try:
+        ids = [i for (i,) in _user_events(db, company_id, user_id, max_id).order_by(EventLog.id).limit(size)]
+        if ids:
+            db.execute(
+                update(EventLog)
+                .where(EventLog.id.in_(ids), EventLog.user_id == user_id)
+                .values(user_id=None)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        return len(ids)
+    finally:
+        db.close()
+
+
+async def unlink_user_events_job(ctx: JobContext) -> dict:
+    user_id = int(ctx.params["user_id"])
+    max_id = int(ctx.params["max_event_id"])
+    done = int(ctx.state.get("unlinked", 0))  # resumed: keep counting from there
+    left = await run_in_threadpool(_count_linked, ctx.company_id, user_id, max_id)
+    await ctx.progress(total=done + left, unlinked=done)
+    batches = 0
+    while True:
+        n = await run_in_threadpool(_unlink_batch, ctx.company_id, user_id, max_id, settings.CLEANUP_BATCH_SIZE)
+        if not n:
+            break
+        done += n
+        batches += 1
+        await ctx.progress(unlinked=done)
+        await asyncio.sleep(settings.CLEANUP_BATCH_PAUSE_SECONDS)
+    return {"user_id": user_id, "unlinked": done, "batches": batches}
+
+
+job_runner.register("unlink_user_events", unlink_user_events_job, resumable=True)
+
+
+def _count_company(company_id: int) -> dict:
+    db = SessionLocal()
+    try:
+        return {
+            "events": db.query(func.count(EventLog.id)).filter(EventLog.company_id == company_id).scalar(),
+            "users": db.query(func.count(User.id)).filter(User.company_id == company_id).scalar(),
+        }
+    finally:
+        db.close()
+
+
+def _purge_events(company_id: int, size: int) -> int:
+    db = SessionLocal()
+    try:
+        ids = [i for (i,) in db.query(EventLog.id).filter(EventLog.company_id == company_id).limit(size)]
+        if ids:
+            db.execute(delete(EventLog).where(EventLog.id.in_(ids)))
+            db.commit()
+        return len(ids)
+    finally:
+        db.close()
+
+
+def _purge_users(company_id: int, size: int) -> int:
+    db = SessionLocal()
+    try:
+        ids = [i for (i,) in db.query(User.id).filter(User.company_id == company_id).limit(size)]
+        if not ids:
+            return 0
+        shas = {s for (s,) in db.query(Face.sha256).filter(Face.user_id.in_(ids))}
+        db.execute(delete(DeviceFace).where(DeviceFace.user_id.in_(ids)))
+        db.execute(delete(Face).where(Face.user_id.in_(ids)))
+        db.execute(delete(UserActivity).where(UserActivity.user_id.in_(ids)))
+        db.execute(delete(User).where(User.id.in_(ids)))
+        db.commit()
+        for sha in shas:
+            release_face_blob(db, sha)
+        return len(ids)
+    finally:
+        db.close()
+
+
+def _purge_rest(company_id: int) -> int:
+    """Devices, stray per-company rows, owner bindings, then the company."""
+    db = SessionLocal()
+    try:
+        dev_ids = [i for (i,) in db.query(Device.id).filter(Device.company_id == company_id)]
+        if dev_ids:
+            db.execute(delete(DeviceFace).where(DeviceFace.device_id.in_(dev_ids)))
+            db.execute(delete(Device).where(Device.id.in_(dev_ids)))
+        shas = {s for (s,) in db.query(Face.sha256).filter(Face.company_id == company_id)}
+        db.execute(delete(Face).where(Face.company_id == company_id))
+        db.execute(delete(UserActivity).where(UserActivity.company_id == company_id))
+        db.execute(delete(Terminal).where(Terminal.company_id == company_id))
+        db.execute(update(Account).where(Account.company_id == company_id).values(company_id=None))
+        db.execute(delete(CompanyDeletion).where(CompanyDeletion.company_id == company_id))
+        db.execute(delete(Company).where(Company.id == company_id))
+        db.commit()
+        for sha in shas:
+            release_face_blob(db, sha)
+        return len(dev_ids)
+    finally:
+        db.close()
+
+
+async def _in_batches(ctx: JobContext, fn, field: str) -> int:
+    done = int(ctx.state.get(field, 0))
+    while True:
+        n = await run_in_threadpool(fn, ctx.company_id, settings.CLEANUP_BATCH_SIZE)
+        if not n:
+            return done
+        done += n
+        await ctx.progress(**{field: done})
+        await asyncio.sleep(settings.CLEANUP_BATCH_PAUSE_SECONDS)
+
+
+async def purge_company_job(ctx: JobContext) -> dict:
+    left = await run_in_threadpool(_count_company, ctx.company_id)
+    await ctx.progress(
+        events_total=left["events"] + int(ctx.state.get("events_deleted", 0)),
+        users_total=left["users"] + int(ctx.state.get("users_deleted", 0)),
+        phase="events",
+    )
+    events = await _in_batches(ctx, _purge_events, "events_deleted")
+    await ctx.progress(phase="users")
+    users = await _in_batches(ctx, _purge_users, "users_deleted")
+    await ctx.progress(phase="company")
+    devices = await run_in_threadpool(_purge_rest, ctx.company_id)
+    return {"events_deleted": events, "users_deleted": users, "devices_deleted": devices}
+
+
+job_runner.register("purge_company", purge_company_job, resumable=True)
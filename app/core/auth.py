@@ -1,11 +1,16 @@
+import asyncio
 import base64
 import datetime as dt
 import hashlib
 import hmac
+import json
 import os
 import secrets
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
 
+from starlette.concurrency import run_in_threadpool
+
 from .config import settings
 
 
@@ -19,37 +24,146 @@ def hash_password(password: str) -> str:
 
     Format: pbkdf2_sha256$<iterations>$<salt_b64>$<dk_b64>
     """
-    if not isinstance(password, str) or len(password) < 6:
-        raise ValueError("password too short")
-
+    _check_password(password)
     salt = os.urandom(16)
     iters = int(settings.PASSWORD_PBKDF2_ITERATIONS)
-    dk = hashlib.pbkdf2_hmac(PBKDF2_ALG, password.encode("utf-8"), salt, iters, dklen=32)
-    return "pbkdf2_sha256$%d$%s$%s" % (
-        iters,
-        base64.urlsafe_b64encode(salt).decode("ascii").rstrip("="),
-        base64.urlsafe_b64encode(dk).decode("ascii").rstrip("="),
-    )
+    return _format_hash(iters, salt, _derive(password, salt, iters, 32))
 
 
 def verify_password(password: str, stored: str) -> bool:
     try:
-        kind, iters_s, salt_b64, dk_b64 = stored.split("$", 3)
-        if kind != "pbkdf2_sha256":
+        parsed = _parse_hash(stored)
+        if parsed is None:
             return False
-        iters = int(iters_s)
-        salt = base64.urlsafe_b64decode(_pad_b64(salt_b64))
-        dk_stored = base64.urlsafe_b64decode(_pad_b64(dk_b64))
-        dk = hashlib.pbkdf2_hmac(PBKDF2_ALG, password.encode("utf-8"), salt, iters, dklen=len(dk_stored))
-        return hmac.compare_digest(dk, dk_stored)
+        iters, salt, dk_stored = parsed
+        return hmac.compare_digest(_derive(password, salt, iters, len(dk_stored)), dk_stored)
     except Exception:
         return False
 
 
+def needs_rehash(stored: str) -> bool:
+    """True if `stored` was made with other params than the current settings."""
+    try:
+        parsed = _parse_hash(stored)
+    except Exception:
+        return True
+    return parsed is None or parsed[0] != int(settings.PASSWORD_PBKDF2_ITERATIONS)
+
+
+def _check_password(password: str) -> None:
+    if not isinstance(password, str) or len(password) < 6:
+        raise ValueError("password too short")
+
+
+def _derive(password: str, salt: bytes, iters: int, dklen: int) -> bytes:
+    # Module-level so it can be pickled into a ProcessPoolExecutor.
+    return hashlib.pbkdf2_hmac(PBKDF2_ALG, password.encode("utf-8"), salt, iters, dklen=dklen)
+
+
+def _parse_hash(stored: str) -> tuple[int, bytes, bytes] | None:
+    kind, iters_s, salt_b64, dk_b64 = stored.split("$", 3)
+    if kind != "pbkdf2_sha256":
+        return None
+    return (
+        int(iters_s),
+        base64.urlsafe_b64decode(_pad_b64(salt_b64)),
+        base64.urlsafe_b64decode(_pad_b64(dk_b64)),
+    )
+
+
+def _format_hash(iters: int, salt: bytes, dk: bytes) -> str:
+    return "pbkdf2_sha256$%d$%s$%s" % (
+        iters,
+        base64.urlsafe_b64encode(salt).decode("ascii").rstrip("="),
+        base64.urlsafe_b64encode(dk).decode("ascii").rstrip("="),
+    )
+
+
 def _pad_b64(s: str) -> str:
     return s + "=" * (-len(s) % 4)
 
 
+# ===== Hashing pool =====
+
+class HashPoolBusy(Exception):
+    """Too many password hashes queued; mapped to 503 in app.main."""
+
+
+class PasswordHashPool:
+    """Bounded executor for PBKDF2 so logins don't occupy the API threadpool.
+
+    kind:
+      - process: ProcessPoolExecutor (default, no GIL contention)
+      - thread: dedicated ThreadPoolExecutor
+      - threadpool: the shared Starlette/anyio threadpool (old behaviour)
+
+    At most `max_pending` hashes may be running or queued; the next caller
+    gets HashPoolBusy immediately instead of waiting.
+    """
+
+    def __init__(self, kind: str, workers: int, max_pending: int) -> None:
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self._executor: Executor | None = None
+        self._pending = 0  # only touched from the event loop thread
+        self.rejected = 0
+
+    def _get_executor(self) -> Executor | None:
+        if self.kind == "threadpool":
+            return None
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pbkdf2")
+        return self._executor
+
+    async def _run(self, password: str, salt: bytes, iters: int, dklen: int) -> bytes:
+        if self._pending >= self.max_pending:
+            self.rejected += 1
+            raise HashPoolBusy()
+        self._pending += 1
+        try:
+            ex = self._get_executor()
+            if ex is None:
+                return await run_in_threadpool(_derive, password, salt, iters, dklen)
+            return await asyncio.get_running_loop().run_in_executor(ex, _derive, password, salt, iters, dklen)
+        finally:
+            self._pending -= 1
+
+    async def hash_password(self, password: str) -> str:
+        _check_password(password)
+        salt = os.urandom(16)
+        iters = int(settings.PASSWORD_PBKDF2_ITERATIONS)
+        return _format_hash(iters, salt, await self._run(password, salt, iters, 32))
+
+    async def verify_password(self, password: str, stored: str) -> bool:
+        try:
+            parsed = _parse_hash(stored)
+        except Exception:
+            return False
+        if parsed is None:
+            return False
+        iters, salt, dk_stored = parsed
+        return hmac.compare_digest(await self._run(password, salt, iters, len(dk_stored)), dk_stored)
+
+    def stats(self) -> dict:
+        return {"kind": self.kind, "workers": self.workers, "pending": self._pending, "rejected": self.rejected}
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hash_pool = PasswordHashPool(
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
+
+
 # ===== Session token =====
 
 def new_token() -> str:
@@ -66,6 +180,62 @@ def expires_at(hours: int | None = None) -> dt.datetime:
     return dt.datetime.now(dt.timezone.utc) + dt.timedelta(hours=h)
 
 
+# ===== Signed access tokens (AUTH_TOKEN_MODE=signed) =====
+
+SIGNED_TOKEN_PREFIX = "v1."
+
+
+def is_signed_token(token: str) -> bool:
+    # Opaque session tokens are token_urlsafe() and never contain "."
+    return token.startswith(SIGNED_TOKEN_PREFIX)
+
+
+def _signing_key() -> bytes:
+    secret = settings.AUTH_TOKEN_SECRET
+    if not secret:
+        raise RuntimeError("AUTH_TOKEN_SECRET must be set when AUTH_TOKEN_MODE=signed")
+    return secret.encode("utf-8")
+
+
+def _b64e(b: bytes) -> str:
+    return base64.urlsafe_b64encode(b).decode("ascii").rstrip("=")
+
+
+def new_signed_token(
+    *, account_id: int, username: str, role: str, company_id: int | None, exp: dt.datetime
+) -> tuple[str, dict]:
+    """Return (token, claims). Token: v1.<claims_b64>.<hmac_sha256_b64>"""
+    claims = {
+        "a": account_id,
+        "u": username,
+        "r": role,
+        "c": company_id,
+        "iat": int(dt.datetime.now(dt.timezone.utc).timestamp() * 1000),  # ms
+        "exp": int(exp.timestamp()),
+        "jti": secrets.token_hex(8),
+    }
+    body = SIGNED_TOKEN_PREFIX + _b64e(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    sig = hmac.new(_signing_key(), body.encode("ascii"), hashlib.sha256).digest()
+    return body + "." + _b64e(sig), claims
+
+
+def verify_signed_token(token: str) -> dict | None:
+    """Return the claims of a valid, unexpired signed token (no DB access)."""
+    try:
+        body, sig_b64 = token.rsplit(".", 1)
+        sig = hmac.new(_signing_key(), body.encode("ascii"), hashlib.sha256).digest()
+        if not hmac.compare_digest(sig, base64.urlsafe_b64decode(_pad_b64(sig_b64))):
+            return None
+        claims = json.loads(base64.urlsafe_b64decode(_pad_b64(body[len(SIGNED_TOKEN_PREFIX):])))
+        if int(claims["exp"]) <= dt.datetime.now(dt.timezone.utc).timestamp():
+            return None
+        return claims
+    except RuntimeError:
+        raise
+    except Exception:
+        return None
+
+
 @dataclass
 class AuthResult:
     token: str
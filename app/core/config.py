@@ -5,12 +5,40 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
     DATABASE_URL: str
+    # Optional read replica for heavy read endpoints (events, attendance, user
+    # and admin listings); empty = everything on DATABASE_URL. Ranges ending
+    # within READ_REPLICA_MAX_LAG_SECONDS of now are still read from the
+    # primary, since the replica may not have those rows yet.
+    DATABASE_READ_URL: str = ""
+    READ_REPLICA_MAX_LAG_SECONDS: float = 10.0
 
 
     AUTH_TOKEN_TTL_HOURS: int = 24
+    # session: opaque tokens looked up in account_sessions
+    # signed: HMAC-signed tokens verified without DB access (needs AUTH_TOKEN_SECRET,
+    #         identical on every worker); revocations synced via token_revocations
+    AUTH_TOKEN_MODE: str = "session"
+    AUTH_TOKEN_SECRET: str = ""
+    TOKEN_REVOCATION_SYNC_SECONDS: int = 5
+
+    # In-process session cache (0 disables). Entries never outlive expires_at.
+    SESSION_CACHE_TTL_SECONDS: int = 60
+    SESSION_CACHE_MAX_ENTRIES: int = 10_000
+    # How often buffered last_seen_at touches are written to account_sessions
+    SESSION_TOUCH_FLUSH_SECONDS: int = 30
+    # Expired account_sessions cleanup
+    SESSION_SWEEP_INTERVAL_SECONDS: int = 300
+    SESSION_SWEEP_BATCH: int = 1000
+    # Concurrent sessions per account; the oldest are evicted on login (0 = unlimited)
+    MAX_SESSIONS_PER_ACCOUNT: int = 20
 
     # PBKDF2 params
     PASSWORD_PBKDF2_ITERATIONS: int = 200_000
+    # Password hashing executor: process|thread|threadpool (shared API threadpool)
+    PASSWORD_HASH_EXECUTOR: str = "process"
+    PASSWORD_HASH_WORKERS: int = 2
+    # Hashes running + queued before new ones get 503
+    PASSWORD_HASH_MAX_PENDING: int = 32
 
     ROOT_ADMIN_USERNAME: str = "admin"
     ROOT_ADMIN_PASSWORD: str = ""  
@@ -18,8 +46,84 @@ class Settings(BaseSettings):
 
     COMPANY_TZ: str = "Asia/Tashkent"
 
+    # Pushing users to the company's terminals (ISAPI UserInfo/Record, Delete)
+    PROVISIONING_ENABLED: bool = True
+    PROVISION_WORKERS: int = 4
+    PROVISION_DEVICE_CONCURRENCY: int = 2  # in-flight requests per terminal
+    PROVISION_RETRIES: int = 3
+    PROVISION_BACKOFF_SECONDS: float = 0.5
+    PROVISION_TIMEOUT_SECONDS: float = 10.0
+
+    # Device roster reconciliation: UserInfo/Search page size, users per Delete call
+    RECONCILE_PAGE_SIZE: int = 30
+    RECONCILE_DELETE_BATCH: int = 50
+
+    # Background jobs (table `jobs`): progress write cadence, and how long an
+    # active job may go untouched before another worker adopts (or fails) it
+    JOB_PROGRESS_FLUSH_SECONDS: float = 1.0
+    JOB_STALE_SECONDS: int = 60
+    JOB_ADOPT_INTERVAL_SECONDS: int = 30
+    # Bulk cleanup jobs (user delete, company purge): rows per
+    # transaction, and a pause between batches to leave room for ingest
+    CLEANUP_BATCH_SIZE: int = 1000
+    CLEANUP_BATCH_PAUSE_SECONDS: float = 0.02
+
+    # Enrollment photos, stored content-addressed (<dir>/ab/<sha256>.jpg).
+    # Terminals reject faces over ~200 KB.
+    FACE_STORAGE_DIR: str = "data/faces"
+    FACE_MAX_BYTES: int = 200 * 1024
+
+    # POST /companies/{id}/users/import
+    USER_IMPORT_MAX_ROWS: int = 10_000
+    USER_IMPORT_BATCH_SIZE: int = 500
+
+    # Realtime websocket fan-out: per-client outbound queue and send timeout
+    WS_SEND_QUEUE_SIZE: int = 256
+    WS_SEND_TIMEOUT_SECONDS: float = 10.0
+    # Include the raw Hikvision payload in events.access messages
+    WS_INCLUDE_PAYLOAD: bool = True
+
+    # Terminals seen on the webhook: how often buffered last-seen times and
+    # event counts are written to `terminals`, and after how long without a
+    # post a terminal is reported offline
+    DEVICE_FLUSH_SECONDS: float = 10.0
+    DEVICE_OFFLINE_SECONDS: int = 300
+    # Recent messages kept per company for ?since=<seq> resume, and how long a
+    # company's buffer outlives its last connected client
+    WS_REPLAY_BUFFER_SIZE: int = 200
+    WS_REPLAY_RETENTION_SECONDS: int = 600
+    # Server ws.ping cadence; clients that answer (pong) and then go silent
+    # for WS_IDLE_TIMEOUT_SECONDS are reaped. 0 disables either.
+    WS_PING_INTERVAL_SECONDS: float = 25
+    WS_IDLE_TIMEOUT_SECONDS: float = 75
+    # Cross-worker fan-out: "memory" (single worker), "postgres" (LISTEN/NOTIFY)
+    # or "unix" (local broker socket shared by all workers on the host)
+    WS_BACKEND: str = "memory"
+    WS_PG_URL: str = ""  # defaults to DATABASE_URL
+    WS_PG_CHANNEL: str = "faceid_ws"
+    WS_PG_BATCH_MS: int = 20
+    WS_UNIX_SOCKET: str = "/tmp/faceid-ws.sock"
+
     LOG_DIR: str = "logs"
     LOG_LEVEL: str = "INFO"
+    # "text" or "json" (one object per line with request_id/company_id/route)
+    LOG_FORMAT: str = "text"
+    # One record per HTTP request (method, status, latency_ms) under app.access.*
+    LOG_REQUESTS: bool = False
+    # Keep only a fraction of sub-WARNING records per logger, e.g.
+    # "app.access.hooks=0.05,app.ws=0.5"
+    LOG_SAMPLING: str = ""
+    # Records beyond this many pending writes are dropped, never waited on
+    LOG_QUEUE_SIZE: int = 10000
+
+    # Per-request SQL profiling (statements, SQL vs Python time, rows) with
+    # per-route totals under /admin/profiling. Requests slower than
+    # SLOW_REQUEST_MS are logged to app.slow with up to PROFILE_MAX_QUERIES
+    # of their statements; the last SLOW_REQUEST_KEEP are kept in memory.
+    PROFILING_ENABLED: bool = True
+    SLOW_REQUEST_MS: float = 1000.0
+    SLOW_REQUEST_KEEP: int = 100
+    PROFILE_MAX_QUERIES: int = 50
 
 
 settings = Settings()
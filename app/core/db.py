@@ -1,17 +1,56 @@
+import datetime as dt
+
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
 from .config import settings
 
 engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 
+# Read replica (own pool). Without DATABASE_READ_URL it is the primary engine.
+read_engine = create_engine(settings.DATABASE_READ_URL, pool_pre_ping=True) if settings.DATABASE_READ_URL else engine
+ReadSessionLocal = sessionmaker(bind=read_engine, autoflush=False, autocommit=False)
+
 class Base(DeclarativeBase):
     pass
 
+def release_connection(db: Session, *objs) -> None:
+    """End the current transaction so its pooled connection goes back to the pool.
+
+    `objs` are detached first so they stay readable (not expired) while the
+    caller awaits something slow; `db.add()` re-attaches them afterwards.
+    """
+    for o in objs:
+        if o is not None and o in db:
+            db.expunge(o)
+    db.rollback()
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+def get_read_db():
+    """Session on the read replica, for endpoints that only read and can
+    tolerate replication lag. Never write through it."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def route_recent_to_primary(db: Session, until: dt.datetime | None) -> None:
+    """Lag guard for a get_read_db session: if the queried range reaches
+    into the last READ_REPLICA_MAX_LAG_SECONDS (or is open-ended), point
+    the session at the primary. Call it before the first query."""
+    if read_engine is engine:
+        return
+    fresh = dt.datetime.now(dt.timezone.utc) - dt.timedelta(seconds=settings.READ_REPLICA_MAX_LAG_SECONDS)
+    if until is None or until > fresh:
+        db.bind = engine
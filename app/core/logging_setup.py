@@ -1,11 +1,191 @@
+import asyncio
+import copy
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import threading
+import queue
+import random
+import time
+import uuid
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+import orjson
 
 from .config import settings
 
+# Per-request log context: {"id": ..., "scope": ASGI scope, "company_id": ...}.
+# The scope dict is the one starlette's router fills in place (route,
+# path_params), so records logged inside an endpoint see them.
+_request: ContextVar[dict | None] = ContextVar("log_request", default=None)
+
+_listener: QueueListener | None = None
+
+
+class _ContextFilter(logging.Filter):
+    """Stamp request_id / company_id / route onto every record (caller thread)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        ctx = _request.get()
+        if ctx is None:
+            record.request_id = record.company_id = record.route = None
+            return True
+        scope = ctx["scope"]
+        route = scope.get("route")
+        record.request_id = ctx["id"]
+        record.route = getattr(route, "path", None)
+        company_id = ctx.get("company_id") or scope.get("path_params", {}).get("company_id")
+        # raw path param: /companies/abc/... must not make logging raise
+        record.company_id = int(company_id) if str(company_id).isdigit() else None
+        return True
+
+
+class _SamplingFilter(logging.Filter):
+    """Keep only a fraction of records below WARNING for the configured loggers.
+
+    `rates` maps a logger name to the fraction kept; the longest matching
+    prefix wins ("app.access.hooks" beats "app.access").
+    """
+
+    def __init__(self, rates: dict[str, float]) -> None:
+        super().__init__()
+        self.rates = sorted(rates.items(), key=lambda kv: -len(kv[0]))
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        name = record.name
+        for prefix, rate in self.rates:
+            if name == prefix or name.startswith(prefix + "."):
+                if random.random() < rate:
+                    return True
+                self.dropped += 1
+                return False
+        return True
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """Never block the caller: when the queue is full the record is dropped.
+
+    The caller thread only merges args into the message and renders the
+    traceback to exc_text; the configured formatter runs on the listener.
+    """
+
+    def __init__(self, q: queue.Queue) -> None:
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler.prepare formats with the default formatter, which puts
+        # the traceback into msg and leaves nothing for JsonFormatter's "exc"
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = record.exc_text or logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg + request context."""
+
+    _EXTRA = ("request_id", "company_id", "route", "method", "status", "latency_ms")
+
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + ".%03dZ" % record.msecs,
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k in self._EXTRA:
+            v = getattr(record, k, None)
+            if v is not None:
+                out[k] = v
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        return orjson.dumps(out).decode("utf-8")
+
+
+JsonFormatter.converter = time.gmtime
+
+
+class LogFollower(logging.Handler):
+    """Fan formatted records out to live followers (GET /logs/follow).
+
+    Runs on the listener thread next to the file handler, so followers see
+    exactly what is written, pushed as it happens rather than polled. Only
+    records of this process are seen.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._subs: set[tuple] = set()
+        self._subs_lock = threading.Lock()
+        self.dropped = 0
+
+    def subscribe(self, min_level: int, needle: str | None, maxsize: int = 1000) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        with self._subs_lock:
+            self._subs.add((asyncio.get_running_loop(), q, min_level, needle))
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue) -> None:
+        with self._subs_lock:
+            self._subs = {s for s in self._subs if s[1] is not q}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if not self._subs:
+            return
+        line = None
+        for loop, q, min_level, needle in list(self._subs):
+            if record.levelno < min_level:
+                continue
+            if line is None:
+                line = self.format(record)
+            if needle is not None and needle not in line:
+                continue
+            try:
+                loop.call_soon_threadsafe(self._put, q, line)
+            except RuntimeError:
+                self.unsubscribe(q)  # follower's loop is gone
+
+    def _put(self, q: asyncio.Queue, line: str) -> None:
+        try:
+            q.put_nowait(line)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+
+log_follower = LogFollower()
+
+
+def _parse_sampling(spec: str) -> dict[str, float]:
+    """"app.access.hooks=0.05,app.hikvision=0.1" -> {name: rate}."""
+    rates = {}
+    for part in (spec or "").split(","):
+        if "=" not in part:
+            continue
+        name, rate = part.split("=", 1)
+        rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
 
 def setup_logging() -> None:
+    """Route all records through a queue; a background listener thread does
+    the formatting and the (rotating) file writes."""
+    global _listener
+
     log_dir = settings.LOG_DIR
     os.makedirs(log_dir, exist_ok=True)
 
@@ -17,15 +197,17 @@ def setup_logging() -> None:
 
     root.setLevel(level)
 
-    fmt = logging.Formatter(
-        fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
+    if settings.LOG_FORMAT == "json":
+        fmt: logging.Formatter = JsonFormatter()
+    else:
+        fmt = logging.Formatter(
+            fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
 
     sh = logging.StreamHandler()
     sh.setLevel(level)
     sh.setFormatter(fmt)
-    root.addHandler(sh)
 
     fh = RotatingFileHandler(
         os.path.join(log_dir, "app.log"),
@@ -35,6 +217,95 @@ def setup_logging() -> None:
     )
     fh.setLevel(level)
     fh.setFormatter(fmt)
-    root.addHandler(fh)
+
+    log_follower.setLevel(level)
+    log_follower.setFormatter(fmt)
+
+    qh = _DroppingQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    qh.addFilter(_ContextFilter())
+    rates = _parse_sampling(settings.LOG_SAMPLING)
+    if rates:
+        qh.addFilter(_SamplingFilter(rates))
+    root.addHandler(qh)
+
+    _listener = QueueListener(qh.queue, sh, fh, log_follower, respect_handler_level=True)
+    _listener.start()
 
     root._faceid_configured = True
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread (app shutdown).
+
+    setup_logging() runs again on the next startup in the same process.
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for h in _listener.handlers:
+            if h is not log_follower:
+                h.close()
+        _listener = None
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        if isinstance(h, _DroppingQueueHandler):
+            root.removeHandler(h)
+    root._faceid_configured = False
+
+
+def bind_log_context(**fields) -> None:
+    """Attach fields (e.g. company_id resolved from an edge key) to this request's logs."""
+    ctx = _request.get()
+    if ctx is not None:
+        ctx.update(fields)
+
+
+class RequestLogMiddleware:
+    """Give each HTTP request an id (X-Request-ID, echoed back) for log context.
+
+    With LOG_REQUESTS on, one record per request (method, status, latency_ms)
+    goes to "app.access.<first path segment>", so e.g. the webhook traffic
+    ("app.access.hooks") can be sampled on its own.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self.log_requests = settings.LOG_REQUESTS
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        rid = None
+        for k, v in scope.get("headers", ()):
+            if k == b"x-request-id":
+                rid = v.decode("latin-1")[:64] or None
+                break
+        ctx = {"id": rid or uuid.uuid4().hex[:16], "scope": scope}
+        token = _request.set(ctx)
+        started = time.perf_counter()
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = [*message.get("headers", ()), (b"x-request-id", ctx["id"].encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            if self.log_requests:
+                latency_ms = round((time.perf_counter() - started) * 1000, 2)
+                segment = scope["path"].strip("/").split("/", 1)[0] or "root"
+                logging.getLogger(f"app.access.{segment}").log(
+                    logging.WARNING if status >= 500 else logging.INFO,
+                    "%s %s %s %.1fms",
+                    scope["method"],
+                    scope["path"],
+                    status,
+                    latency_ms,
+                    extra={"method": scope["method"], "status": status, "latency_ms": latency_ms},
+                )
+            _request.reset(token)
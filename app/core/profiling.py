@@ -0,0 +1,224 @@
+"""Per-request SQL profiling.
+
+ProfilingMiddleware opens a profile for each HTTP request; engine events
+(attached by `instrument(engine)`) add every statement run while it is
+open: count, time inside the driver, rows fetched (SELECT) or affected
+(DML), and the first PROFILE_MAX_QUERIES statements. Sync endpoints run in
+the threadpool with a copy of the request context, so the ContextVar finds
+the same profile there.
+
+At the end of the request the numbers are folded into per-route totals
+(route template, e.g. "/companies/{company_id}/events") for
+GET /admin/profiling/routes; requests slower than SLOW_REQUEST_MS are
+logged to "app.slow" with their statements and kept for
+GET /admin/profiling/slow.
+"""
+
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from .config import settings
+
+log = logging.getLogger("app.slow")
+
+
+class _Profile:
+    __slots__ = ("active", "statements", "commits", "rows", "sql_s", "queries")
+
+    def __init__(self) -> None:
+        self.active = True
+        self.statements = 0
+        self.commits = 0
+        self.rows = 0
+        self.sql_s = 0.0
+        self.queries: list[tuple[str, float, int]] = []
+
+
+_current: ContextVar[_Profile | None] = ContextVar("sql_profile", default=None)
+
+
+class _CountingCursor:
+    """Wraps a DBAPI cursor to count the rows SQLAlchemy fetches from it."""
+
+    __slots__ = ("_cursor", "_prof", "_i")
+
+    def __init__(self, cursor, prof: _Profile, i: int | None) -> None:
+        self._cursor = cursor
+        self._prof = prof
+        self._i = i
+
+    def _add(self, n: int) -> None:
+        self._prof.rows += n
+        if self._i is not None:
+            sql, ms, rows = self._prof.queries[self._i]
+            self._prof.queries[self._i] = (sql, ms, rows + n)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._add(1)
+        return row
+
+    def fetchmany(self, *args):
+        rows = self._cursor.fetchmany(*args)
+        self._add(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._add(len(rows))
+        return rows
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    # On the execution context, not conn.info: it goes away with the
+    # statement even when the statement raises (after_execute never runs).
+    if context is not None and _current.get() is not None:
+        context._profile_started = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    prof = _current.get()
+    started = getattr(context, "_profile_started", None)
+    if prof is None or started is None:
+        return
+    took = time.perf_counter() - started
+    if not prof.active:
+        return  # a task spawned by a request that has already finished
+    prof.statements += 1
+    prof.sql_s += took
+    i = None
+    if len(prof.queries) < settings.PROFILE_MAX_QUERIES:
+        i = len(prof.queries)
+        prof.queries.append((statement, round(took * 1000, 3), 0))
+    if cursor.description is not None and context is not None:
+        context.cursor = _CountingCursor(cursor, prof, i)
+    elif cursor.rowcount and cursor.rowcount > 0:
+        prof.rows += cursor.rowcount
+        if i is not None:
+            prof.queries[i] = (statement, prof.queries[i][1], cursor.rowcount)
+
+
+def _commit(conn):
+    prof = _current.get()
+    if prof is not None and prof.active:
+        prof.commits += 1
+
+
+def instrument(engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    event.listen(engine, "commit", _commit)
+
+
+class RouteStats:
+    """Per-route totals since start (or the last reset) and recent slow requests."""
+
+    def __init__(self, slow_keep: int) -> None:
+        self.routes: dict[tuple[str, str], dict] = {}
+        self.slow: deque = deque(maxlen=slow_keep)
+
+    def add(self, method: str, route: str, status: int, total_s: float, prof: _Profile) -> None:
+        s = self.routes.get((method, route))
+        if s is None:
+            s = self.routes[(method, route)] = {
+                "method": method, "route": route, "count": 0, "total_ms": 0.0, "sql_ms": 0.0,
+                "statements": 0, "commits": 0, "rows": 0, "max_ms": 0.0, "max_statements": 0,
+            }
+        total_ms = total_s * 1000
+        s["count"] += 1
+        s["total_ms"] += total_ms
+        s["sql_ms"] += prof.sql_s * 1000
+        s["statements"] += prof.statements
+        s["commits"] += prof.commits
+        s["rows"] += prof.rows
+        s["max_ms"] = max(s["max_ms"], total_ms)
+        s["max_statements"] = max(s["max_statements"], prof.statements)
+
+    def top(self, order: str, limit: int) -> list[dict]:
+        out = []
+        for s in self.routes.values():
+            n = s["count"]
+            out.append({
+                **s,
+                "total_ms": round(s["total_ms"], 1),
+                "sql_ms": round(s["sql_ms"], 1),
+                "python_ms": round(s["total_ms"] - s["sql_ms"], 1),
+                "max_ms": round(s["max_ms"], 1),
+                "avg_ms": round(s["total_ms"] / n, 2),
+                "avg_statements": round(s["statements"] / n, 2),
+                "avg_rows": round(s["rows"] / n, 1),
+            })
+        out.sort(key=lambda x: x[order], reverse=True)
+        return out[:limit]
+
+    def reset(self) -> None:
+        self.routes.clear()
+        self.slow.clear()
+
+
+route_stats = RouteStats(slow_keep=settings.SLOW_REQUEST_KEEP)
+
+
+class ProfilingMiddleware:
+    """Profile each HTTP request (see module docstring). Sits inside
+    RequestLogMiddleware so slow-request records carry the request id."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        prof = _Profile()
+        token = _current.set(prof)
+        started = time.perf_counter()
+        status = 500
+
+        async def _send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            prof.active = False
+            _current.reset(token)
+            total_s = time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", None) or "(unmatched)"
+            route_stats.add(scope["method"], route, status, total_s, prof)
+            if total_s * 1000 >= settings.SLOW_REQUEST_MS:
+                self._slow(scope, route, status, total_s, prof)
+
+    @staticmethod
+    def _slow(scope, route: str, status: int, total_s: float, prof: _Profile) -> None:
+        entry = {
+            "at": time.time(),
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": route,
+            "status": status,
+            "total_ms": round(total_s * 1000, 1),
+            "sql_ms": round(prof.sql_s * 1000, 1),
+            "statements": prof.statements,
+            "commits": prof.commits,
+            "rows": prof.rows,
+            "queries": [{"sql": q[:500], "ms": ms, "rows": rows} for q, ms, rows in prof.queries],
+        }
+        route_stats.slow.append(entry)
+        log.warning(
+            "slow request %s %s %s %.1fms: %d statements (%.1fms SQL), %d rows\n%s",
+            scope["method"], scope["path"], status, entry["total_ms"], prof.statements, entry["sql_ms"], prof.rows,
+            "\n".join(f"  {ms:8.2f}ms {rows:6} rows  {' '.join(q.split())[:300]}" for q, ms, rows in prof.queries),
+            extra={"latency_ms": entry["total_ms"], "statements": prof.statements, "status": status},
+        )
@@ -0,0 +1,18 @@
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson.
+
+    Endpoints that build plain dicts/lists return this directly, so FastAPI
+    skips the `response_model` re-validation and the stdlib encoder.
+    `response_model` is still declared on the route for OpenAPI docs.
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
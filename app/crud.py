@@ -1,11 +1,23 @@
-from sqlalchemy import func
+from sqlalchemy import bindparam, exists, func, insert, update
 import datetime as dt
 
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 
+from .core.config import settings
 from .core.security import gen_api_key
-from .core.auth import hash_password, new_token, token_hash, expires_at
-from .models import Company, User, Account, AccountSession
+from .core.auth import (
+    hash_password,
+    new_token,
+    token_hash,
+    expires_at,
+    is_signed_token,
+    new_signed_token,
+    verify_signed_token,
+)
+from .face_store import face_store
+from .models import Company, CompanyDeletion, User, Account, AccountSession, TokenRevocation, Face, DeviceFace
+from .session_cache import session_cache
+from .token_revocations import revocations
 
 
 # ==========================
@@ -20,8 +32,13 @@ def create_company(db: Session, name: str) -> Company:
     return c
 
 
+def _live_company():
+    # Companies being purged (CompanyDeletion row) are gone as far as lookups go.
+    return ~exists().where(CompanyDeletion.company_id == Company.id)
+
+
 def list_companies(db: Session, q: str | None, page: int, limit: int) -> tuple[int, list[Company]]:
-    qry = db.query(Company)
+    qry = db.query(Company).filter(_live_company())
     if q:
         qn = f"%{q.strip().lower()}%"
         qry = qry.filter(func.lower(Company.name).like(qn))
@@ -54,24 +71,31 @@ def update_company(
 
 
 def delete_company(db: Session, company_id: int) -> bool:
-    c = get_company(db, company_id)
-    if not c:
+    """Mark the company deleted: from the commit on, its id, api_key and
+    edge_key resolve to nothing and its owners are logged out. The data is
+    removed by the "purge_company" job (cleanup.py). Marking a company that
+    is already being purged again is allowed (restarts a lost purge)."""
+    if db.get(Company, company_id) is None:
         return False
-    db.delete(c)
+    if db.get(CompanyDeletion, company_id) is None:
+        db.add(CompanyDeletion(company_id=company_id))
+    owner_ids = [x[0] for x in db.query(Account.id).filter(Account.company_id == company_id).all()]
     db.commit()
+    for acc_id in owner_ids:
+        _revoke_account_tokens(db, acc_id)
     return True
 
 
 def get_company_by_api_key(db: Session, api_key: str) -> Company | None:
-    return db.query(Company).filter(Company.api_key == api_key).first()
+    return db.query(Company).filter(Company.api_key == api_key, _live_company()).first()
 
 
 def get_company_by_edge_key(db: Session, edge_key: str) -> Company | None:
-    return db.query(Company).filter(Company.edge_key == edge_key).first()
+    return db.query(Company).filter(Company.edge_key == edge_key, _live_company()).first()
 
 
 def get_company(db: Session, company_id: int) -> Company | None:
-    return db.query(Company).filter(Company.id == company_id).first()
+    return db.query(Company).filter(Company.id == company_id, _live_company()).first()
 
 
 # ==========================
@@ -82,9 +106,33 @@ def get_account_by_username(db: Session, username: str) -> Account | None:
     return db.query(Account).filter(Account.username == username).first()
 
 
+def get_account_by_token(db: Session, token: str) -> Account | None:
+    """Resolve a bearer token in either AUTH_TOKEN_MODE.
+
+    Opaque session tokens keep working in signed mode, so switching modes
+    does not log everyone out.
+    """
+    if settings.AUTH_TOKEN_MODE == "signed" and is_signed_token(token):
+        claims = verify_signed_token(token)
+        if not claims or revocations.is_revoked(claims):
+            return None
+        return _account_from_claims(db, claims)
+    return get_account_by_session_token(db, token)
+
+
+def _account_from_claims(db: Session, claims: dict) -> Account:
+    # Columns not carried in the token (password_hash, ...) lazy-load on access.
+    acc = Account(id=claims["a"], username=claims["u"], role=claims["r"], company_id=claims["c"], is_active=True)
+    make_transient_to_detached(acc)
+    return db.merge(acc, load=False)
+
+
 def get_account_by_session_token(db: Session, token: str) -> Account | None:
     th = token_hash(token)
     now = dt.datetime.now(dt.timezone.utc)
+    acc = session_cache.get(db, th, now)
+    if acc is not None:
+        return acc
     sess = (
         db.query(AccountSession)
         .filter(AccountSession.token_hash == th, AccountSession.expires_at > now)
@@ -95,10 +143,9 @@ def get_account_by_session_token(db: Session, token: str) -> Account | None:
     acc = db.get(Account, sess.account_id)
     if not acc or not acc.is_active:
         return None
-    # touch
-    sess.last_seen_at = now
-    db.add(sess)
-    db.commit()
+    # touch (write-behind, see SessionCache.flush_touches)
+    session_cache.touch(sess.id, now)
+    session_cache.put(th, sess, acc, now)
     return acc
 
 
@@ -115,13 +162,104 @@ def create_session(db: Session, acc: Account, *, user_agent: str | None = None,
     acc.last_login_at = dt.datetime.now(dt.timezone.utc)
     db.add(sess)
     db.add(acc)
+    db.flush()
+    evicted = _evict_oldest_sessions(db, acc.id, settings.MAX_SESSIONS_PER_ACCOUNT)
     db.commit()
+    for th in evicted:
+        session_cache.invalidate_token(th)
     return token, exp
 
 
+def create_signed_token(db: Session, acc: Account) -> tuple[str, dt.datetime]:
+    exp = expires_at()
+    token, _claims = new_signed_token(
+        account_id=acc.id, username=acc.username, role=acc.role, company_id=acc.company_id, exp=exp
+    )
+    acc.last_login_at = dt.datetime.now(dt.timezone.utc)
+    db.add(acc)
+    db.commit()
+    return token, exp
+
+
+def revoke_access_token(db: Session, token: str) -> bool:
+    if is_signed_token(token):
+        claims = verify_signed_token(token)
+        if not claims:
+            return False
+        revocations.revoke_token(db, claims)
+        return True
+    return revoke_session(db, token)
+
+
+def _revoke_account_tokens(db: Session, account_id: int) -> None:
+    """Log the account out everywhere: its opaque sessions (either mode,
+    they stay valid in signed mode) and, in signed mode, its signed tokens."""
+    db.query(AccountSession).filter(AccountSession.account_id == account_id).delete(synchronize_session=False)
+    db.commit()
+    session_cache.invalidate_account(account_id)
+    if settings.AUTH_TOKEN_MODE == "signed":
+        revocations.revoke_account(db, account_id)
+
+
+def _evict_oldest_sessions(db: Session, account_id: int, keep: int) -> list[str]:
+    """Delete all but the newest `keep` sessions of an account; return their token hashes."""
+    if keep <= 0:
+        return []
+    old = (
+        db.query(AccountSession.id, AccountSession.token_hash)
+        .filter(AccountSession.account_id == account_id)
+        .order_by(AccountSession.id.desc())
+        .offset(keep)
+        .all()
+    )
+    if not old:
+        return []
+    db.query(AccountSession).filter(AccountSession.id.in_([x[0] for x in old])).delete(synchronize_session=False)
+    return [x[1] for x in old]
+
+
+def delete_expired_sessions(db: Session, *, batch: int, now: dt.datetime | None = None) -> int:
+    """Delete expired sessions in batches of `batch` rows, one commit per batch."""
+    now = now or dt.datetime.now(dt.timezone.utc)
+    deleted = 0
+    while True:
+        ids = [
+            x[0]
+            for x in db.query(AccountSession.id)
+            .filter(AccountSession.expires_at <= now)
+            .order_by(AccountSession.id.asc())
+            .limit(batch)
+            .all()
+        ]
+        if not ids:
+            break
+        db.query(AccountSession).filter(AccountSession.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        deleted += len(ids)
+        if len(ids) < batch:
+            break
+    return deleted
+
+
+def delete_expired_revocations(db: Session, now: dt.datetime | None = None) -> int:
+    now = now or dt.datetime.now(dt.timezone.utc)
+    n = db.query(TokenRevocation).filter(TokenRevocation.expires_at <= now).delete(synchronize_session=False)
+    db.commit()
+    return int(n or 0)
+
+
+def session_table_stats(db: Session, now: dt.datetime | None = None) -> dict:
+    now = now or dt.datetime.now(dt.timezone.utc)
+    total = db.query(func.count(AccountSession.id)).scalar() or 0
+    expired = db.query(func.count(AccountSession.id)).filter(AccountSession.expires_at <= now).scalar() or 0
+    accounts = db.query(func.count(func.distinct(AccountSession.account_id))).scalar() or 0
+    return {"total": int(total), "expired": int(expired), "accounts": int(accounts)}
+
+
 def revoke_session(db: Session, token: str) -> bool:
     th = token_hash(token)
     s = db.query(AccountSession).filter(AccountSession.token_hash == th).first()
+    session_cache.invalidate_token(th)
     if not s:
         return False
     db.delete(s)
@@ -144,13 +282,25 @@ def create_owner(db: Session, *, username: str, password: str, company_id: int)
 
 
 def set_account_password(db: Session, acc: Account, new_password: str) -> Account:
-    acc.password_hash = hash_password(new_password)
+    return set_account_password_hash(db, acc, hash_password(new_password))
+
+
+def set_account_password_hash(db: Session, acc: Account, password_hash: str) -> Account:
+    acc.password_hash = password_hash
     db.add(acc)
     db.commit()
+    _revoke_account_tokens(db, acc.id)
     db.refresh(acc)
     return acc
 
 
+def delete_account(db: Session, acc: Account) -> None:
+    acc_id = acc.id
+    db.delete(acc)
+    db.commit()
+    _revoke_account_tokens(db, acc_id)
+
+
 def ensure_bootstrap_admin(db: Session, *, username: str, password: str) -> Account:
     """Create an initial admin account if none exists."""
     existing = db.query(Account).filter(Account.role == "admin").first()
@@ -197,3 +347,56 @@ def create_user(
     db.commit()
     db.refresh(u)
     return u
+
+
+def bulk_create_users(
+    db: Session,
+    company: Company,
+    rows: list[dict],
+    batch_size: int = 500,
+) -> list[int]:
+    """Insert already-validated users (first_name, last_name, phone) in one
+    transaction; returns their ids in input order.
+
+    Each batch is one multi-row INSERT ... RETURNING id followed by one
+    executemany UPDATE setting employee_no = str(id), instead of a flush and
+    a commit per user.
+    """
+    t = User.__table__
+    ids: list[int] = []
+    for i in range(0, len(rows), batch_size):
+        batch = [
+            {"company_id": company.id, "status": "pending", **r}
+            for r in rows[i:i + batch_size]
+        ]
+        res = db.execute(insert(t).returning(t.c.id, sort_by_parameter_order=True), batch)
+        batch_ids = [r[0] for r in res]
+        db.execute(
+            update(t).where(t.c.id == bindparam("uid")).values(employee_no=bindparam("eno")),
+            [{"uid": uid, "eno": str(uid)} for uid in batch_ids],
+        )
+        ids.extend(batch_ids)
+    db.commit()
+    return ids
+
+
+def delete_user_face(db: Session, user_id: int) -> str | None:
+    """Remove the user's face rows (no commit); returns the image hash so the
+    caller can release_face_blob() it after committing."""
+    db.query(DeviceFace).filter(DeviceFace.user_id == user_id).delete(synchronize_session=False)
+    face = db.get(Face, user_id)
+    if face is None:
+        return None
+    db.delete(face)
+    return face.sha256
+
+
+def release_face_blob(db: Session, sha256: str) -> None:
+    """Delete the stored image once no face row points at it any more.
+
+    Checked and removed under the blob's lock, which an upload holds until
+    its row is committed, so a face saved meanwhile is never left without
+    its file."""
+    with face_store.lock(sha256):
+        if not db.query(Face.user_id).filter(Face.sha256 == sha256).first():
+            face_store.discard(sha256)
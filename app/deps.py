@@ -5,7 +5,7 @@ from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.orm import Session
 
 from .core.db import get_db
-from .crud import get_account_by_session_token, get_company
+from .crud import get_account_by_token, get_company
 from .models import Account, Company
 
 
@@ -32,7 +32,7 @@ def require_account(
         raise HTTPException(status_code=401, detail="Missing bearer token")
 
     token = cred.credentials.strip()
-    acc = get_account_by_session_token(db, token)
+    acc = get_account_by_token(db, token)
     if not acc:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
@@ -0,0 +1,96 @@
+import fcntl
+import hashlib
+import os
+import tempfile
+from contextlib import asynccontextmanager, contextmanager
+
+from starlette.concurrency import run_in_threadpool
+
+from .core.config import settings
+
+CHUNK = 64 * 1024
+
+
+class FaceTooLarge(Exception):
+    pass
+
+
+class FaceStore:
+    """Face images on local disk, one file per distinct content.
+
+    Files are named by the SHA-256 of their bytes (<root>/ab/<sha>.jpg), so
+    the same photo uploaded twice, or for two users, is stored once and a
+    hash comparison is enough to know whether a device has the current one.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root, sha256[:2], f"{sha256}.jpg")
+
+    def exists(self, sha256: str) -> bool:
+        return os.path.exists(self.path(sha256))
+
+    @contextmanager
+    def lock(self, sha256: str):
+        """Exclusive lock shared by everything that adds or drops references
+        to a blob, across threads and workers (flock on a per-directory lock
+        file, so it covers the 1/256 of hashes sharing the sha's prefix)."""
+        d = os.path.join(self.root, sha256[:2])
+        os.makedirs(d, exist_ok=True)
+        fd = os.open(os.path.join(d, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    @asynccontextmanager
+    async def save(self, chunks, max_bytes: int):
+        """Write an async byte stream to the store; yields (sha256, size).
+
+        The body is hashed while it is spooled to a temp file, then renamed
+        into place, so memory use is one chunk regardless of the image size.
+        Raises FaceTooLarge past `max_bytes`.
+
+        The blob's lock is held until the block exits: commit the row that
+        references it inside the block, so a concurrent release_face_blob()
+        either sees that row or has already removed the old file (and the
+        rename here puts it back).
+        """
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"))
+        h = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise FaceTooLarge()
+                    h.update(chunk)
+                    await run_in_threadpool(f.write, chunk)
+            sha = h.hexdigest()
+            with self.lock(sha):
+                dest = self.path(sha)
+                if os.path.exists(dest):
+                    os.unlink(tmp)
+                else:
+                    os.replace(tmp, dest)
+                yield sha, size
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def discard(self, sha256: str) -> None:
+        """Remove a blob no face row references any more (hold its lock)."""
+        try:
+            os.unlink(self.path(sha256))
+        except FileNotFoundError:
+            pass
+
+
+face_store = FaceStore(settings.FACE_STORAGE_DIR)
@@ -0,0 +1,241 @@
+"""Minimal async ISAPI client for Hikvision access-control terminals.
+
+One `DeviceClient` per device keeps a pooled, digest-authenticated
+httpx.AsyncClient (the digest challenge is reused across requests) and a
+semaphore capping concurrent requests to that terminal; they are small
+embedded boxes that fall over under parallel writes.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import secrets
+
+import httpx
+import orjson
+from starlette.concurrency import run_in_threadpool
+
+from .core.config import settings
+
+log = logging.getLogger("app.isapi")
+
+# Valid window written to every user; the terminals require one.
+_VALID = {"enable": True, "beginTime": "2024-01-01T00:00:00", "endTime": "2037-12-31T23:59:59"}
+
+
+def user_info(employee_no: str, name: str) -> dict:
+    """The UserInfo object written for every provisioned user."""
+    return {
+        "employeeNo": employee_no,
+        "name": name[:32],
+        "userType": "normal",
+        "Valid": _VALID,
+        "doorRight": "1",
+        "RightPlan": [{"doorNo": 1, "planTemplateNo": "1"}],
+    }
+
+
+def user_fingerprint(info: dict) -> bytes:
+    """8-byte digest of the UserInfo fields we manage, as a device reports
+    them; equal fingerprints mean the device entry needs no Modify."""
+    valid = info.get("Valid") or {}
+    key = "\x1f".join(str(x) for x in (
+        info.get("name", ""), info.get("userType", ""),
+        bool(valid.get("enable")), valid.get("beginTime", ""), valid.get("endTime", ""),
+    ))
+    return hashlib.blake2b(key.encode(), digest_size=8).digest()
+
+
+class _FaceBody:
+    """multipart/form-data body for FDLib face uploads, streamed from disk.
+
+    An iterable object rather than a generator, so httpx can send it again
+    when the digest nonce went stale and the request is re-challenged.
+    """
+
+    def __init__(self, record: dict, path: str) -> None:
+        self.boundary = secrets.token_hex(16)
+        self.path = path
+        b = self.boundary
+        self.head = (
+            f"--{b}\r\n"
+            'Content-Disposition: form-data; name="FaceDataRecord"\r\n'
+            "Content-Type: application/json\r\n\r\n"
+            f"{orjson.dumps(record).decode()}\r\n"
+            f"--{b}\r\n"
+            'Content-Disposition: form-data; name="FaceImage"; filename="face.jpg"\r\n'
+            "Content-Type: image/jpeg\r\n\r\n"
+        ).encode()
+        self.tail = f"\r\n--{b}--\r\n".encode()
+        self.length = len(self.head) + os.path.getsize(path) + len(self.tail)
+
+    @property
+    def headers(self) -> dict:
+        # Fixed length: the terminals' HTTP servers don't all take chunked bodies.
+        return {
+            "Content-Type": f"multipart/form-data; boundary={self.boundary}",
+            "Content-Length": str(self.length),
+        }
+
+    async def __aiter__(self):
+        yield self.head
+        f = open(self.path, "rb")
+        try:
+            while chunk := await run_in_threadpool(f.read, 64 * 1024):
+                yield chunk
+        finally:
+            f.close()
+        yield self.tail
+
+
+class ISAPIError(Exception):
+    def __init__(self, message: str, *, status: int | None = None, sub_status: str | None = None, retryable: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.sub_status = sub_status
+        self.retryable = retryable
+
+
+class DeviceClient:
+    def __init__(self, base_url: str, username: str, password: str, concurrency: int, timeout: float) -> None:
+        self.base_url = base_url.rstrip("/")
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            auth=httpx.DigestAuth(username, password),
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            timeout=timeout,
+        )
+        self._concurrency = concurrency
+        self._sem = asyncio.Semaphore(concurrency)
+
+    async def request(self, method: str, path: str, json: dict | None = None, **kw) -> dict:
+        async with self._sem:
+            if self._client.is_closed:
+                # replaced by DeviceClients.get; the caller still held this one
+                raise ISAPIError("client closed: device address or credentials changed")
+            try:
+                r = await self._client.request(method, path, params={"format": "json"}, json=json, **kw)
+            except httpx.TransportError as e:
+                raise ISAPIError(f"{type(e).__name__}: {e}", retryable=True) from None
+        try:
+            body = r.json()
+        except ValueError:
+            body = {}
+        if r.status_code == 200 and body.get("statusCode", 1) in (0, 1):
+            return body
+        sub = body.get("subStatusCode")
+        msg = f"HTTP {r.status_code}" + (f" {sub}" if sub else "") + (f": {body['errorMsg']}" if body.get("errorMsg") else "")
+        raise ISAPIError(msg, status=r.status_code, sub_status=sub, retryable=r.status_code in (429, 500, 502, 503, 504))
+
+    async def add_user(self, employee_no: str, name: str) -> None:
+        await self.request("POST", "/ISAPI/AccessControl/UserInfo/Record", {"UserInfo": user_info(employee_no, name)})
+
+    async def modify_user(self, employee_no: str, name: str) -> None:
+        await self.request("PUT", "/ISAPI/AccessControl/UserInfo/Modify", {"UserInfo": user_info(employee_no, name)})
+
+    async def upsert_user(self, employee_no: str, name: str, retries: int = 0, backoff: float = 0.0) -> int:
+        """Add the user, or modify it if the employeeNo exists. Each call is
+        retried on its own (a failed Modify doesn't redo the Add); returns
+        the number of retries it took."""
+        try:
+            return await with_retries(lambda: self.add_user(employee_no, name), retries, backoff)
+        except ISAPIError as e:
+            if e.sub_status != "employeeNoAlreadyExist":
+                raise
+        return await with_retries(lambda: self.modify_user(employee_no, name), retries, backoff)
+
+    async def count_users(self) -> int:
+        body = await self.request("GET", "/ISAPI/AccessControl/UserInfo/Count")
+        return int(body.get("UserInfoCount", {}).get("userNumber", 0))
+
+    async def search_users(self, search_id: str, position: int, max_results: int) -> tuple[list[dict], bool]:
+        """One page of the device roster; returns (users, more)."""
+        cond = {"searchID": search_id, "searchResultPosition": position, "maxResults": max_results}
+        body = await self.request("POST", "/ISAPI/AccessControl/UserInfo/Search", {"UserInfoSearchCond": cond})
+        res = body.get("UserInfoSearch", {})
+        return res.get("UserInfo") or [], res.get("responseStatusStrg") == "MORE"
+
+    async def upload_face(self, employee_no: str, path: str) -> None:
+        """Set the user's face (FDLib 1) from an image file; the user must exist."""
+        record = {"faceLibType": "blackFD", "FDID": "1", "FPID": employee_no}
+        body = _FaceBody(record, path)
+        try:
+            await self.request("POST", "/ISAPI/Intelligent/FDLib/FaceDataRecord", content=body, headers=body.headers)
+        except ISAPIError as e:
+            if e.sub_status != "deviceUserAlreadyExistFace":
+                raise
+            body = _FaceBody(record, path)
+            await self.request("POST", "/ISAPI/Intelligent/FDLib/FDModify", content=body, headers=body.headers)
+
+    async def delete_users(self, employee_nos: list[str]) -> None:
+        cond = {"EmployeeNoList": [{"employeeNo": e} for e in employee_nos]}
+        await self.request("PUT", "/ISAPI/AccessControl/UserInfo/Delete", {"UserInfoDelCond": cond})
+
+    async def aclose(self) -> None:
+        await self._client.aclose()
+
+    async def aclose_when_idle(self) -> None:
+        """Close once the requests in flight have finished."""
+        for _ in range(self._concurrency):
+            await self._sem.acquire()
+        try:
+            await self.aclose()
+        finally:
+            for _ in range(self._concurrency):
+                self._sem.release()
+
+
+class DeviceClients:
+    """device id -> DeviceClient, rebuilt when the device's address or credentials change."""
+
+    def __init__(self, concurrency: int, timeout: float) -> None:
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._clients: dict[int, tuple[tuple, DeviceClient]] = {}
+        self._closing: set[asyncio.Task] = set()
+
+    def get(self, device_id: int, base_url: str, username: str, password: str) -> DeviceClient:
+        key = (base_url, username, password)
+        cur = self._clients.get(device_id)
+        if cur is not None and cur[0] == key:
+            return cur[1]
+        if cur is not None:
+            task = asyncio.create_task(cur[1].aclose_when_idle())
+            self._closing.add(task)
+            task.add_done_callback(self._closed)
+        client = DeviceClient(base_url, username, password, self.concurrency, self.timeout)
+        self._clients[device_id] = (key, client)
+        return client
+
+    def _closed(self, task: asyncio.Task) -> None:
+        self._closing.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.warning("closing a replaced device client failed", exc_info=task.exception())
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for _, c in clients.values():
+            await c.aclose()
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+
+async def with_retries(fn, retries: int, backoff: float):
+    """Await fn(), retrying retryable ISAPIErrors with jittered exponential
+    backoff; returns the number of retries it took."""
+    for attempt in range(retries + 1):
+        try:
+            await fn()
+            return attempt
+        except ISAPIError as e:
+            if not e.retryable or attempt == retries:
+                raise
+            await asyncio.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+
+
+device_clients = DeviceClients(
+    concurrency=settings.PROVISION_DEVICE_CONCURRENCY,
+    timeout=settings.PROVISION_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,224 @@
+import asyncio
+import datetime as dt
+import logging
+import time
+
+from sqlalchemy import update
+from starlette.concurrency import run_in_threadpool
+
+from .core.config import settings
+from .core.db import SessionLocal
+from .models import Job
+
+log = logging.getLogger("app.jobs")
+
+ACTIVE = ("queued", "running")
+
+
+def _now() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+class JobContext:
+    """Handed to a job handler: its params and a progress sink.
+
+    progress() only updates memory; it is written to the jobs row at most
+    every JOB_PROGRESS_FLUSH_SECONDS (and when the job ends), so a handler
+    can report per batch without adding a write per batch.
+    """
+
+    def __init__(self, job_id: int, company_id: int | None, params: dict, progress: dict) -> None:
+        self.job_id = job_id
+        self.company_id = company_id
+        self.params = params
+        self.state = dict(progress)
+        self._flushed_at = time.monotonic()
+
+    async def progress(self, **fields) -> None:
+        self.state.update(fields)
+        if time.monotonic() - self._flushed_at >= settings.JOB_PROGRESS_FLUSH_SECONDS:
+            await self.flush()
+
+    async def flush(self) -> None:
+        self._flushed_at = time.monotonic()
+        await run_in_threadpool(_save, self.job_id, progress=dict(self.state))
+
+
+class JobRunner:
+    """Runs background jobs as tasks in this process, tracked in `jobs`.
+
+    Handlers are registered per kind. Resumable kinds must be idempotent
+    (they restart from whatever is left, using ctx.state for hints): jobs of
+    those kinds left queued/running by a dead worker are picked up again
+    once their row has not been touched for JOB_STALE_SECONDS. Other kinds
+    are marked failed instead.
+    """
+
+    def __init__(self) -> None:
+        self._handlers: dict[str, tuple] = {}
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def register(self, kind: str, handler, *, resumable: bool = False) -> None:
+        self._handlers[kind] = (handler, resumable)
+
+    async def start(
+        self, kind: str, company_id: int | None, params: dict | None = None, *, unique: bool = True,
+    ) -> tuple[int, bool]:
+        """Queue a job; returns (job_id, created). With `unique`, a job of the
+        same kind already active for the company is returned instead."""
+        if kind not in self._handlers:
+            raise KeyError(kind)
+        job_id, created = await run_in_threadpool(_create, kind, company_id, params or {}, unique)
+        if created:
+            self._spawn(job_id, kind, company_id, params or {}, {})
+        return job_id, created
+
+    def add(self, db, kind: str, company_id: int | None, params: dict | None = None) -> int:
+        """Insert a queued job in the caller's transaction (not committed);
+        returns its id. launch() it after the commit. If this worker dies in
+        between, the row is adopted like any other stale job."""
+        if kind not in self._handlers:
+            raise KeyError(kind)
+        job = Job(kind=kind, company_id=company_id, params=params or {}, progress={})
+        db.add(job)
+        db.flush()
+        return job.id
+
+    def launch(self, job_id: int, kind: str, company_id: int | None, params: dict | None = None) -> None:
+        """Start a job created with add() once its row is committed."""
+        self._spawn(job_id, kind, company_id, params or {}, {})
+
+    def _spawn(self, job_id: int, kind: str, company_id: int | None, params: dict, progress: dict) -> None:
+        ctx = JobContext(job_id, company_id, params, progress)
+        task = asyncio.create_task(self._run(kind, ctx))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _t: self._tasks.pop(job_id, None))
+
+    async def _run(self, kind: str, ctx: JobContext) -> None:
+        handler, _ = self._handlers[kind]
+        beat = asyncio.create_task(self._heartbeat(ctx))
+        try:
+            await run_in_threadpool(_save, ctx.job_id, status="running")
+            result = await handler(ctx)
+        except asyncio.CancelledError:
+            raise  # shutdown: left running, resumed by the next worker if resumable
+        except Exception as e:
+            log.exception("job %s (%s) failed", ctx.job_id, kind)
+            await run_in_threadpool(
+                _save, ctx.job_id, status="failed", error=f"{type(e).__name__}: {e}"[:2000],
+                progress=dict(ctx.state), finished_at=_now(),
+            )
+        else:
+            await run_in_threadpool(
+                _save, ctx.job_id, status="done", result=result, progress=dict(ctx.state), finished_at=_now(),
+            )
+        finally:
+            beat.cancel()
+
+    async def _heartbeat(self, ctx: JobContext) -> None:
+        # Keeps updated_at fresh so other workers don't think the job is orphaned.
+        while True:
+            await asyncio.sleep(settings.JOB_STALE_SECONDS / 3)
+            try:
+                await ctx.flush()
+            except Exception:
+                log.exception("job %s heartbeat failed", ctx.job_id)
+
+    async def run(self, interval_seconds: float) -> None:
+        """Adopt orphaned jobs now and then (startup, dead workers)."""
+        while True:
+            try:
+                await self._adopt()
+            except Exception:
+                log.exception("job recovery failed")
+            await asyncio.sleep(interval_seconds)
+
+    async def _adopt(self) -> None:
+        resumable = [k for k, (_, r) in self._handlers.items() if r]
+        for job_id, kind, company_id, params, progress in await run_in_threadpool(_claim_stale, resumable):
+            if job_id in self._tasks:
+                continue
+            log.info("resuming job %s (%s)", job_id, kind)
+            self._spawn(job_id, kind, company_id, params, progress)
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def _save(job_id: int, **values) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(update(Job).where(Job.id == job_id).values(updated_at=_now(), **values))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _create(kind: str, company_id: int | None, params: dict, unique: bool) -> tuple[int, bool]:
+    db = SessionLocal()
+    try:
+        if unique and company_id is not None:
+            cur = (
+                db.query(Job.id)
+                .filter(Job.kind == kind, Job.company_id == company_id, Job.status.in_(ACTIVE))
+                .first()
+            )
+            if cur:
+                return cur[0], False
+        job = Job(kind=kind, company_id=company_id, params=params, progress={})
+        db.add(job)
+        db.commit()
+        return job.id, True
+    finally:
+        db.close()
+
+
+def _claim_stale(resumable: list[str]) -> list[tuple]:
+    """Active jobs nobody has touched for JOB_STALE_SECONDS: claim the
+    resumable ones (compare-and-set on updated_at, so one worker wins) and
+    fail the rest."""
+    cutoff = _now() - dt.timedelta(seconds=settings.JOB_STALE_SECONDS)
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(Job.id, Job.kind, Job.company_id, Job.params, Job.progress, Job.updated_at)
+            .filter(Job.status.in_(ACTIVE), Job.updated_at < cutoff)
+            .all()
+        )
+        claimed = []
+        for job_id, kind, company_id, params, progress, seen in rows:
+            if kind in resumable:
+                values = {"status": "running"}
+            else:
+                values = {"status": "failed", "error": "interrupted (worker stopped)", "finished_at": _now()}
+            won = db.execute(
+                update(Job).where(Job.id == job_id, Job.updated_at == seen).values(updated_at=_now(), **values)
+            ).rowcount
+            db.commit()
+            if won and kind in resumable:
+                claimed.append((job_id, kind, company_id, params or {}, progress or {}))
+        return claimed
+    finally:
+        db.close()
+
+
+def job_to_out(j: Job) -> dict:
+    return {
+        "id": j.id,
+        "kind": j.kind,
+        "company_id": j.company_id,
+        "status": j.status,
+        "params": j.params or {},
+        "progress": j.progress or {},
+        "result": j.result,
+        "error": j.error,
+        "created_at": j.created_at.isoformat() if j.created_at else None,
+        "updated_at": j.updated_at.isoformat() if j.updated_at else None,
+        "finished_at": j.finished_at.isoformat() if j.finished_at else None,
+    }
+
+
+job_runner = JobRunner()
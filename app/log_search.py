@@ -0,0 +1,196 @@
+import bisect
+import os
+import re
+import threading
+from dataclasses import dataclass, field
+
+# Lines start with "YYYY-MM-DD HH:MM:SS | LEVEL | ..." (text format) or
+# '{"ts":"YYYY-MM-DDTHH:MM:SS.mmmZ","level":"LEVEL",...' (LOG_FORMAT=json).
+# Lines without a timestamp (tracebacks) continue the previous record.
+_JSON_PREFIX = b'{"ts":"'
+_JSON_LEVEL = re.compile(rb'"level":"([A-Z]+)"')
+LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40, "CRITICAL": 50}
+
+
+def line_ts(line: bytes) -> str | None:
+    """Timestamp of a record's first line as "YYYY-MM-DD HH:MM:SS", else None."""
+    raw = line[7:26] if line.startswith(_JSON_PREFIX) else line[:19]
+    if len(raw) != 19 or raw[4] != 45 or raw[13] != 58 or raw[16] != 58:  # '-', ':', ':'
+        return None
+    return raw.decode("ascii", "replace").replace("T", " ")
+
+
+def line_level(line: bytes) -> int:
+    if line.startswith(_JSON_PREFIX):
+        m = _JSON_LEVEL.search(line, 26, 60)
+        name = m.group(1).decode() if m else ""
+    else:
+        parts = line.split(b" | ", 2)
+        name = parts[1].decode("ascii", "replace") if len(parts) > 2 else ""
+    return LEVELS.get(name, 0)
+
+
+@dataclass
+class _FileIndex:
+    marks_ts: list[str] = field(default_factory=list)
+    marks_off: list[int] = field(default_factory=list)
+    scanned: int = 0        # bytes indexed so far (always a line boundary)
+    next_mark: int = 0
+    last_ts: str | None = None
+
+
+class LogIndex:
+    """Sparse timestamp -> byte offset index, one per log file.
+
+    A mark is taken at the first timestamped line every `step` bytes, so a
+    search seeks to the last mark before its start time and reads at most
+    ~`step` bytes of lines it doesn't need. Files are keyed by inode: after
+    RotatingFileHandler renames app.log to app.log.1 the index moves with it,
+    and the live app.log is indexed incrementally as it grows.
+    """
+
+    def __init__(self, step: int = 64 * 1024) -> None:
+        self.step = step
+        self._files: dict[tuple[int, int], _FileIndex] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> _FileIndex:
+        st = os.stat(path)
+        key = (st.st_dev, st.st_ino)
+        with self._lock:
+            fi = self._files.get(key)
+            if fi is None or st.st_size < fi.scanned:  # new or truncated
+                fi = self._files[key] = _FileIndex()
+            if st.st_size > fi.scanned:
+                self._extend(path, fi)
+            return fi
+
+    def _extend(self, path: str, fi: _FileIndex) -> None:
+        with open(path, "rb") as f:
+            f.seek(fi.scanned)
+            off = fi.scanned
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # partial line being written; index it next time
+                ts = line_ts(line)
+                if ts is not None:
+                    if off >= fi.next_mark:
+                        fi.marks_ts.append(ts)
+                        fi.marks_off.append(off)
+                        fi.next_mark = off + self.step
+                    fi.last_ts = ts
+                off += len(line)
+            fi.scanned = off
+
+    def retain(self, paths: list[str]) -> None:
+        """Forget files that were rotated out."""
+        keep = set()
+        for p in paths:
+            try:
+                st = os.stat(p)
+            except FileNotFoundError:
+                continue
+            keep.add((st.st_dev, st.st_ino))
+        with self._lock:
+            for key in list(self._files):
+                if key not in keep:
+                    del self._files[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"files": len(self._files), "marks": sum(len(f.marks_off) for f in self._files.values())}
+
+
+log_index = LogIndex()
+
+
+def rotated_files(log_dir: str, name: str) -> list[str]:
+    """`name` and its rotations, oldest first (app.log.3, .2, .1, app.log)."""
+    rotated = []
+    for fn in os.listdir(log_dir):
+        suffix = fn[len(name) + 1:]
+        if fn.startswith(name + ".") and suffix.isdigit() and os.path.isfile(os.path.join(log_dir, fn)):
+            rotated.append((int(suffix), os.path.join(log_dir, fn)))
+    files = [p for _, p in sorted(rotated, reverse=True)]
+    base = os.path.join(log_dir, name)
+    if os.path.isfile(base):
+        files.append(base)
+    return files
+
+
+def search(
+    files: list[str],
+    start: str | None,
+    end: str | None,
+    min_level: int,
+    q: str | None,
+    limit: int,
+) -> dict:
+    """Records with start <= ts <= end (strings, "YYYY-MM-DD HH:MM:SS" prefix
+    compare), level >= min_level and containing `q`, oldest first."""
+    needle = q.encode("utf-8") if q else None
+    out: list[str] = []
+    bytes_read = 0
+    files_scanned = 0
+    truncated = False
+
+    def take(rec: list[bytes], ts: str) -> bool:
+        """Returns False once the scan can stop."""
+        nonlocal truncated
+        if end is not None and ts[: len(end)] > end:
+            return False
+        if start is not None and ts < start:
+            return True
+        if min_level and line_level(rec[0]) < min_level:
+            return True
+        text = b"".join(rec)
+        if needle is not None and needle not in text:
+            return True
+        if len(out) >= limit:
+            truncated = True
+            return False
+        out.append(text.decode("utf-8", "replace").rstrip("\n"))
+        return True
+
+    for path in files:
+        try:
+            fi = log_index.get(path)
+        except FileNotFoundError:
+            continue  # rotated away meanwhile
+        if not fi.marks_ts:
+            continue
+        if end is not None and fi.marks_ts[0][: len(end)] > end:
+            break  # this and every newer file start after the range
+        if start is not None and fi.last_ts is not None and fi.last_ts < start:
+            continue
+        i = bisect.bisect_left(fi.marks_ts, start) if start is not None else 0
+        offset = fi.marks_off[i - 1] if i > 0 else 0
+        files_scanned += 1
+        rec: list[bytes] = []
+        rec_ts = None
+        keep_going = True
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                bytes_read += len(line)
+                ts = line_ts(line)
+                if ts is None:
+                    if rec:
+                        rec.append(line)
+                    continue
+                if rec and not take(rec, rec_ts):
+                    keep_going = False
+                    break
+                rec, rec_ts = [line], ts
+            else:
+                if rec and not take(rec, rec_ts):
+                    keep_going = False
+        if not keep_going:
+            break
+
+    return {
+        "lines": out,
+        "truncated": truncated,
+        "files_scanned": files_scanned,
+        "bytes_read": bytes_read,
+    }
@@ -1,22 +1,45 @@
+import asyncio
 import logging
 import secrets
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 
-from .core.db import engine, Base, SessionLocal
-from .core.logging_setup import setup_logging
+from .core.auth import HashPoolBusy, hash_pool
+from .core.db import engine, read_engine, Base, SessionLocal
+from .core.logging_setup import RequestLogMiddleware, setup_logging, stop_logging
 from .core.config import settings
+from .core.profiling import ProfilingMiddleware, instrument
 from .crud import ensure_bootstrap_admin
 from .models import Account
-from .routers import admin, users, ws, logs, events, hik_vision_push, companies
+from .routers import admin, users, ws, logs, events, hik_vision_push, companies, devices, faces, jobs
 from .routers import auth
+from .jobs import job_runner
+from .provisioning import provisioner
+from .session_cache import session_cache
+from .session_sweeper import session_sweeper
+from .terminals import terminal_registry
+from .token_revocations import revocations
+from .ws_manager import manager
 
 setup_logging()
 
 app = FastAPI(title="FaceID Global Backend", swagger_ui_parameters={"persistAuthorization": True})
+if settings.PROFILING_ENABLED:
+    for e in {engine, read_engine}:
+        instrument(e)
+    app.add_middleware(ProfilingMiddleware)
+app.add_middleware(RequestLogMiddleware)  # outermost: profiling records get the request id
+
+
+@app.exception_handler(HashPoolBusy)
+async def _hash_pool_busy(_req: Request, _exc: HashPoolBusy):
+    return JSONResponse({"detail": "Too many password operations, retry shortly"}, status_code=503, headers={"Retry-After": "1"})
+
 
 @app.on_event("startup")
 def _startup():
+    setup_logging()  # no-op unless a previous shutdown stopped it
     Base.metadata.create_all(bind=engine)
 
     # Bootstrap admin account (no register flow)
@@ -36,10 +59,45 @@ def _startup():
     finally:
         db.close()
 
+
+_background: list[asyncio.Task] = []
+
+
+@app.on_event("startup")
+async def _start_background():
+    await manager.start()
+    _background.append(asyncio.create_task(session_cache.run_flusher(settings.SESSION_TOUCH_FLUSH_SECONDS)))
+    _background.append(asyncio.create_task(session_sweeper.run(settings.SESSION_SWEEP_INTERVAL_SECONDS)))
+    _background.append(asyncio.create_task(terminal_registry.run_flusher(settings.DEVICE_FLUSH_SECONDS)))
+    if settings.PROVISIONING_ENABLED:
+        _background.append(asyncio.create_task(provisioner.run()))
+    _background.append(asyncio.create_task(job_runner.run(settings.JOB_ADOPT_INTERVAL_SECONDS)))
+    if settings.AUTH_TOKEN_MODE == "signed":
+        if not settings.AUTH_TOKEN_SECRET:
+            raise RuntimeError("AUTH_TOKEN_SECRET must be set when AUTH_TOKEN_MODE=signed")
+        _background.append(asyncio.create_task(revocations.run_sync(settings.TOKEN_REVOCATION_SYNC_SECONDS)))
+
+
+@app.on_event("shutdown")
+async def _stop_background():
+    for t in _background:
+        t.cancel()
+    _background.clear()
+    await job_runner.stop()
+    await manager.close_all()
+    await manager.stop()
+    session_cache.flush_touches()
+    terminal_registry.flush()
+    hash_pool.shutdown()
+    stop_logging()
+
 app.include_router(admin.router)
 app.include_router(auth.router)
 app.include_router(companies.router)
 app.include_router(users.router)
+app.include_router(devices.router)
+app.include_router(faces.router)
+app.include_router(jobs.router)
 app.include_router(ws.router)
 app.include_router(logs.router)
 app.include_router(events.router)
@@ -1,6 +1,6 @@
 import datetime as dt
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, JSON, String, Text
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Integer, JSON, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .core.db import Base
@@ -19,6 +19,25 @@ class Company(Base):
     )
 
     users = relationship("User", back_populates="company", cascade="all, delete-orphan")
+    devices = relationship("Device", cascade="all, delete-orphan")
+
+
+class CompanyDeletion(Base):
+    """A company being purged by a background job (see cleanup.py).
+
+    While the row exists the company is hidden from every lookup (id,
+    api_key, edge_key, listings); the job deletes both when it is done.
+    """
+
+    __tablename__ = "company_deletions"
+
+    company_id: Mapped[int] = mapped_column(
+        ForeignKey("companies.id", ondelete="CASCADE"), primary_key=True
+    )
+    deleted_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: dt.datetime.now(dt.timezone.utc),
+    )
 
 
 class Account(Base):
@@ -69,6 +88,26 @@ class AccountSession(Base):
     account = relationship("Account", back_populates="sessions")
 
 
+class TokenRevocation(Base):
+    """Revoked signed access tokens (AUTH_TOKEN_MODE=signed).
+
+    Either a single token (jti) or every token of an account issued before
+    `revoked_before`. Rows are only needed until the tokens they cover expire.
+    """
+
+    __tablename__ = "token_revocations"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    jti: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    account_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    revoked_before: Mapped[dt.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    expires_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), index=True)
+
+    created_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: dt.datetime.now(dt.timezone.utc)
+    )
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -100,6 +139,141 @@ class User(Base):
     company = relationship("Company", back_populates="users")
 
 
+class Device(Base):
+    """A Hikvision terminal reachable over ISAPI (digest auth).
+
+    Users of the company are provisioned onto every enabled device.
+    """
+
+    __tablename__ = "devices"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    company_id: Mapped[int] = mapped_column(
+        ForeignKey("companies.id", ondelete="CASCADE"), index=True
+    )
+
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    base_url: Mapped[str] = mapped_column(String(255), nullable=False)  # e.g. http://192.168.100.59
+    username: Mapped[str] = mapped_column(String(64), nullable=False)
+    # Stored as-is: digest auth needs the plain password.
+    password: Mapped[str] = mapped_column(String(128), nullable=False)
+    enabled: Mapped[bool] = mapped_column(Boolean, default=True)
+
+    created_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: dt.datetime.now(dt.timezone.utc),
+    )
+
+
+class Face(Base):
+    """The user's enrollment photo; the image itself lives in the face store
+    (content-addressed on disk), this row points at it by hash."""
+
+    __tablename__ = "faces"
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    company_id: Mapped[int] = mapped_column(Integer, index=True)
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    updated_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: dt.datetime.now(dt.timezone.utc),
+        onupdate=lambda: dt.datetime.now(dt.timezone.utc),
+    )
+
+
+class DeviceFace(Base):
+    """Which face image (by hash) a device already has for a user."""
+
+    __tablename__ = "device_faces"
+
+    device_id: Mapped[int] = mapped_column(
+        ForeignKey("devices.id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True
+    )
+    sha256: Mapped[str] = mapped_column(String(64), nullable=False)
+
+    uploaded_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: dt.datetime.now(dt.timezone.utc),
+    )
+
+
+class Terminal(Base):
+    """A terminal seen posting to the company's webhook, keyed by the
+    identifier in its payloads (MAC, else serial, else IP; see terminals.py).
+
+    Unlike Device (configured ISAPI credentials) these rows are discovered.
+    last_seen_at and event_count are buffered in memory by each worker and
+    written every DEVICE_FLUSH_SECONDS.
+    """
+
+    __tablename__ = "terminals"
+
+    company_id: Mapped[int] = mapped_column(
+        ForeignKey("companies.id", ondelete="CASCADE"), primary_key=True
+    )
+    device_key: Mapped[str] = mapped_column(String(100), primary_key=True)
+
+    mac_address: Mapped[str | None] = mapped_column(String(32), nullable=True)
+    serial_no: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    ip_address: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    name: Mapped[str | None] = mapped_column(String(100), nullable=True)
+
+    first_seen_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_seen_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    event_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class UserActivity(Base):
+    """Per-user event stats kept up to date at ingest (see user_activity.py),
+    so user lists can filter on "has events" and sort by last seen without
+    touching event_logs. One row per user with at least one mapped event."""
+
+    __tablename__ = "user_activity"
+    __table_args__ = (Index("ix_user_activity_company_last_seen", "company_id", "last_seen_at"),)
+
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+    company_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    first_seen_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    last_seen_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    event_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class Job(Base):
+    """A background job (reconciliation, bulk cleanup) and its progress."""
+
+    __tablename__ = "jobs"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50), nullable=False, index=True)
+    company_id: Mapped[int | None] = mapped_column(Integer, index=True, nullable=True)
+
+    status: Mapped[str] = mapped_column(String(20), default="queued", index=True)  # queued|running|done|failed
+    params: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+    progress: Mapped[dict] = mapped_column(JSON, nullable=False, default=dict)
+    result: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: dt.datetime.now(dt.timezone.utc),
+    )
+    updated_at: Mapped[dt.datetime] = mapped_column(
+        DateTime(timezone=True),
+        default=lambda: dt.datetime.now(dt.timezone.utc),
+        onupdate=lambda: dt.datetime.now(dt.timezone.utc),
+    )
+    finished_at: Mapped[dt.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+
 class EventLog(Base):
     __tablename__ = "event_logs"
 
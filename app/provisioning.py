@@ -0,0 +1,237 @@
+import asyncio
+import datetime as dt
+import logging
+from collections import Counter
+from dataclasses import dataclass
+
+from sqlalchemy import update
+from starlette.concurrency import run_in_threadpool
+
+from .core.config import settings
+from .core.db import SessionLocal
+from .face_store import face_store
+from .isapi import ISAPIError, device_clients, with_retries
+from .models import Device, DeviceFace, Face, User
+from .ws_manager import manager
+
+log = logging.getLogger("app.provisioning")
+
+
+@dataclass
+class _Job:
+    op: str  # "upsert" | "face" | "delete"
+    company_id: int
+    user_id: int
+    employee_no: str | None = None  # delete: the user row is already gone
+
+
+class Provisioner:
+    """Pushes user changes to every enabled device of the company.
+
+    Jobs are keyed by user: a newer change replaces one still waiting, and a
+    user is never processed by two workers at once (a change arriving while
+    one is in flight runs after it). Each job fans out to all devices
+    concurrently; per-device request limits live in the DeviceClient.
+
+    An upsert also uploads the user's face where the device doesn't have
+    the current image yet (compared by hash, see device_faces); a "face" job
+    does only that, so re-syncing unchanged faces costs no device requests.
+
+    Upserts end with users.status = active (all devices OK) or failed (with
+    last_error naming the devices). The queue is in memory: users left
+    `pending` by a restart are re-queued at startup, lost deletes are picked
+    up by roster reconciliation.
+    """
+
+    def __init__(self, workers: int, retries: int, backoff: float) -> None:
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._pending: dict[int, _Job] = {}
+        self._inflight: set[int] = set()
+        self.counts: Counter = Counter()
+
+    # ----- producers (event loop) -----
+
+    def enqueue_upsert(self, company_id: int, user_id: int) -> None:
+        self._put(_Job("upsert", company_id, user_id))
+
+    def enqueue_face(self, company_id: int, user_id: int) -> None:
+        self._put(_Job("face", company_id, user_id))
+
+    def enqueue_delete(self, company_id: int, user_id: int, employee_no: str | None) -> None:
+        if employee_no:
+            self._put(_Job("delete", company_id, user_id, employee_no))
+
+    def _put(self, job: _Job) -> None:
+        cur = self._pending.get(job.user_id)
+        if cur is not None and cur.op == "upsert" and job.op == "face":
+            return  # the waiting upsert syncs the face too
+        queued = cur is not None
+        self._pending[job.user_id] = job
+        if not queued and job.user_id not in self._inflight:
+            self._queue.put_nowait(job.user_id)
+
+    # ----- workers -----
+
+    async def run(self) -> None:
+        await self._recover()
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for w in workers:
+                w.cancel()
+            await device_clients.aclose()
+
+    async def _recover(self) -> None:
+        def load():
+            db = SessionLocal()
+            try:
+                return db.query(User.company_id, User.id).filter(User.status == "pending").all()
+            finally:
+                db.close()
+
+        try:
+            rows = await run_in_threadpool(load)
+        except Exception:
+            log.exception("could not re-queue pending users")
+            return
+        for company_id, user_id in rows:
+            self.enqueue_upsert(company_id, user_id)
+        if rows:
+            log.info("re-queued %d pending users for provisioning", len(rows))
+
+    async def _worker(self) -> None:
+        while True:
+            user_id = await self._queue.get()
+            job = self._pending.pop(user_id, None)
+            if job is None:
+                continue
+            self._inflight.add(user_id)
+            try:
+                await self._process(job)
+            except Exception:
+                self.counts["errors"] += 1
+                log.exception("provisioning %s user_id=%s crashed", job.op, job.user_id)
+            finally:
+                self._inflight.discard(user_id)
+                if user_id in self._pending:
+                    self._queue.put_nowait(user_id)
+
+    async def _process(self, job: _Job) -> None:
+        user, devices = await run_in_threadpool(_load, job)
+        if job.op != "delete" and user is None:
+            return  # deleted meanwhile; its delete job follows
+        if not devices:
+            return  # nothing to push to; stays pending
+
+        employee_no = job.employee_no if job.op == "delete" else user["employee_no"]
+        face = user["face"] if user else None
+        uploaded: list[tuple[int, str]] = []
+
+        async def call(fn) -> None:
+            retried = await with_retries(fn, self.retries, self.backoff)
+            self.counts["retries"] += retried
+
+        async def push(dev: dict) -> str | None:
+            client = device_clients.get(dev["id"], dev["base_url"], dev["username"], dev["password"])
+            try:
+                if job.op == "delete":
+                    await call(lambda: client.delete_users([employee_no]))
+                if job.op == "upsert":
+                    # retries the Add and the Modify separately
+                    self.counts["retries"] += await client.upsert_user(
+                        employee_no, user["name"], self.retries, self.backoff
+                    )
+                if face is not None and dev["face"] != face:
+                    path = face_store.path(face)
+                    await call(lambda: client.upload_face(employee_no, path))
+                    uploaded.append((dev["id"], face))
+                    self.counts["faces_uploaded"] += 1
+                elif face is not None:
+                    self.counts["faces_skipped"] += 1
+                self.counts["device_ok"] += 1
+                return None
+            except ISAPIError as e:
+                self.counts["device_failed"] += 1
+                return f"{dev['name']}: {e}"
+            except OSError as e:  # face image missing from the store
+                self.counts["device_failed"] += 1
+                return f"{dev['name']}: face image: {e.strerror}"
+
+        errors = [e for e in await asyncio.gather(*(push(d) for d in devices)) if e]
+        self.counts[f"{job.op}_{'failed' if errors else 'ok'}"] += 1
+
+        if job.op == "delete":
+            if errors:
+                log.warning("user %s not removed from: %s", employee_no, "; ".join(errors))
+            return
+        if job.op == "face" and not errors and not uploaded:
+            return  # every device already had this face
+        status = "failed" if errors else "active"
+        last_error = "; ".join(errors)[:2000] if errors else None
+        await run_in_threadpool(_save_status, job.user_id, status, last_error, uploaded)
+        await manager.broadcast_to_clients(job.company_id, {
+            "type": "users.provisioned",
+            "data": {"user_id": job.user_id, "status": status, "last_error": last_error},
+        })
+
+    def stats(self) -> dict:
+        return {
+            "queued": len(self._pending),
+            "in_flight": len(self._inflight),
+            **self.counts,
+        }
+
+
+def _load(job: _Job) -> tuple[dict | None, list[dict]]:
+    db = SessionLocal()
+    try:
+        user = None
+        have: dict[int, str] = {}
+        if job.op != "delete":
+            u = db.get(User, job.user_id)
+            if u is None or u.company_id != job.company_id:
+                return None, []
+            face = db.get(Face, u.id)
+            user = {
+                "employee_no": u.employee_no or str(u.id),
+                "name": f"{u.first_name} {u.last_name}".strip(),
+                "face": face.sha256 if face else None,
+            }
+            if face is not None:
+                have = dict(db.query(DeviceFace.device_id, DeviceFace.sha256).filter(DeviceFace.user_id == u.id))
+        devices = [
+            {
+                "id": d.id, "name": d.name, "base_url": d.base_url, "username": d.username, "password": d.password,
+                "face": have.get(d.id),
+            }
+            for d in db.query(Device).filter(Device.company_id == job.company_id, Device.enabled.is_(True))
+        ]
+        return user, devices
+    finally:
+        db.close()
+
+
+def _save_status(user_id: int, status: str, last_error: str | None, uploaded: list[tuple[int, str]]) -> None:
+    db = SessionLocal()
+    try:
+        db.execute(update(User).where(User.id == user_id).values(status=status, last_error=last_error))
+        for device_id, sha in uploaded:
+            db.merge(DeviceFace(device_id=device_id, user_id=user_id, sha256=sha, uploaded_at=_now()))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _now() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+provisioner = Provisioner(
+    workers=settings.PROVISION_WORKERS,
+    retries=settings.PROVISION_RETRIES,
+    backoff=settings.PROVISION_BACKOFF_SECONDS,
+)
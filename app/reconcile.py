@@ -0,0 +1,187 @@
+"""Bring device rosters back in line with the users table.
+
+For each device: count its users (UserInfo/Count), page through them
+(UserInfo/Search) keeping only an 8-byte fingerprint per employeeNo, diff
+against the company's users and send just the missing Records, the stale
+Modifies and the batched Deletes. Devices are reconciled concurrently; the
+per-terminal request limit of DeviceClient still applies.
+"""
+
+import asyncio
+import secrets
+import time
+
+from sqlalchemy import delete
+from starlette.concurrency import run_in_threadpool
+
+from .core.config import settings
+from .core.db import SessionLocal
+from .isapi import ISAPIError, device_clients, user_fingerprint, user_info, with_retries
+from .jobs import JobContext, job_runner
+from .models import Device, DeviceFace, Face, User
+from .provisioning import provisioner
+
+_MAX_ERRORS = 20
+
+
+async def _call(fn):
+    box = []
+
+    async def once():
+        box.append(await fn())
+
+    await with_retries(once, settings.PROVISION_RETRIES, settings.PROVISION_BACKOFF_SECONDS)
+    return box[-1]
+
+
+def _ms(t0: float) -> float:
+    return round((time.perf_counter() - t0) * 1000, 1)
+
+
+def _load(company_id: int, device_ids: list[int] | None) -> tuple[dict, list[dict]]:
+    db = SessionLocal()
+    try:
+        with_face = {uid for (uid,) in db.query(Face.user_id).filter(Face.company_id == company_id)}
+        users = {
+            (eno or str(uid)): (uid, f"{first} {last}".strip(), uid in with_face)
+            for uid, eno, first, last in db.query(User.id, User.employee_no, User.first_name, User.last_name)
+            .filter(User.company_id == company_id)
+        }
+        q = db.query(Device).filter(Device.company_id == company_id, Device.enabled.is_(True))
+        if device_ids:
+            q = q.filter(Device.id.in_(device_ids))
+        devices = [
+            {"id": d.id, "name": d.name, "base_url": d.base_url, "username": d.username, "password": d.password}
+            for d in q.order_by(Device.id)
+        ]
+        return users, devices
+    finally:
+        db.close()
+
+
+def _forget_faces(pairs: list[tuple[int, int]]) -> None:
+    """Users just (re)added to a device have no face there any more."""
+    db = SessionLocal()
+    try:
+        for device_id, user_id in pairs:
+            db.execute(delete(DeviceFace).where(DeviceFace.device_id == device_id, DeviceFace.user_id == user_id))
+        db.commit()
+    finally:
+        db.close()
+
+
+async def reconcile_device(dev: dict, users: dict, want: dict[str, bytes], dry_run: bool) -> dict:
+    client = device_clients.get(dev["id"], dev["base_url"], dev["username"], dev["password"])
+    rep = {"device_id": dev["id"], "name": dev["name"], "timings_ms": {}, "errors": []}
+    timings = rep["timings_ms"]
+    try:
+        t = time.perf_counter()
+        count = await _call(client.count_users)
+        timings["count"] = _ms(t)
+
+        t = time.perf_counter()
+        have: dict[str, bytes] = {}
+        search_id, pos, pages = secrets.token_hex(8), 0, 0
+        while True:
+            page, more = await _call(lambda: client.search_users(search_id, pos, settings.RECONCILE_PAGE_SIZE))
+            pages += 1
+            for u in page:
+                have[str(u.get("employeeNo"))] = user_fingerprint(u)
+            pos += len(page)
+            if not more or not page:
+                break
+        timings["fetch"] = _ms(t)
+    except ISAPIError as e:
+        rep["errors"].append(str(e))
+        return rep
+
+    t = time.perf_counter()
+    adds = [e for e in want if e not in have]
+    updates = [e for e in want if e in have and have[e] != want[e]]
+    deletes = [e for e in have if e not in want]
+    # A roster that changed under us (or a device that under-reports) must
+    # not turn into deletes of users we simply didn't see.
+    complete = len(have) >= count
+    if not complete:
+        deletes = []
+    timings["diff"] = _ms(t)
+
+    rep.update(
+        device_users=count, fetched=len(have), pages=pages, complete=complete,
+        db_users=len(want), in_sync=len(want) - len(adds) - len(updates),
+        to_add=len(adds), to_update=len(updates), to_delete=len(deletes),
+        added=0, updated=0, deleted=0, added_user_ids=[],
+    )
+    if dry_run:
+        return rep
+
+    t = time.perf_counter()
+
+    async def apply(kind: str, fn, n: int = 1, on_ok=None, retried: bool = False):
+        try:
+            await (fn() if retried else _call(fn))
+            rep[kind] += n
+            if on_ok:
+                on_ok()
+        except ISAPIError as e:
+            if len(rep["errors"]) < _MAX_ERRORS:
+                rep["errors"].append(f"{kind[:-1]}: {e}")
+
+    ops = []
+    for e in adds:
+        uid, name = users[e][0], users[e][1]
+        ops.append(apply(
+            "added",
+            lambda e=e, name=name: client.upsert_user(
+                e, name, settings.PROVISION_RETRIES, settings.PROVISION_BACKOFF_SECONDS
+            ),
+            on_ok=lambda uid=uid: rep["added_user_ids"].append(uid), retried=True,
+        ))
+    for e in updates:
+        ops.append(apply("updated", lambda e=e: client.modify_user(e, users[e][1])))
+    step = settings.RECONCILE_DELETE_BATCH
+    for i in range(0, len(deletes), step):
+        batch = deletes[i:i + step]
+        ops.append(apply("deleted", lambda batch=batch: client.delete_users(batch), n=len(batch)))
+    await asyncio.gather(*ops)
+    timings["apply"] = _ms(t)
+    return rep
+
+
+async def reconcile_job(ctx: JobContext) -> dict:
+    t0 = time.perf_counter()
+    dry_run = bool(ctx.params.get("dry_run"))
+    users, devices = await run_in_threadpool(_load, ctx.company_id, ctx.params.get("device_ids"))
+    want = {e: user_fingerprint(user_info(e, name)) for e, (_, name, _) in users.items()}
+    load_ms = _ms(t0)
+    await ctx.progress(devices=len(devices), devices_done=0, db_users=len(users))
+
+    done = 0
+
+    async def one(dev: dict) -> dict:
+        nonlocal done
+        rep = await reconcile_device(dev, users, want, dry_run)
+        done += 1
+        await ctx.progress(devices_done=done)
+        return rep
+
+    reports = await asyncio.gather(*(one(d) for d in devices))
+
+    # Added users lost their face with the old device entry (if any): push it again.
+    readd = [(r["device_id"], uid) for r in reports for uid in r.pop("added_user_ids", [])]
+    if readd:
+        await run_in_threadpool(_forget_faces, readd)
+        face_users = {uid for (uid, _, has_face) in users.values() if has_face}
+        for uid in {u for _, u in readd} & face_users:
+            provisioner.enqueue_face(ctx.company_id, uid)
+
+    return {
+        "dry_run": dry_run,
+        "db_users": len(users),
+        "devices": reports,
+        "load_ms": load_ms,
+        "total_ms": _ms(t0),
+    }
+
+
+job_runner.register("reconcile", reconcile_job)
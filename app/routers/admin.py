@@ -4,8 +4,12 @@ import datetime as dt
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from starlette.concurrency import run_in_threadpool
 
-from ..core.db import get_db
+from ..core.auth import hash_pool
+from ..core.config import settings
+from ..core.db import engine, get_db, get_read_db, read_engine, release_connection
+from ..core.profiling import route_stats
 from ..deps import require_admin
 from ..schemas import (
     CompanyCreate,
@@ -16,6 +20,7 @@ from ..schemas import (
     OwnerOut,
     OwnerCreatedResponse,
     OwnerPageOut,
+    JobPageOut,
 )
 from ..crud import (
     create_company,
@@ -24,9 +29,19 @@ from ..crud import (
     update_company,
     delete_company,
     create_owner,
-    set_account_password,
+    set_account_password_hash,
+    delete_account,
+    session_table_stats,
 )
-from ..models import Account
+from ..cleanup import purge_company_job  # noqa: F401  (registers the "purge_company" job kind)
+from ..jobs import job_runner, job_to_out
+from ..models import Account, Job
+from ..provisioning import provisioner
+from ..session_cache import session_cache
+from ..session_sweeper import session_sweeper
+from ..terminals import terminal_registry
+from ..token_revocations import revocations
+from ..ws_manager import manager
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -40,7 +55,7 @@ def admin_list_companies(
     q: str | None = Query(None, description="Search by company name"),
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=200),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _=Depends(require_admin),
 ):
     total, items = list_companies(db, q=q, page=page, limit=limit)
@@ -64,11 +79,15 @@ def admin_update_company(company_id: int, body: CompanyUpdate, db: Session = Dep
 
 
 @router.delete("/companies/{company_id}")
-def admin_delete_company(company_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
-    ok = delete_company(db, company_id)
+async def admin_delete_company(company_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
+    """Mark the company deleted (keys stop working at once) and purge its
+    data in a background job; progress at GET /admin/jobs?kind=purge_company."""
+    ok = await run_in_threadpool(delete_company, db, company_id)
     if not ok:
         raise HTTPException(404, "Company not found")
-    return {"ok": True}
+    await manager.disconnect_company(company_id)
+    job_id, _ = await job_runner.start("purge_company", company_id)
+    return {"ok": True, "job_id": job_id}
 
 
 # ==========================
@@ -109,7 +128,7 @@ def admin_list_owners(
     q: str | None = Query(None, description="Search by username"),
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=200),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     _=Depends(require_admin),
 ):
     qry = db.query(Account).filter(Account.role == "owner")
@@ -132,12 +151,14 @@ def admin_get_owner(owner_id: int, db: Session = Depends(get_db), _=Depends(requ
 
 
 @router.post("/owners/{owner_id}/reset-password", response_model=OwnerCreatedResponse)
-def admin_reset_owner_password(owner_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
-    acc = db.get(Account, owner_id)
+async def admin_reset_owner_password(owner_id: int, db: Session = Depends(get_db), _=Depends(require_admin)):
+    acc = await run_in_threadpool(db.get, Account, owner_id)
     if not acc or acc.role != "owner":
         raise HTTPException(404, "Owner not found")
     pwd = secrets.token_urlsafe(12)
-    set_account_password(db, acc, pwd)
+    await run_in_threadpool(release_connection, db, acc)
+    pwd_hash = await hash_pool.hash_password(pwd)
+    await run_in_threadpool(set_account_password_hash, db, acc, pwd_hash)
     out = _owner_to_out(acc)
     return OwnerCreatedResponse(**out.model_dump(), password=pwd)
 
@@ -147,6 +168,96 @@ def admin_delete_owner(owner_id: int, db: Session = Depends(get_db), _=Depends(r
     acc = db.get(Account, owner_id)
     if not acc or acc.role != "owner":
         raise HTTPException(404, "Owner not found")
-    db.delete(acc)
-    db.commit()
+    delete_account(db, acc)
+    return {"ok": True}
+
+
+# ==========================
+# Sessions
+# ==========================
+
+
+@router.get("/sessions/stats")
+def admin_session_stats(db: Session = Depends(get_db), _=Depends(require_admin)):
+    """account_sessions table size, sweeper progress and session cache counters."""
+    return {
+        "table": session_table_stats(db),
+        "sweeper": session_sweeper.stats(),
+        "cache": session_cache.stats(),
+        "revocations": revocations.stats(),
+    }
+
+
+@router.get("/ws/stats")
+def admin_ws_stats(_=Depends(require_admin)):
+    """Realtime websocket fan-out: clients, outbound queue depth, evictions.
+
+    `db_pool_checked_out` (including this request's own connection) should
+    stay near 1 no matter how many sockets are open: websockets only touch the
+    DB while authenticating.
+    """
+    checkedout = getattr(engine.pool, "checkedout", None)
+    out = {**manager.stats(), "db_pool_checked_out": checkedout() if checkedout else None}
+    if read_engine is not engine:
+        checkedout = getattr(read_engine.pool, "checkedout", None)
+        out["read_db_pool_checked_out"] = checkedout() if checkedout else None
+    return out
+
+
+@router.get("/profiling/routes")
+def admin_profiling_routes(
+    order: str = Query(
+        "total_ms",
+        pattern="^(total_ms|sql_ms|python_ms|avg_ms|max_ms|statements|avg_statements|rows|count)$",
+    ),
+    limit: int = Query(20, ge=1, le=500),
+    _=Depends(require_admin),
+):
+    """Top routes of this worker since start (or the last reset): request
+    count, total/SQL/Python time, SQL statements, commits and rows."""
+    return {"enabled": settings.PROFILING_ENABLED, "items": route_stats.top(order, limit)}
+
+
+@router.get("/profiling/slow")
+def admin_profiling_slow(limit: int = Query(20, ge=1, le=500), _=Depends(require_admin)):
+    """Most recent requests over SLOW_REQUEST_MS on this worker, with their statements."""
+    return {"threshold_ms": settings.SLOW_REQUEST_MS, "items": list(route_stats.slow)[::-1][:limit]}
+
+
+@router.delete("/profiling")
+def admin_profiling_reset(_=Depends(require_admin)):
+    route_stats.reset()
     return {"ok": True}
+
+
+@router.get("/provisioning/stats")
+def admin_provisioning_stats(_=Depends(require_admin)):
+    """Device provisioning queue: queued/in-flight users, per-outcome counters, retries."""
+    return provisioner.stats()
+
+
+@router.get("/terminals/stats")
+def admin_terminals_stats(_=Depends(require_admin)):
+    """Terminal registry of this worker: sightings not yet flushed, rows written, failed flushes."""
+    return terminal_registry.stats()
+
+
+@router.get("/jobs", response_model=JobPageOut)
+def admin_list_jobs(
+    kind: str | None = Query(None),
+    status: str | None = Query(None, description="queued|running|done|failed"),
+    company_id: int | None = Query(None),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_read_db),
+    _=Depends(require_admin),
+):
+    """Background jobs of all companies, newest first."""
+    qry = db.query(Job)
+    if kind:
+        qry = qry.filter(Job.kind == kind)
+    if status:
+        qry = qry.filter(Job.status == status)
+    if company_id is not None:
+        qry = qry.filter(Job.company_id == company_id)
+    total = qry.count()
+    return {"total": total, "items": [job_to_out(j) for j in qry.order_by(Job.id.desc()).limit(limit)]}
@@ -1,43 +1,63 @@
 import datetime as dt
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Security
+from fastapi.security import HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from ..core.db import get_db
-from ..core.auth import verify_password
+from ..core.config import settings
+from ..core.db import get_db, release_connection
+from ..core.auth import hash_pool, needs_rehash
 from ..crud import (
     get_account_by_username,
     create_session,
-    revoke_session,
-    set_account_password,
+    create_signed_token,
+    revoke_access_token,
+    set_account_password_hash,
 )
-from ..deps import require_account
+from ..deps import bearer_scheme, require_account
 from ..schemas import LoginRequest, TokenResponse, MeResponse, ChangePasswordRequest
 
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+def _load_for_login(db: Session, username: str):
+    acc = get_account_by_username(db, username)
+    release_connection(db, acc)  # don't hold a DB connection during PBKDF2
+    return acc
+
+
 @router.post("/login", response_model=TokenResponse)
-def login(body: LoginRequest, req: Request, db: Session = Depends(get_db)):
-    acc = get_account_by_username(db, body.username)
+async def login(body: LoginRequest, req: Request, db: Session = Depends(get_db)):
+    # async so PBKDF2 waits on hash_pool, not on an API threadpool slot
+    acc = await run_in_threadpool(_load_for_login, db, body.username)
     if not acc or not acc.is_active:
         raise HTTPException(401, "Invalid credentials")
-    if not verify_password(body.password, acc.password_hash):
+    if not await hash_pool.verify_password(body.password, acc.password_hash):
         raise HTTPException(401, "Invalid credentials")
 
-    token, exp = create_session(
-        db,
-        acc,
-        user_agent=req.headers.get("user-agent"),
-        ip=req.client.host if req.client else None,
-    )
+    if needs_rehash(acc.password_hash):
+        # PASSWORD_PBKDF2_ITERATIONS changed: upgrade, saved by create_session's commit
+        acc.password_hash = await hash_pool.hash_password(body.password)
+
+    role, company_id = acc.role, acc.company_id  # read before commit expires acc
+    if settings.AUTH_TOKEN_MODE == "signed":
+        token, exp = await run_in_threadpool(create_signed_token, db, acc)
+    else:
+        token, exp = await run_in_threadpool(
+            create_session,
+            db,
+            acc,
+            user_agent=req.headers.get("user-agent"),
+            ip=req.client.host if req.client else None,
+        )
 
     return TokenResponse(
         access_token=token,
         expires_at=exp.astimezone(dt.timezone.utc).isoformat(),
-        role=acc.role,
-        company_id=acc.company_id,
+        role=role,
+        company_id=company_id,
     )
 
 
@@ -53,16 +73,26 @@ def me(acc=Depends(require_account)):
 
 
 @router.post("/logout")
-def logout(acc=Depends(require_account), db: Session = Depends(get_db)):
-    token = getattr(acc, "_raw_token", None)
-    if token:
-        revoke_session(db, token)
+def logout(
+    acc=Depends(require_account),
+    cred: HTTPAuthorizationCredentials = Security(bearer_scheme),
+    db: Session = Depends(get_db),
+):
+    revoke_access_token(db, cred.credentials.strip())
     return {"ok": True}
 
 
+def _load_hash_and_release(db: Session, acc) -> None:
+    # Signed tokens carry no password_hash: load it while still attached.
+    acc.password_hash
+    release_connection(db, acc)
+
+
 @router.post("/change-password")
-def change_password(body: ChangePasswordRequest, acc=Depends(require_account), db: Session = Depends(get_db)):
-    if not verify_password(body.old_password, acc.password_hash):
+async def change_password(body: ChangePasswordRequest, acc=Depends(require_account), db: Session = Depends(get_db)):
+    await run_in_threadpool(_load_hash_and_release, db, acc)
+    if not await hash_pool.verify_password(body.old_password, acc.password_hash):
         raise HTTPException(400, "Old password is wrong")
-    set_account_password(db, acc, body.new_password)
+    new_hash = await hash_pool.hash_password(body.new_password)
+    await run_in_threadpool(set_account_password_hash, db, acc, new_hash)
     return {"ok": True}
@@ -0,0 +1,120 @@
+import datetime as dt
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.db import get_db
+from ..deps import require_company_access
+from ..jobs import job_runner, job_to_out
+from ..models import Device, DeviceFace, Job
+from ..reconcile import reconcile_job  # noqa: F401  (registers the "reconcile" job kind)
+from ..schemas import DeviceCreate, DeviceOut, DeviceUpdate, JobOut, ReconcileIn, TerminalPageOut
+from ..terminals import terminal_registry
+
+router = APIRouter(prefix="/companies/{company_id}", tags=["devices"])
+
+
+def _get_device(db: Session, company_id: int, device_id: int) -> Device:
+    d = db.get(Device, device_id)
+    if not d or d.company_id != company_id:
+        raise HTTPException(404, "Device not found")
+    return d
+
+
+@router.get("/devices", response_model=list[DeviceOut])
+def list_devices_ep(
+    company_id: int,
+    db: Session = Depends(get_db),
+    company=Depends(require_company_access),
+):
+    return db.query(Device).filter(Device.company_id == company_id).order_by(Device.id).all()
+
+
+@router.get("/terminals", response_model=TerminalPageOut)
+def list_terminals_ep(
+    company_id: int,
+    db: Session = Depends(get_db),
+    company=Depends(require_company_access),
+):
+    """Terminals that have posted to the company's webhook, most recently
+    seen first; `online` if one posted within DEVICE_OFFLINE_SECONDS."""
+    items = terminal_registry.list_for(db, company.id, dt.datetime.now(dt.timezone.utc))
+    for t in items:
+        t["first_seen_at"] = t["first_seen_at"].isoformat()
+        t["last_seen_at"] = t["last_seen_at"].isoformat()
+    return {
+        "total": len(items),
+        "online": sum(t["online"] for t in items),
+        "offline_after_seconds": settings.DEVICE_OFFLINE_SECONDS,
+        "items": items,
+    }
+
+
+@router.post("/devices", response_model=DeviceOut)
+def create_device_ep(
+    company_id: int,
+    body: DeviceCreate,
+    db: Session = Depends(get_db),
+    company=Depends(require_company_access),
+):
+    """Register a terminal for user provisioning (ISAPI, digest auth)."""
+    d = Device(company_id=company.id, **body.model_dump())
+    d.base_url = d.base_url.rstrip("/")
+    db.add(d)
+    db.commit()
+    db.refresh(d)
+    return d
+
+
+@router.put("/devices/{device_id}", response_model=DeviceOut)
+def update_device_ep(
+    company_id: int,
+    device_id: int,
+    body: DeviceUpdate,
+    db: Session = Depends(get_db),
+    company=Depends(require_company_access),
+):
+    d = _get_device(db, company_id, device_id)
+    old_url = d.base_url
+    for k in body.model_fields_set:
+        v = getattr(body, k)
+        if v is not None:
+            setattr(d, k, v.rstrip("/") if k == "base_url" else v)
+    if d.base_url != old_url:
+        # Possibly a different terminal now: forget which faces it had.
+        db.query(DeviceFace).filter(DeviceFace.device_id == d.id).delete(synchronize_session=False)
+    db.commit()
+    db.refresh(d)
+    return d
+
+
+@router.delete("/devices/{device_id}")
+def delete_device_ep(
+    company_id: int,
+    device_id: int,
+    db: Session = Depends(get_db),
+    company=Depends(require_company_access),
+):
+    d = _get_device(db, company_id, device_id)
+    db.query(DeviceFace).filter(DeviceFace.device_id == d.id).delete(synchronize_session=False)
+    db.delete(d)
+    db.commit()
+    return {"ok": True}
+
+
+@router.post("/devices/reconcile", response_model=JobOut, status_code=202)
+async def reconcile_devices_ep(
+    company_id: int,
+    body: ReconcileIn,
+    db: Session = Depends(get_db),
+    company=Depends(require_company_access),
+):
+    """Diff each device's roster against the users table and apply only the
+    missing adds, stale updates and extra deletes (background job; poll
+    GET /companies/{company_id}/jobs/{id} for the per-device report).
+
+    A reconcile already running for the company is returned instead.
+    """
+    job_id, _ = await job_runner.start("reconcile", company.id, body.model_dump())
+    return job_to_out(db.get(Job, job_id))
@@ -7,21 +7,141 @@ from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from ..core.config import settings
-from ..core.db import get_db
+from ..core.db import get_read_db, route_recent_to_primary
+from ..core.responses import FastJSONResponse
 from ..deps import require_owner
 from ..models import EventLog, User
 from ..schemas import (
-    EventOut,
-    EventOutDetailed,
     EventPageOut,
+    EventColumnarOut,
     AttendanceRowOut,
     AttendancePageOut,
+    AttendanceColumnarOut,
     AttendanceUserStatsOut,
 )
 
 router = APIRouter(prefix="/companies/{company_id}", tags=["events"])
 
 
+# Column projection for /events: rows come back as tuples, never as EventLog
+# entities, and the JSON payload is only selected when it is asked for.
+_EVENT_COLUMNS = (
+    EventLog.id,
+    EventLog.event_id,
+    EventLog.company_id,
+    EventLog.user_id,
+    EventLog.employee_no,
+    EventLog.device_id,
+    EventLog.event_type,
+    EventLog.ts,
+)
+
+
+def _utc_iso(ts: dt.datetime) -> str:
+    return ts.astimezone(dt.timezone.utc).isoformat()
+
+
+def _event_row(r, include_payload: bool) -> dict[str, Any]:
+    """Same shape as EventOut / EventOutDetailed."""
+    out = {
+        "id": r[0],
+        "event_id": r[1],
+        "company_id": r[2],
+        "user_id": r[3],
+        "employee_no": r[4],
+        "device_id": r[5],
+        "event_type": r[6],
+        "ts": _utc_iso(r[7]),
+    }
+    if include_payload:
+        out["payload"] = r[8] or {}
+    return out
+
+
+_EVENT_FIELDS = ("id", "event_id", "user_id", "employee_no", "device_id", "event_type", "ts")
+_ATTENDANCE_FIELDS = ("user_id", "date", "first_in", "last_out", "duration_min", "events_count")
+
+_FORMAT_QUERY = Query(
+    "rows",
+    alias="format",
+    pattern="^(rows|columnar)$",
+    description="rows: list of objects. columnar: shared fields once + parallel arrays",
+)
+
+
+def _events_response(company_id: int, total: int, items: list[dict[str, Any]], fmt: str, include_payload: bool):
+    if fmt != "columnar":
+        return FastJSONResponse({"total": total, "items": items})
+    fields = _EVENT_FIELDS + ("payload",) if include_payload else _EVENT_FIELDS
+    return FastJSONResponse(
+        {
+            "format": "columnar",
+            "total": total,
+            "company_id": company_id,
+            "columns": {k: [it[k] for it in items] for k in fields},
+        }
+    )
+
+
+def _attendance_response(company_id: int, total: int, items: list[dict[str, Any]], fmt: str):
+    if fmt != "columnar":
+        return FastJSONResponse({"total": total, "items": items})
+    users: dict[int, dict[str, Any]] = {}
+    for it in items:
+        if it["user_id"] not in users:
+            users[it["user_id"]] = {
+                "first_name": it["first_name"],
+                "last_name": it["last_name"],
+                "phone": it["phone"],
+            }
+    return FastJSONResponse(
+        {
+            "format": "columnar",
+            "total": total,
+            "company_id": company_id,
+            "users": users,
+            "columns": {k: [it[k] for it in items] for k in _ATTENDANCE_FIELDS},
+        }
+    )
+
+
+def _attendance_row(
+    company_id: int,
+    user_id: int,
+    day: str,
+    info: dict[str, Any] | None,
+    tz: dt.tzinfo,
+    first_name: str | None,
+    last_name: str | None,
+    phone: str | None,
+) -> dict[str, Any]:
+    """Same shape as AttendanceRowOut."""
+    first_in = last_out = dur = None
+    count = 0
+    if info:
+        first_ts = info["min"]
+        last_ts = info["max"]
+        try:
+            dur = int((last_ts - first_ts).total_seconds() // 60)
+        except Exception:
+            dur = None
+        first_in = first_ts.astimezone(tz).isoformat() if first_ts else None
+        last_out = last_ts.astimezone(tz).isoformat() if last_ts else None
+        count = int(info["count"])
+    return {
+        "company_id": company_id,
+        "user_id": user_id,
+        "date": day,
+        "first_in": first_in,
+        "last_out": last_out,
+        "duration_min": dur,
+        "events_count": count,
+        "first_name": first_name,
+        "last_name": last_name,
+        "phone": phone,
+    }
+
+
 def _parse_range(*, start: str | None, end: str | None, tz: dt.tzinfo) -> tuple[dt.datetime | None, dt.datetime | None]:
     """Parse a datetime/date range.
 
@@ -52,7 +172,7 @@ def _parse_range(*, start: str | None, end: str | None, tz: dt.tzinfo) -> tuple[
     return _parse_one(start, False), _parse_one(end, True)
 
 
-@router.get("/events", response_model=EventPageOut)
+@router.get("/events", response_model=EventPageOut | EventColumnarOut)
 def list_events(
     company_id: int,
     user_id: int | None = Query(None),
@@ -70,7 +190,8 @@ def list_events(
     sort: str = Query("-ts", description="ts,-ts,id,-id"),
     page: int = Query(1, ge=1),
     limit: int = Query(100, ge=1, le=500),
-    db: Session = Depends(get_db),
+    fmt: str = _FORMAT_QUERY,
+    db: Session = Depends(get_read_db),
     company=Depends(require_owner),
 ):
 
@@ -80,8 +201,10 @@ def list_events(
         tz = dt.timezone.utc
 
     start_utc, end_utc = _parse_range(start=start, end=end, tz=tz)
+    route_recent_to_primary(db, end_utc)
 
-    qry = db.query(EventLog).filter(EventLog.company_id == company_id)
+    cols = _EVENT_COLUMNS + (EventLog.payload,) if include_payload else _EVENT_COLUMNS
+    qry = db.query(*cols).filter(EventLog.company_id == company_id)
     if user_id is not None:
         qry = qry.filter(EventLog.user_id == user_id)
     if employee_no:
@@ -116,41 +239,11 @@ def list_events(
         qry = qry.order_by(EventLog.id.desc())
 
     xs = qry.offset((page - 1) * limit).limit(limit).all()
+    items = [_event_row(r, include_payload) for r in xs]
+    return _events_response(company_id, total, items, fmt, include_payload)
 
-    if include_payload:
-        items = [
-            EventOutDetailed(
-                id=e.id,
-                event_id=e.event_id,
-                company_id=e.company_id,
-                user_id=e.user_id,
-                employee_no=e.employee_no,
-                device_id=e.device_id,
-                event_type=e.event_type,
-                ts=e.ts.astimezone(dt.timezone.utc).isoformat(),
-                payload=e.payload or {},
-            )
-            for e in xs
-        ]
-    else:
-        items = [
-            EventOut(
-                id=e.id,
-                event_id=e.event_id,
-                company_id=e.company_id,
-                user_id=e.user_id,
-                employee_no=e.employee_no,
-                device_id=e.device_id,
-                event_type=e.event_type,
-                ts=e.ts.astimezone(dt.timezone.utc).isoformat(),
-            )
-            for e in xs
-        ]
-
-    return {"total": total, "items": items}
 
-
-@router.get("/attendance/days", response_model=AttendancePageOut)
+@router.get("/attendance/days", response_model=AttendancePageOut | AttendanceColumnarOut)
 def attendance_days(
     company_id: int,
     start_date: str | None = Query(None, description="YYYY-MM-DD (company timezone). Default: last 7 days"),
@@ -159,7 +252,8 @@ def attendance_days(
     q: str | None = Query(None, description="Search users by name/phone"),
     page: int = Query(1, ge=1),
     limit: int = Query(100, ge=1, le=500),
-    db: Session = Depends(get_db),
+    fmt: str = _FORMAT_QUERY,
+    db: Session = Depends(get_read_db),
     company=Depends(require_owner),
 ):
     try:
@@ -177,6 +271,7 @@ def attendance_days(
     end_local = dt.datetime.combine(end_d, dt.time.min).replace(tzinfo=tz) + dt.timedelta(days=1)
     start_utc = start_local.astimezone(dt.timezone.utc)
     end_utc = end_local.astimezone(dt.timezone.utc)
+    route_recent_to_primary(db, end_utc)
 
     # Optional user filter by query
     allowed_user_ids: set[int] | None = None
@@ -194,12 +289,12 @@ def attendance_days(
         )
         allowed_user_ids = {int(x[0]) for x in ids}
         if not allowed_user_ids:
-            return {"total": 0, "items": []}
+            return _attendance_response(company_id, 0, [], fmt)
 
     if user_id is not None:
         allowed_user_ids = {user_id} if allowed_user_ids is None else (allowed_user_ids & {user_id})
         if not allowed_user_ids:
-            return {"total": 0, "items": []}
+            return _attendance_response(company_id, 0, [], fmt)
 
     q_ev = (
         db.query(EventLog.user_id, EventLog.ts)
@@ -234,47 +329,42 @@ def attendance_days(
                 b["max"] = ts_utc
 
     if not buckets:
-        return {"total": 0, "items": []}
+        return _attendance_response(company_id, 0, [], fmt)
 
     # Fetch user info
     user_ids = sorted({uid for (uid, _d) in buckets.keys()})
-    users = db.query(User).filter(User.company_id == company_id, User.id.in_(user_ids)).all()
-    umap = {u.id: u for u in users}
+    users = (
+        db.query(User.id, User.first_name, User.last_name, User.phone)
+        .filter(User.company_id == company_id, User.id.in_(user_ids))
+        .all()
+    )
+    umap = {u[0]: u for u in users}
 
-    items_all: list[AttendanceRowOut] = []
+    items_all: list[dict[str, Any]] = []
     for (uid, d), info in buckets.items():
         u = umap.get(uid)
-        first_ts = info["min"]
-        last_ts = info["max"]
-        try:
-            dur = int((last_ts - first_ts).total_seconds() // 60) if last_ts and first_ts else None
-        except Exception:
-            dur = None
-
         items_all.append(
-            AttendanceRowOut(
-                company_id=company_id,
-                user_id=uid,
-                date=d,
-                first_in=first_ts.astimezone(tz).isoformat() if first_ts else None,
-                last_out=last_ts.astimezone(tz).isoformat() if last_ts else None,
-                duration_min=dur,
-                events_count=int(info["count"]),
-                first_name=u.first_name if u else None,
-                last_name=u.last_name if u else None,
-                phone=u.phone if u else None,
+            _attendance_row(
+                company_id,
+                uid,
+                d,
+                info,
+                tz,
+                u[1] if u else None,
+                u[2] if u else None,
+                u[3] if u else None,
             )
         )
 
     # Sort: newest date first, then user_id
-    items_all.sort(key=lambda x: (x.date, x.user_id), reverse=True)
+    items_all.sort(key=lambda x: (x["date"], x["user_id"]), reverse=True)
     total = len(items_all)
     start_i = (page - 1) * limit
     end_i = start_i + limit
-    return {"total": total, "items": items_all[start_i:end_i]}
+    return _attendance_response(company_id, total, items_all[start_i:end_i], fmt)
 
 
-@router.get("/attendance/range", response_model=AttendancePageOut)
+@router.get("/attendance/range", response_model=AttendancePageOut | AttendanceColumnarOut)
 def attendance_range_full(
     company_id: int,
     start_date: str | None = Query(None, description="YYYY-MM-DD (company timezone). Default: last 7 days"),
@@ -283,13 +373,15 @@ def attendance_range_full(
     q: str | None = Query(None, description="Search users by name/phone/employee_no"),
     page: int = Query(1, ge=1),
     limit: int = Query(200, ge=1, le=1000),
-    db: Session = Depends(get_db),
+    fmt: str = _FORMAT_QUERY,
+    db: Session = Depends(get_read_db),
     company=Depends(require_owner),
 ):
     """Full attendance grid.
 
     - If filters are not provided, returns ALL users for the date range.
     - If a user has no events on a day, returns the day with null first_in/last_out/duration and events_count=0.
+    - format=columnar: user info once in `users`, rows as parallel arrays in `columns`.
     """
 
     try:
@@ -303,8 +395,14 @@ def attendance_range_full(
     if start_d > end_d:
         start_d, end_d = end_d, start_d
 
+    start_local = dt.datetime.combine(start_d, dt.time.min).replace(tzinfo=tz)
+    end_local = dt.datetime.combine(end_d, dt.time.min).replace(tzinfo=tz) + dt.timedelta(days=1)
+    start_utc = start_local.astimezone(dt.timezone.utc)
+    end_utc = end_local.astimezone(dt.timezone.utc)
+    route_recent_to_primary(db, end_utc)
+
     # Users selection
-    u_q = db.query(User).filter(User.company_id == company_id)
+    u_q = db.query(User.id, User.first_name, User.last_name, User.phone).filter(User.company_id == company_id)
     if q:
         qq = f"%{q.strip().lower()}%"
         u_q = u_q.filter(
@@ -318,10 +416,9 @@ def attendance_range_full(
 
     users = u_q.order_by(User.id.asc()).all()
     if not users:
-        return {"total": 0, "items": []}
+        return _attendance_response(company_id, 0, [], fmt)
 
     user_ids = [u.id for u in users]
-    umap = {u.id: u for u in users}
 
     # Date list (inclusive)
     days: list[dt.date] = []
@@ -330,11 +427,6 @@ def attendance_range_full(
         days.append(d)
         d += dt.timedelta(days=1)
 
-    start_local = dt.datetime.combine(start_d, dt.time.min).replace(tzinfo=tz)
-    end_local = dt.datetime.combine(end_d, dt.time.min).replace(tzinfo=tz) + dt.timedelta(days=1)
-    start_utc = start_local.astimezone(dt.timezone.utc)
-    end_utc = end_local.astimezone(dt.timezone.utc)
-
     # Events buckets
     rows = (
         db.query(EventLog.user_id, EventLog.ts)
@@ -366,54 +458,29 @@ def attendance_range_full(
             if ts_utc > b["max"]:
                 b["max"] = ts_utc
 
-    items_all: list[AttendanceRowOut] = []
+    items_all: list[dict[str, Any]] = []
     for u in users:
         for day in days:
             day_str = day.isoformat()
-            info = buckets.get((u.id, day_str))
-            if info:
-                first_ts = info["min"]
-                last_ts = info["max"]
-                try:
-                    dur = int((last_ts - first_ts).total_seconds() // 60)
-                except Exception:
-                    dur = None
-                items_all.append(
-                    AttendanceRowOut(
-                        company_id=company_id,
-                        user_id=u.id,
-                        date=day_str,
-                        first_in=first_ts.astimezone(tz).isoformat() if first_ts else None,
-                        last_out=last_ts.astimezone(tz).isoformat() if last_ts else None,
-                        duration_min=dur,
-                        events_count=int(info["count"]),
-                        first_name=u.first_name,
-                        last_name=u.last_name,
-                        phone=u.phone,
-                    )
-                )
-            else:
-                items_all.append(
-                    AttendanceRowOut(
-                        company_id=company_id,
-                        user_id=u.id,
-                        date=day_str,
-                        first_in=None,
-                        last_out=None,
-                        duration_min=None,
-                        events_count=0,
-                        first_name=u.first_name,
-                        last_name=u.last_name,
-                        phone=u.phone,
-                    )
+            items_all.append(
+                _attendance_row(
+                    company_id,
+                    u.id,
+                    day_str,
+                    buckets.get((u.id, day_str)),
+                    tz,
+                    u.first_name,
+                    u.last_name,
+                    u.phone,
                 )
+            )
 
     # Sort: newest date first, then user_id
-    items_all.sort(key=lambda x: (x.date, x.user_id), reverse=True)
+    items_all.sort(key=lambda x: (x["date"], x["user_id"]), reverse=True)
     total = len(items_all)
     start_i = (page - 1) * limit
     end_i = start_i + limit
-    return {"total": total, "items": items_all[start_i:end_i]}
+    return _attendance_response(company_id, total, items_all[start_i:end_i], fmt)
 
 
 @router.get("/attendance/users/{user_id}/stats", response_model=AttendanceUserStatsOut)
@@ -422,7 +489,7 @@ def attendance_user_stats(
     user_id: int,
     start_date: str | None = Query(None, description="YYYY-MM-DD (company timezone). Default: last 7 days"),
     end_date: str | None = Query(None, description="YYYY-MM-DD (company timezone). Default: today"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     company=Depends(require_owner),
 ):
     """Per-user attendance statistics for a date range."""
@@ -432,16 +499,22 @@ def attendance_user_stats(
     except Exception:
         tz = dt.timezone.utc
 
-    u = db.query(User).filter(User.company_id == company_id, User.id == user_id).first()
-    if not u:
-        raise HTTPException(404, "User not found")
-
     today = dt.datetime.now(tz).date()
     end_d = dt.date.fromisoformat(end_date) if end_date else today
     start_d = dt.date.fromisoformat(start_date) if start_date else (end_d - dt.timedelta(days=6))
     if start_d > end_d:
         start_d, end_d = end_d, start_d
 
+    start_local = dt.datetime.combine(start_d, dt.time.min).replace(tzinfo=tz)
+    end_local = dt.datetime.combine(end_d, dt.time.min).replace(tzinfo=tz) + dt.timedelta(days=1)
+    start_utc = start_local.astimezone(dt.timezone.utc)
+    end_utc = end_local.astimezone(dt.timezone.utc)
+    route_recent_to_primary(db, end_utc)
+
+    u = db.query(User).filter(User.company_id == company_id, User.id == user_id).first()
+    if not u:
+        raise HTTPException(404, "User not found")
+
     # Date list (inclusive)
     days_list: list[dt.date] = []
     d = start_d
@@ -449,11 +522,6 @@ def attendance_user_stats(
         days_list.append(d)
         d += dt.timedelta(days=1)
 
-    start_local = dt.datetime.combine(start_d, dt.time.min).replace(tzinfo=tz)
-    end_local = dt.datetime.combine(end_d, dt.time.min).replace(tzinfo=tz) + dt.timedelta(days=1)
-    start_utc = start_local.astimezone(dt.timezone.utc)
-    end_utc = end_local.astimezone(dt.timezone.utc)
-
     rows = (
         db.query(EventLog.ts)
         .filter(
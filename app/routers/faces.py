@@ -0,0 +1,102 @@
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.db import get_db
+from ..crud import release_face_blob
+from ..deps import require_company_access
+from ..face_store import FaceTooLarge, face_store
+from ..models import Face, User
+from ..provisioning import provisioner
+from ..schemas import FaceOut, FaceSyncOut
+from ..ws_manager import manager
+
+router = APIRouter(prefix="/companies/{company_id}", tags=["faces"])
+
+_JPEG_MAGIC = b"\xff\xd8\xff"
+
+
+def _get_user(db: Session, company_id: int, user_id: int) -> User:
+    u = db.get(User, user_id)
+    if not u or u.company_id != company_id:
+        raise HTTPException(404, "User not found")
+    return u
+
+
+async def _jpeg_stream(request: Request):
+    """The request body; raising here (not a JPEG, empty) makes
+    face_store.save drop its temp file, so nothing is stored."""
+    first = True
+    async for chunk in request.stream():
+        if first and chunk:
+            if not chunk.startswith(_JPEG_MAGIC):
+                raise HTTPException(415, "Face image must be a JPEG")
+            first = False
+        yield chunk
+    if first:
+        raise HTTPException(400, "Empty body")
+
+
+@router.put("/users/{user_id}/face", response_model=FaceOut)
+async def put_face_ep(
+    company_id: int,
+    user_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    company=Depends(require_company_access),
+):
+    """Set the user's enrollment photo: raw JPEG request body (Content-Type: image/jpeg).
+
+    The image is streamed to disk, then pushed to every enabled device that
+    doesn't already have this exact image.
+    """
+    _get_user(db, company_id, user_id)
+    try:
+        async with face_store.save(_jpeg_stream(request), settings.FACE_MAX_BYTES) as (sha, size):
+            face = db.get(Face, user_id)
+            old = face.sha256 if face else None
+            if face is None:
+                face = Face(user_id=user_id, company_id=company.id, sha256=sha, size=size)
+                db.add(face)
+            else:
+                face.sha256, face.size = sha, size
+            db.commit()
+    except FaceTooLarge:
+        raise HTTPException(413, f"Face image larger than {settings.FACE_MAX_BYTES} bytes")
+    db.refresh(face)
+    if old and old != sha:
+        release_face_blob(db, old)
+
+    provisioner.enqueue_face(company.id, user_id)
+    out = FaceOut(user_id=user_id, sha256=face.sha256, size=face.size, updated_at=face.updated_at.isoformat())
+    await manager.broadcast_to_clients(company.id, {"type": "users.face_updated", "data": out.model_dump()})
+    return out
+
+
+@router.get("/users/{user_id}/face")
+def get_face_ep(
+    company_id: int,
+    user_id: int,
+    db: Session = Depends(get_db),
+    company=Depends(require_company_access),
+):
+    _get_user(db, company_id, user_id)
+    face = db.get(Face, user_id)
+    if face is None or not face_store.exists(face.sha256):
+        raise HTTPException(404, "No face image")
+    return FileResponse(face_store.path(face.sha256), media_type="image/jpeg", headers={"ETag": f'"{face.sha256}"'})
+
+
+@router.post("/faces/sync", response_model=FaceSyncOut)
+async def sync_faces_ep(
+    company_id: int,
+    db: Session = Depends(get_db),
+    company=Depends(require_company_access),
+):
+    """Push every stored face to the company's devices; images a device
+    already has (same hash) are skipped without contacting it."""
+    ids = [uid for (uid,) in db.query(Face.user_id).filter(Face.company_id == company.id)]
+    for uid in ids:
+        provisioner.enqueue_face(company.id, uid)
+    return FaceSyncOut(queued=len(ids))
@@ -2,9 +2,13 @@ from fastapi import APIRouter, Request, Response, Depends, HTTPException
 import json, hashlib, datetime as dt
 from sqlalchemy.orm import Session
 
+from ..core.config import settings
 from ..core.db import get_db
+from ..core.logging_setup import bind_log_context
 from ..crud import get_company_by_edge_key
 from ..models import EventLog, User
+from ..terminals import identify, terminal_registry
+from ..user_activity import record_event
 from ..ws_manager import manager
 
 router = APIRouter(tags=["hikvision"])
@@ -46,11 +50,14 @@ def _parse_ts(payload: dict) -> dt.datetime:
 
 @router.post("/hooks/hikvision/{edge_key}/acs_events")
 async def hikvision_acs_events(edge_key: str, req: Request, db: Session = Depends(get_db)):
+    # Read the (picture-sized) body before the first query: awaiting it while
+    # holding a pooled connection lets slow uploads exhaust the pool.
+    raw = await req.body()
     company = get_company_by_edge_key(db, edge_key)
     if not company:
         raise HTTPException(404, "Unknown edge_key")
+    bind_log_context(company_id=company.id)
 
-    raw = await req.body()
     ct = (req.headers.get("content-type") or "").lower()
     payload = None
 
@@ -75,6 +82,8 @@ async def hikvision_acs_events(edge_key: str, req: Request, db: Session = Depend
     employee_no = (acs.get("employeeNoString") or _find_employee_no(payload) or "").strip()
 
     ts_dt = _parse_ts(payload)
+    terminal = identify(payload)
+    device_key = terminal["device_key"] if terminal else None
 
     # 2) user mapping
     user_id = None
@@ -94,6 +103,8 @@ async def hikvision_acs_events(edge_key: str, req: Request, db: Session = Depend
     seed = {"c": company.id, "emp": employee_no, "ts": ts_dt.isoformat(), "p": payload}
     event_id = hashlib.sha256(str(seed).encode()).hexdigest()[:32]
     if db.query(EventLog).filter(EventLog.event_id == event_id).first():
+        if terminal:
+            terminal_registry.seen(company.id, terminal, dt.datetime.now(dt.timezone.utc), counted=False)
         return Response(status_code=200)
 
     ev = EventLog(
@@ -101,24 +112,30 @@ async def hikvision_acs_events(edge_key: str, req: Request, db: Session = Depend
         company_id=company.id,
         user_id=user_id,
         employee_no=employee_no or None,
-        device_id=None,
+        device_id=device_key,
         event_type="access",
         payload=payload,
         ts=ts_dt,
     )
     db.add(ev)
+    if user_id is not None:
+        record_event(db, company.id, user_id, ts_dt)
+    company_id = company.id
     db.commit()
+    db.close()  # don't hold a pooled connection (company.id would reload it) while broadcasting
+    if terminal:
+        terminal_registry.seen(company_id, terminal, dt.datetime.now(dt.timezone.utc))
 
     # realtime ws (frontend)
-    await manager.broadcast_to_clients(company.id, {
-        "type": "events.access",
-        "data": {
-            "company_id": company.id,
-            "user_id": user_id,
-            "employee_no": employee_no,
-            "ts": ts_dt.isoformat(),
-            "payload": payload,
-        }
-    })
+    data = {
+        "company_id": company_id,
+        "user_id": user_id,
+        "employee_no": employee_no,
+        "device_id": device_key,
+        "ts": ts_dt.isoformat(),
+    }
+    if settings.WS_INCLUDE_PAYLOAD:
+        data["payload"] = payload
+    await manager.broadcast_to_clients(company_id, {"type": "events.access", "data": data})
 
     return Response(status_code=200)
@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+
+from ..core.db import get_db
+from ..deps import require_company_access
+from ..jobs import job_to_out
+from ..models import Job
+from ..schemas import JobOut, JobPageOut
+
+router = APIRouter(prefix="/companies/{company_id}", tags=["jobs"])
+
+
+@router.get("/jobs", response_model=JobPageOut)
+def list_jobs_ep(
+    company_id: int,
+    kind: str | None = Query(None),
+    status: str | None = Query(None, description="queued|running|done|failed"),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db),
+    company=Depends(require_company_access),
+):
+    qry = db.query(Job).filter(Job.company_id == company_id)
+    if kind:
+        qry = qry.filter(Job.kind == kind)
+    if status:
+        qry = qry.filter(Job.status == status)
+    total = qry.count()
+    return {"total": total, "items": [job_to_out(j) for j in qry.order_by(Job.id.desc()).limit(limit)]}
+
+
+@router.get("/jobs/{job_id}", response_model=JobOut)
+def get_job_ep(
+    company_id: int,
+    job_id: int,
+    db: Session = Depends(get_db),
+    company=Depends(require_company_access),
+):
+    j = db.get(Job, job_id)
+    if not j or j.company_id != company_id:
+        raise HTTPException(404, "Job not found")
+    return job_to_out(j)
@@ -1,37 +1,108 @@
+import asyncio
 import os
 
 from fastapi import APIRouter, HTTPException, Query, Depends
+from fastapi.responses import StreamingResponse
 
 from ..core.config import settings
+from ..core.logging_setup import log_follower
 from ..deps import require_admin
+from ..log_search import LEVELS, log_index, rotated_files, search
+
+_TS_PATTERN = r"^\d{4}-\d{2}-\d{2}([ T]\d{2}(:\d{2}(:\d{2})?)?)?$"
+_LEVEL_PATTERN = "^(DEBUG|INFO|WARNING|ERROR|CRITICAL)$"
 
 router = APIRouter(prefix="/logs", tags=["logs"])
 
 
+def _check_name(name: str) -> None:
+    # a plain file name inside LOG_DIR: no separators, no "." / ".." / dotfiles
+    if "/" in name or "\\" in name or name.startswith("."):
+        raise HTTPException(400, "invalid log name")
+
+
 @router.get("/tail")
 def tail_log(
     name: str = Query("app.log", description="log file name"),
     lines: int = Query(200, ge=1, le=2000),
     _=Depends(require_admin),
 ):
-    if "/" in name or "\\" in name:
-        raise HTTPException(400, "invalid log name")
+    _check_name(name)
     path = os.path.join(settings.LOG_DIR, name)
-    if not os.path.exists(path):
+    if not os.path.isfile(path):
         raise HTTPException(404, "log not found")
 
     with open(path, "rb") as f:
-        f.seek(0, os.SEEK_END)
-        size = f.tell()
-        block = 4096
-        data = b""
-        while size > 0 and data.count(b"\n") <= lines:
+        size = f.seek(0, os.SEEK_END)
+        block = 64 * 1024
+        blocks: list[bytes] = []
+        newlines = 0
+        while size > 0 and newlines <= lines:
             step = min(block, size)
-            f.seek(-step, os.SEEK_CUR)
-            data = f.read(step) + data
-            f.seek(-step, os.SEEK_CUR)
             size -= step
+            f.seek(size)
+            b = f.read(step)
+            blocks.append(b)
+            newlines += b.count(b"\n")
 
-    txt = data.decode("utf-8", errors="replace")
+    txt = b"".join(reversed(blocks)).decode("utf-8", errors="replace")
     xs = txt.splitlines()[-lines:]
     return {"name": name, "lines": xs}
+
+
+@router.get("/search")
+def search_logs(
+    name: str = Query("app.log", description="log file name; its rotations (.1, .2, ...) are searched too"),
+    start: str | None = Query(None, pattern=_TS_PATTERN, description="YYYY-MM-DD[ HH[:MM[:SS]]], as written in the log"),
+    end: str | None = Query(None, pattern=_TS_PATTERN, description="inclusive; a prefix matches the whole minute/hour/day"),
+    level: str | None = Query(None, pattern=_LEVEL_PATTERN, description="minimum level"),
+    q: str | None = Query(None, min_length=1, description="case-sensitive substring"),
+    limit: int = Query(200, ge=1, le=5000),
+    _=Depends(require_admin),
+):
+    """Search the log and its rotated files, oldest first.
+
+    Times compare as written in the file: server local time for the text
+    format, UTC for LOG_FORMAT=json. Each file has a sparse timestamp ->
+    offset index, so the scan seeks close to `start` instead of reading from
+    the top.
+    """
+    _check_name(name)
+    files = rotated_files(settings.LOG_DIR, name)
+    if not files:
+        raise HTTPException(404, "log not found")
+    log_index.retain(files)
+    res = search(
+        files,
+        start=start.replace("T", " ") if start else None,
+        end=end.replace("T", " ") if end else None,
+        min_level=LEVELS[level] if level else 0,
+        q=q,
+        limit=limit,
+    )
+    return {"name": name, **res}
+
+
+@router.get("/follow")
+async def follow_logs(
+    level: str | None = Query(None, pattern=_LEVEL_PATTERN, description="minimum level"),
+    q: str | None = Query(None, min_length=1, description="case-sensitive substring"),
+    _=Depends(require_admin),
+):
+    """Server-Sent Events stream of new log lines of this worker as they are written."""
+    sub = log_follower.subscribe(LEVELS[level] if level else 0, q)
+
+    async def stream():
+        try:
+            yield ": following\n\n"
+            while True:
+                try:
+                    line = await asyncio.wait_for(sub.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield "".join(f"data: {x}\n" for x in line.split("\n")) + "\n"
+        finally:
+            log_follower.unsubscribe(sub)
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
@@ -1,18 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+import csv
+import datetime as dt
+import io
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import ValidationError
 from sqlalchemy import func
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
-from ..core.db import get_db
+from ..core.config import settings
+from ..core.db import get_db, get_read_db
+from ..core.responses import FastJSONResponse
 from ..deps import require_company_access
-from ..models import User, EventLog
-from ..schemas import UserOut, UserPageOut, UserCreate, UserUpdate
-from ..crud import create_user
+from ..models import User, UserActivity
+from ..schemas import UserOut, UserPageOut, UserCreate, UserUpdate, UserImportOut
+from ..crud import create_user, bulk_create_users, delete_user_face, release_face_blob
+from ..cleanup import max_event_id
+from ..jobs import job_runner
+from ..provisioning import provisioner
 from ..ws_manager import manager
 
 router = APIRouter(prefix="/companies/{company_id}", tags=["users"])
 
 
-def user_to_out(company, u: User) -> UserOut:
+def _iso(ts: dt.datetime | None) -> str | None:
+    if ts is None:
+        return None
+    if ts.tzinfo is None:  # SQLite drops the offset; values are stored in UTC
+        ts = ts.replace(tzinfo=dt.timezone.utc)
+    return ts.astimezone(dt.timezone.utc).isoformat()
+
+
+def user_to_out(company, u: User, activity: UserActivity | None = None) -> UserOut:
     return UserOut(
         id=u.id,
         company_id=u.company_id,
@@ -23,9 +43,45 @@ def user_to_out(company, u: User) -> UserOut:
         enroll_code=str(u.employee_no or u.id),
         status=u.status,
         last_error=u.last_error,
+        first_seen_at=_iso(activity.first_seen_at) if activity else None,
+        last_seen_at=_iso(activity.last_seen_at) if activity else None,
+        event_count=activity.event_count if activity else 0,
     )
 
 
+# Column projection for list_users_ep; rows are emitted as dicts in UserOut shape.
+_USER_COLUMNS = (
+    User.id,
+    User.company_id,
+    User.first_name,
+    User.last_name,
+    User.phone,
+    User.employee_no,
+    User.status,
+    User.last_error,
+    UserActivity.first_seen_at,
+    UserActivity.last_seen_at,
+    UserActivity.event_count,
+)
+
+
+def _user_row(r) -> dict:
+    return {
+        "id": r[0],
+        "company_id": r[1],
+        "first_name": r[2],
+        "last_name": r[3],
+        "phone": r[4],
+        "employee_no": r[5],
+        "enroll_code": str(r[5] or r[0]),
+        "status": r[6],
+        "last_error": r[7],
+        "first_seen_at": _iso(r[8]),
+        "last_seen_at": _iso(r[9]),
+        "event_count": r[10] or 0,
+    }
+
+
 @router.post("/users", response_model=UserOut)
 async def create_user_ep(
     company_id: int,
@@ -34,12 +90,86 @@ async def create_user_ep(
     company=Depends(require_company_access),
 ):
     u = create_user(db, company, body.first_name, body.last_name, body.phone)
+    provisioner.enqueue_upsert(company.id, u.id)
 
     out = user_to_out(company, u)
     await manager.broadcast_to_clients(company.id, {"type": "users.created", "data": out.model_dump()})
     return out
 
 
+def _import_rows(raw: bytes, content_type: str) -> list:
+    """JSON array of objects, or CSV with a header row (first_name,last_name,phone)."""
+    text = raw.decode("utf-8-sig", errors="replace")
+    if "csv" in content_type:
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames:
+            raise HTTPException(400, "CSV header row required: first_name,last_name,phone")
+        reader.fieldnames = [(f or "").strip().lower() for f in reader.fieldnames]
+        # blank cells count as missing, so required columns report "Field required"
+        return [{k: v.strip() for k, v in r.items() if k and isinstance(v, str) and v.strip()} for r in reader]
+    try:
+        data = json.loads(text)
+    except ValueError:
+        raise HTTPException(400, "Body must be a JSON array or text/csv")
+    if not isinstance(data, list):
+        raise HTTPException(400, "Body must be a JSON array or text/csv")
+    return data
+
+
+@router.post("/users/import", response_model=UserImportOut)
+async def import_users_ep(
+    company_id: int,
+    req: Request,
+    dry_run: bool = Query(False, description="Validate only, insert nothing"),
+    all_or_nothing: bool = Query(False, description="Insert nothing if any row is invalid"),
+    db: Session = Depends(get_db),
+    company=Depends(require_company_access),
+):
+    """Bulk-create users from a JSON array (`application/json`) or CSV
+    (`text/csv`, header `first_name,last_name,phone`).
+
+    Every row is validated before anything is written; invalid rows are
+    reported by position and skipped (or abort the import with
+    `all_or_nothing`). Valid rows are inserted in batches in one transaction,
+    with employee_no = id as for single creation. Clients get a single
+    `users.imported` websocket event instead of one `users.created` per user.
+    """
+    rows = _import_rows(await req.body(), (req.headers.get("content-type") or "").lower())
+    if len(rows) > settings.USER_IMPORT_MAX_ROWS:
+        raise HTTPException(413, f"At most {settings.USER_IMPORT_MAX_ROWS} rows per import")
+
+    valid: list[dict] = []
+    positions: list[int] = []
+    errors = []
+    for i, row in enumerate(rows, start=1):
+        try:
+            body = UserCreate.model_validate(row)
+        except ValidationError as e:
+            errors.append({"row": i, "errors": e.errors(include_url=False, include_context=False, include_input=False)})
+            continue
+        valid.append(body.model_dump())
+        positions.append(i)
+
+    write = valid and not dry_run and not (all_or_nothing and errors)
+    ids = await run_in_threadpool(bulk_create_users, db, company, valid, settings.USER_IMPORT_BATCH_SIZE) if write else []
+
+    for uid in ids:
+        provisioner.enqueue_upsert(company.id, uid)
+    if ids:
+        await manager.broadcast_to_clients(company.id, {
+            "type": "users.imported",
+            "data": {"company_id": company.id, "created": len(ids), "failed": len(errors), "user_ids": ids},
+        })
+    return FastJSONResponse({
+        "total": len(rows),
+        "created": len(ids),
+        "failed": len(errors),
+        "dry_run": dry_run,
+        "errors": errors,
+        "users": [{"row": r, "id": uid} for r, uid in zip(positions, ids)],
+    })
+
+
 @router.get("/users/{user_id}", response_model=UserOut)
 def get_user_ep(
     company_id: int,
@@ -50,7 +180,7 @@ def get_user_ep(
     u = db.get(User, user_id)
     if not u or u.company_id != company_id:
         raise HTTPException(404, "User not found")
-    return user_to_out(company, u)
+    return user_to_out(company, u, db.get(UserActivity, u.id))
 
 
 @router.get("/users", response_model=UserPageOut)
@@ -59,13 +189,18 @@ def list_users_ep(
     q: str | None = Query(None, description="Search by name/phone/employee_no"),
     status: str | None = Query(None, description="pending|active|failed|deleted"),
     enrolled: bool | None = Query(None, description="Filter users that have at least one mapped event"),
+    sort: str = Query("-id", pattern="^-?(id|last_seen)$", description="id|-id|last_seen|-last_seen"),
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=200),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     company=Depends(require_company_access),
 ):
 
-    qry = db.query(User).filter(User.company_id == company_id)
+    qry = (
+        db.query(*_USER_COLUMNS)
+        .outerjoin(UserActivity, UserActivity.user_id == User.id)
+        .filter(User.company_id == company_id)
+    )
     if status:
         qry = qry.filter(User.status == status)
     if q:
@@ -77,12 +212,18 @@ def list_users_ep(
             | func.lower(func.coalesce(User.employee_no, "")).like(qq)
         )
     if enrolled is not None:
-        ex = db.query(EventLog.id).filter(EventLog.company_id == company_id, EventLog.user_id == User.id).exists()
-        qry = qry.filter(ex) if enrolled else qry.filter(~ex)
+        # user_activity has a row exactly for users with mapped events
+        qry = qry.filter(UserActivity.user_id.is_not(None) if enrolled else UserActivity.user_id.is_(None))
 
     total = qry.count()
-    xs = qry.order_by(User.id.desc()).offset((page - 1) * limit).limit(limit).all()
-    return {"total": total, "items": [user_to_out(company, u) for u in xs]}
+    if sort.endswith("last_seen"):
+        # never-seen users last either way
+        seen = UserActivity.last_seen_at.desc() if sort.startswith("-") else UserActivity.last_seen_at.asc()
+        order = (UserActivity.last_seen_at.is_(None), seen, User.id.desc())
+    else:
+        order = (User.id.desc() if sort.startswith("-") else User.id.asc(),)
+    xs = qry.order_by(*order).offset((page - 1) * limit).limit(limit).all()
+    return FastJSONResponse({"total": total, "items": [_user_row(r) for r in xs]})
 
 
 @router.put("/users/{user_id}", response_model=UserOut)
@@ -114,8 +255,10 @@ async def update_user_ep(
     db.add(u)
     db.commit()
     db.refresh(u)
+    if fs & {"first_name", "last_name"}:
+        provisioner.enqueue_upsert(company.id, u.id)
 
-    out = user_to_out(company, u)
+    out = user_to_out(company, u, db.get(UserActivity, u.id))
     await manager.broadcast_to_clients(company.id, {"type": "users.updated", "data": out.model_dump()})
     return out
 
@@ -132,14 +275,22 @@ async def delete_user_ep(
         raise HTTPException(404, "User not found")
 
     # IMPORTANT: hard-delete user (no soft status) as requested.
-    # EventLog doesn't have an FK to users, so we null-out the mapping to keep history.
-    db.query(EventLog).filter(
-        EventLog.company_id == company_id,
-        EventLog.user_id == u.id,
-    ).update({EventLog.user_id: None}, synchronize_session=False)
-
+    # Once the row is gone ingest no longer maps to it. EventLog doesn't have
+    # an FK to users; the mapping on past events is nulled out by a background
+    # job in batches (keeps history, and a user with years of events doesn't
+    # hold one long write transaction here). The job row is committed with
+    # the delete, so a crash right after still leaves it to be adopted.
+    employee_no = u.employee_no
+    face_sha = delete_user_face(db, u.id)
+    db.query(UserActivity).filter(UserActivity.user_id == u.id).delete(synchronize_session=False)
     db.delete(u)
+    params = {"user_id": user_id, "max_event_id": max_event_id(db)}
+    job_id = job_runner.add(db, "unlink_user_events", company.id, params)
     db.commit()
+    job_runner.launch(job_id, "unlink_user_events", company.id, params)
+    if face_sha:
+        release_face_blob(db, face_sha)
+    provisioner.enqueue_delete(company.id, user_id, employee_no)
 
     await manager.broadcast_to_clients(company.id, {"type": "users.deleted", "data": {"user_id": user_id}})
-    return {"ok": True}
+    return {"ok": True, "job_id": job_id}
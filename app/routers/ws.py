@@ -1,7 +1,12 @@
+import json
+
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
 
 from ..core.db import SessionLocal
-from ..crud import get_company_by_api_key, get_account_by_session_token
+from ..crud import get_company_by_api_key, get_account_by_token
+from ..schemas import WSSubscribeIn
 from ..ws_manager import manager
 
 router = APIRouter(tags=["ws"])
@@ -13,6 +18,8 @@ async def ws_company(
     company_id: int,
     token: str | None = Query(None, description="Bearer token from /auth/login"),
     api_key: str | None = Query(None, description="Legacy: company api_key"),
+    since: int | None = Query(None, ge=0, description="Resume after this seq (from the last message received)"),
+    epoch: str | None = Query(None, description="epoch from the ws.hello of the previous connection"),
 ):
     """Frontend realtime channel.
 
@@ -22,35 +29,77 @@ async def ws_company(
     Server broadcasts events:
       - events.access
       - users.created / users.updated / users.deleted
+
+    The first message is `ws.hello` ({epoch, seq, replayed}); every broadcast
+    carries `seq`. Reconnect with `&since=<last seq>&epoch=<epoch>` to get the
+    missed messages replayed, or `ws.resync_required` if they are gone (refetch
+    over HTTP then).
+
+    Client -> server (optional):
+      {"type": "subscribe", "types": [...], "user_ids": [...], "device_ids": [...],
+       "coalesce_ms": 250}
+    narrows what this socket receives (acked with `ws.subscribed`); with
+    coalesce_ms > 0 messages queued within the window arrive together as
+    {"type": "batch", "data": [msg, ...]}.
+
+    The server sends `ws.ping` every WS_PING_INTERVAL_SECONDS. Clients that
+    answer with {"type": "pong"} are expected to keep doing so: one silent for
+    WS_IDLE_TIMEOUT_SECONDS is disconnected (code 1013).
     """
     await ws.accept()
+    # The DB is only needed for auth: the session (and its pooled connection)
+    # is closed before the socket settles in for hours.
+    denied = await run_in_threadpool(_authorize, company_id, token, api_key)
+    if denied:
+        await ws.close(code=denied)
+        return
+
+    await manager.add_client(company_id, ws, since=since, epoch=epoch)
+    try:
+        while True:
+            # Client messages are optional: "pong" (reply to ws.ping) and "subscribe".
+            _handle_client_message(company_id, ws, await ws.receive_text())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await manager.remove_client(company_id, ws)
+
+
+def _authorize(company_id: int, token: str | None, api_key: str | None) -> int | None:
+    """Close code if the credentials don't grant access to the company, else None."""
     db = SessionLocal()
     try:
         if token:
-            acc = get_account_by_session_token(db, token)
+            acc = get_account_by_token(db, token)
             if not acc:
-                await ws.close(code=4401)
-                return
+                return 4401
             if acc.role == "owner" and acc.company_id != company_id:
-                await ws.close(code=4403)
-                return
-        elif api_key:
+                return 4403
+            return None
+        if api_key:
             c = get_company_by_api_key(db, api_key)
             if not c or c.id != company_id:
-                await ws.close(code=4401)
-                return
-        else:
-            await ws.close(code=4401)
-            return
-
-        await manager.add_client(company_id, ws)
-
-        while True:
-            # We don't require client->server messages. Just keep the socket open.
-            await ws.receive_text()
-
-    except WebSocketDisconnect:
-        pass
+                return 4401
+            return None
+        return 4401
     finally:
-        await manager.remove_client(company_id, ws)
         db.close()
+
+
+def _handle_client_message(company_id: int, ws: WebSocket, text: str) -> None:
+    manager.touch(company_id, ws)
+    try:
+        msg = json.loads(text)
+    except ValueError:
+        msg = None
+    if not isinstance(msg, dict) or msg.get("type") != "subscribe":
+        return
+    try:
+        sub = WSSubscribeIn.model_validate(msg)
+    except ValidationError as e:
+        manager.send_control(company_id, ws, {
+            "type": "ws.error",
+            "data": {"detail": e.errors(include_url=False, include_context=False)},
+        })
+        return
+    manager.subscribe(company_id, ws, sub.types, sub.user_ids, sub.device_ids, sub.coalesce_ms)
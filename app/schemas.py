@@ -123,6 +123,11 @@ class UserOut(BaseModel):
     status: str
     last_error: Optional[str] = None
 
+    # Mapped-event stats (user_activity); empty until the user's first event
+    first_seen_at: Optional[str] = None
+    last_seen_at: Optional[str] = None
+    event_count: int = 0
+
     class Config:
         from_attributes = True
 
@@ -132,6 +137,117 @@ class UserPageOut(BaseModel):
     items: list[UserOut]
 
 
+class UserImportRowError(BaseModel):
+    row: int  # 1-based position in the JSON array / CSV data rows
+    errors: list[dict]
+
+
+class UserImportCreated(BaseModel):
+    row: int
+    id: int  # also the employee_no / enroll_code
+
+
+class UserImportOut(BaseModel):
+    total: int
+    created: int
+    failed: int
+    dry_run: bool
+    errors: list[UserImportRowError] = []
+    users: list[UserImportCreated] = []
+
+
+class FaceOut(BaseModel):
+    user_id: int
+    sha256: str
+    size: int
+    updated_at: str
+
+
+class FaceSyncOut(BaseModel):
+    queued: int  # users with a stored face, queued for devices missing it
+
+
+# ==========================
+# Devices
+# ==========================
+
+
+class DeviceCreate(BaseModel):
+    name: str = Field(min_length=1, max_length=100)
+    base_url: str = Field(min_length=1, max_length=255, pattern=r"^https?://")  # http://192.168.100.59
+    username: str = Field(min_length=1, max_length=64)
+    password: str = Field(min_length=1, max_length=128)
+    enabled: bool = True
+
+
+class DeviceUpdate(BaseModel):
+    name: str | None = Field(default=None, min_length=1, max_length=100)
+    base_url: str | None = Field(default=None, min_length=1, max_length=255, pattern=r"^https?://")
+    username: str | None = Field(default=None, min_length=1, max_length=64)
+    password: str | None = Field(default=None, min_length=1, max_length=128)
+    enabled: bool | None = None
+
+
+class DeviceOut(BaseModel):
+    id: int
+    company_id: int
+    name: str
+    base_url: str
+    username: str
+    enabled: bool
+
+    class Config:
+        from_attributes = True
+
+
+class TerminalOut(BaseModel):
+    device_key: str  # event_logs.device_id of its events
+    mac_address: str | None = None
+    serial_no: str | None = None
+    ip_address: str | None = None
+    name: str | None = None
+    first_seen_at: str
+    last_seen_at: str
+    event_count: int
+    online: bool
+
+
+class TerminalPageOut(BaseModel):
+    total: int
+    online: int
+    offline_after_seconds: int
+    items: list[TerminalOut]
+
+
+# ==========================
+# Background jobs
+# ==========================
+
+
+class JobOut(BaseModel):
+    id: int
+    kind: str
+    company_id: int | None = None
+    status: str  # queued|running|done|failed
+    params: dict = {}
+    progress: dict = {}
+    result: dict | None = None
+    error: str | None = None
+    created_at: str | None = None
+    updated_at: str | None = None
+    finished_at: str | None = None
+
+
+class JobPageOut(BaseModel):
+    total: int
+    items: list[JobOut]
+
+
+class ReconcileIn(BaseModel):
+    dry_run: bool = False
+    device_ids: list[int] | None = None  # default: every enabled device
+
+
 # ==========================
 # Events
 # ==========================
@@ -160,6 +276,16 @@ class EventPageOut(BaseModel):
     items: list[EventOut] | list[EventOutDetailed]
 
 
+class EventColumnarOut(BaseModel):
+    """`format=columnar`: one array per field, index i of every array is row i."""
+
+    format: str = "columnar"
+    total: int
+    company_id: int
+    # id, event_id, user_id, employee_no, device_id, event_type, ts (+ payload)
+    columns: dict[str, list]
+
+
 # ==========================
 # Attendance
 # ==========================
@@ -185,6 +311,23 @@ class AttendancePageOut(BaseModel):
     items: list[AttendanceRowOut]
 
 
+class AttendanceUserInfoOut(BaseModel):
+    first_name: str | None = None
+    last_name: str | None = None
+    phone: str | None = None
+
+
+class AttendanceColumnarOut(BaseModel):
+    """`format=columnar`: user info once, rows as parallel arrays."""
+
+    format: str = "columnar"
+    total: int
+    company_id: int
+    users: dict[str, AttendanceUserInfoOut]  # key: str(user_id)
+    # user_id, date, first_in, last_out, duration_min, events_count
+    columns: dict[str, list]
+
+
 class AttendanceUserStatsOut(BaseModel):
     company_id: int
     user_id: int
@@ -204,3 +347,18 @@ class AttendanceUserStatsOut(BaseModel):
 
     # per-day detail (same shape as AttendanceRowOut)
     days: list[AttendanceRowOut] = []
+
+
+# ==========================
+# Websocket
+# ==========================
+
+
+class WSSubscribeIn(BaseModel):
+    """Client -> server: {"type": "subscribe", ...}. Omitted filter = everything."""
+
+    type: str = "subscribe"
+    types: list[str] | None = None        # e.g. ["events.access", "users.*"]
+    user_ids: list[int] | None = None
+    device_ids: list[str] | None = None   # device MAC (or IP if it sends no MAC)
+    coalesce_ms: int = Field(0, ge=0, le=5000)  # 0 = send each message on its own
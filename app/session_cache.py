@@ -0,0 +1,169 @@
+import asyncio
+import datetime as dt
+import logging
+import threading
+from dataclasses import dataclass
+
+from sqlalchemy import bindparam, inspect, update
+from sqlalchemy.orm import Session, make_transient_to_detached
+from starlette.concurrency import run_in_threadpool
+
+from .core.config import settings
+from .core.db import SessionLocal
+from .models import Account, AccountSession
+
+log = logging.getLogger("app.session_cache")
+
+
+@dataclass
+class _Entry:
+    session_id: int
+    account: Account  # detached snapshot, never attached to a Session
+    valid_until: dt.datetime
+
+
+def _aware(v: dt.datetime) -> dt.datetime:
+    return v if v.tzinfo else v.replace(tzinfo=dt.timezone.utc)
+
+
+def _snapshot(acc: Account) -> Account:
+    snap = Account(**{c.key: getattr(acc, c.key) for c in inspect(Account).column_attrs})
+    make_transient_to_detached(snap)
+    return snap
+
+
+class SessionCache:
+    """In-process cache of bearer sessions, keyed by token hash.
+
+    A hit costs no SQL: the cached account snapshot is merged into the
+    caller's Session with load=False. `last_seen_at` touches are kept in
+    memory and written in one batched UPDATE by `flush_touches()`.
+
+    The cache is per process. Logout, password change and owner deletion
+    invalidate it immediately in this process; other workers see the change
+    after at most SESSION_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int) -> None:
+        self.ttl = dt.timedelta(seconds=max(0, ttl_seconds))
+        self.max_entries = max_entries
+        self._entries: dict[str, _Entry] = {}
+        self._by_account: dict[int, set[str]] = {}
+        self._touches: dict[int, dt.datetime] = {}  # session_id -> last_seen_at
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl.total_seconds() > 0
+
+    # ----- lookups -----
+
+    def get(self, db: Session, th: str, now: dt.datetime) -> Account | None:
+        if not self.enabled:
+            return None
+        with self._lock:
+            e = self._entries.get(th)
+            if e is None:
+                self.misses += 1
+                return None
+            if e.valid_until <= now:
+                self._drop(th)
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touches[e.session_id] = now
+            snap = e.account
+        return db.merge(snap, load=False)
+
+    def put(self, th: str, sess: AccountSession, acc: Account, now: dt.datetime) -> None:
+        if not self.enabled:
+            return
+        valid_until = min(now + self.ttl, _aware(sess.expires_at))
+        e = _Entry(session_id=sess.id, account=_snapshot(acc), valid_until=valid_until)
+        with self._lock:
+            if th not in self._entries and len(self._entries) >= self.max_entries:
+                self._evict(now)
+            self._entries[th] = e
+            self._by_account.setdefault(acc.id, set()).add(th)
+
+    def touch(self, session_id: int, now: dt.datetime) -> None:
+        with self._lock:
+            self._touches[session_id] = now
+
+    # ----- invalidation -----
+
+    def invalidate_token(self, th: str) -> None:
+        with self._lock:
+            self._drop(th)
+
+    def invalidate_account(self, account_id: int) -> None:
+        with self._lock:
+            for th in list(self._by_account.get(account_id, ())):
+                self._drop(th)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_account.clear()
+
+    def _drop(self, th: str) -> None:
+        e = self._entries.pop(th, None)
+        if e is None:
+            return
+        ths = self._by_account.get(e.account.id)
+        if ths is not None:
+            ths.discard(th)
+            if not ths:
+                del self._by_account[e.account.id]
+
+    def _evict(self, now: dt.datetime) -> None:
+        for th in [th for th, e in self._entries.items() if e.valid_until <= now]:
+            self._drop(th)
+        while len(self._entries) >= self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    # ----- write-behind -----
+
+    def flush_touches(self) -> int:
+        """Write pending last_seen_at touches in one batched UPDATE."""
+        with self._lock:
+            touches, self._touches = self._touches, {}
+        if not touches:
+            return 0
+        db = SessionLocal()
+        try:
+            # Core executemany: rows revoked in the meantime are simply not matched.
+            t = AccountSession.__table__
+            db.execute(
+                update(t).where(t.c.id == bindparam("sid")).values(last_seen_at=bindparam("ts")),
+                [{"sid": sid, "ts": ts} for sid, ts in touches.items()],
+            )
+            db.commit()
+        finally:
+            db.close()
+        return len(touches)
+
+    async def run_flusher(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await run_in_threadpool(self.flush_touches)
+            except Exception:
+                log.exception("last_seen_at flush failed")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "pending_touches": len(self._touches),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+session_cache = SessionCache(
+    ttl_seconds=settings.SESSION_CACHE_TTL_SECONDS,
+    max_entries=settings.SESSION_CACHE_MAX_ENTRIES,
+)
@@ -0,0 +1,68 @@
+import asyncio
+import datetime as dt
+import logging
+import time
+
+from starlette.concurrency import run_in_threadpool
+
+from .core.config import settings
+from .core.db import SessionLocal
+from .crud import delete_expired_revocations, delete_expired_sessions, session_table_stats
+
+log = logging.getLogger("app.session_sweeper")
+
+
+class SessionSweeper:
+    """Periodically deletes expired account_sessions in bounded batches.
+
+    Every worker runs one; concurrent sweeps only race on already-deleted
+    rows, which is harmless.
+    """
+
+    def __init__(self, batch: int) -> None:
+        self.batch = max(1, batch)
+        self.runs = 0
+        self.deleted_total = 0
+        self.last_run_at: dt.datetime | None = None
+        self.last_deleted = 0
+        self.last_duration_ms = 0.0
+        self.last_table: dict = {}
+
+    def sweep_once(self) -> int:
+        t0 = time.perf_counter()
+        db = SessionLocal()
+        try:
+            n = delete_expired_sessions(db, batch=self.batch)
+            delete_expired_revocations(db)
+            self.last_table = session_table_stats(db)
+        finally:
+            db.close()
+        self.runs += 1
+        self.deleted_total += n
+        self.last_deleted = n
+        self.last_run_at = dt.datetime.now(dt.timezone.utc)
+        self.last_duration_ms = (time.perf_counter() - t0) * 1000
+        if n:
+            log.info("session sweep: deleted=%d table=%s %.1fms", n, self.last_table, self.last_duration_ms)
+        return n
+
+    async def run(self, interval_seconds: float) -> None:
+        while True:
+            try:
+                await run_in_threadpool(self.sweep_once)
+            except Exception:
+                log.exception("session sweep failed")
+            await asyncio.sleep(interval_seconds)
+
+    def stats(self) -> dict:
+        return {
+            "runs": self.runs,
+            "deleted_total": self.deleted_total,
+            "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+            "last_deleted": self.last_deleted,
+            "last_duration_ms": round(self.last_duration_ms, 1),
+            "table": self.last_table,
+        }
+
+
+session_sweeper = SessionSweeper(batch=settings.SESSION_SWEEP_BATCH)
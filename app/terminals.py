@@ -0,0 +1,204 @@
+"""Registry of terminals seen on the webhook (table `terminals`).
+
+Each post is attributed to a terminal by the identifiers in its payload
+(`macAddress`, `serialNumber`/`deviceID`, `ipAddress`). The webhook only
+updates an in-memory buffer; `flush()` upserts the buffered last-seen times
+and event counts in one statement every DEVICE_FLUSH_SECONDS, so ingest
+adds no SQL. Listings overlay this worker's unflushed buffer on the rows,
+and online/offline comes from last_seen_at alone (no event_logs scan).
+Other workers' posts show up after their next flush.
+"""
+
+import asyncio
+import datetime as dt
+import logging
+import threading
+from dataclasses import dataclass
+
+from sqlalchemy import case, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .core.config import settings
+from .core.db import SessionLocal
+from .models import Company, CompanyDeletion, Terminal
+
+log = logging.getLogger("app.terminals")
+
+_IDENT_FIELDS = ("mac_address", "serial_no", "ip_address", "name")
+
+
+def _clean(v) -> str | None:
+    v = str(v or "").strip()
+    return v or None
+
+
+def identify(payload: dict) -> dict | None:
+    """Identifiers of the terminal that sent the payload, with `device_key`
+    (MAC, else serial, else IP); None if the payload carries none."""
+    acs = payload.get("AccessControllerEvent") or {}
+    ident = {
+        "mac_address": (_clean(payload.get("macAddress")) or "").lower() or None,
+        "serial_no": _clean(payload.get("serialNumber") or payload.get("deviceID")),
+        "ip_address": _clean(payload.get("ipAddress")),
+        "name": _clean(acs.get("deviceName") if isinstance(acs, dict) else None),
+    }
+    key = ident["mac_address"] or ident["serial_no"] or ident["ip_address"]
+    if not key:
+        return None
+    ident["device_key"] = key[:100]
+    return ident
+
+
+def _aware(v: dt.datetime) -> dt.datetime:
+    return v if v.tzinfo else v.replace(tzinfo=dt.timezone.utc)
+
+
+@dataclass
+class _Seen:
+    first_seen_at: dt.datetime
+    last_seen_at: dt.datetime
+    event_count: int
+    mac_address: str | None
+    serial_no: str | None
+    ip_address: str | None
+    name: str | None
+
+
+def _upsert(db: Session, rows: list[dict]) -> None:
+    dialect = db.get_bind().dialect.name
+    t = Terminal.__table__
+    stmt = (postgresql.insert if dialect == "postgresql" else sqlite.insert)(Terminal)
+    ex = stmt.excluded
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[t.c.company_id, t.c.device_key],
+            set_={
+                "event_count": t.c.event_count + ex.event_count,
+                "first_seen_at": case((ex.first_seen_at < t.c.first_seen_at, ex.first_seen_at),
+                                      else_=t.c.first_seen_at),
+                "last_seen_at": case((ex.last_seen_at > t.c.last_seen_at, ex.last_seen_at),
+                                     else_=t.c.last_seen_at),
+                # the IP may change (DHCP); keep the last one reported
+                **{f: func.coalesce(ex[f], t.c[f]) for f in _IDENT_FIELDS},
+            },
+        ),
+        rows,
+    )
+
+
+class TerminalRegistry:
+    def __init__(self) -> None:
+        self._pending: dict[tuple[int, str], _Seen] = {}
+        self._lock = threading.Lock()
+        self.flushed_rows = 0
+        self.flush_failures = 0
+
+    def seen(self, company_id: int, ident: dict, now: dt.datetime, counted: bool = True) -> None:
+        """Record a post from the terminal; `counted` is False for duplicates
+        (they prove it is alive but add no event)."""
+        key = (company_id, ident["device_key"])
+        with self._lock:
+            s = self._pending.get(key)
+            if s is None:
+                self._pending[key] = _Seen(now, now, int(counted), **{f: ident[f] for f in _IDENT_FIELDS})
+                return
+            s.last_seen_at = now
+            s.event_count += int(counted)
+            for f in _IDENT_FIELDS:
+                if ident[f]:
+                    setattr(s, f, ident[f])
+
+    def flush(self) -> int:
+        """Upsert buffered sightings; returns the number of terminals written.
+        If the write fails they go back into the buffer for the next flush."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        db = SessionLocal()
+        try:
+            # companies deleted since: their rows would outlive the purge
+            live = {i for (i,) in db.query(Company.id).filter(
+                Company.id.in_({cid for cid, _ in pending}),
+                ~Company.id.in_(db.query(CompanyDeletion.company_id)),
+            )}
+            rows = [
+                {"company_id": cid, "device_key": key, **vars(s)}
+                for (cid, key), s in pending.items() if cid in live
+            ]
+            if rows:
+                _upsert(db, rows)
+            db.commit()
+        except Exception:
+            self.flush_failures += 1
+            self._restore(pending)
+            raise
+        finally:
+            db.close()
+        self.flushed_rows += len(rows)
+        return len(rows)
+
+    def _restore(self, pending: dict[tuple[int, str], _Seen]) -> None:
+        # merged with whatever was seen since the swap, which is newer
+        with self._lock:
+            for key, old in pending.items():
+                s = self._pending.get(key)
+                if s is None:
+                    self._pending[key] = old
+                    continue
+                s.first_seen_at = min(s.first_seen_at, old.first_seen_at)
+                s.last_seen_at = max(s.last_seen_at, old.last_seen_at)
+                s.event_count += old.event_count
+                for f in _IDENT_FIELDS:
+                    if not getattr(s, f):
+                        setattr(s, f, getattr(old, f))
+
+    async def run_flusher(self, interval_seconds: float) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await run_in_threadpool(self.flush)
+            except Exception:
+                log.exception("terminal flush failed")
+
+    def list_for(self, db: Session, company_id: int, now: dt.datetime) -> list[dict]:
+        """The company's terminals (rows plus this worker's unflushed
+        sightings), most recently seen first, each with `online`."""
+        out = {}
+        for t in db.query(Terminal).filter(Terminal.company_id == company_id):
+            out[t.device_key] = {
+                "device_key": t.device_key,
+                **{f: getattr(t, f) for f in _IDENT_FIELDS},
+                "first_seen_at": _aware(t.first_seen_at),
+                "last_seen_at": _aware(t.last_seen_at),
+                "event_count": t.event_count,
+            }
+        with self._lock:
+            pending = [(key, vars(s).copy()) for (cid, key), s in self._pending.items() if cid == company_id]
+        for key, s in pending:
+            d = out.get(key)
+            if d is None:
+                out[key] = {"device_key": key, **s}
+                continue
+            d["first_seen_at"] = min(d["first_seen_at"], s["first_seen_at"])
+            d["last_seen_at"] = max(d["last_seen_at"], s["last_seen_at"])
+            d["event_count"] += s["event_count"]
+            for f in _IDENT_FIELDS:
+                d[f] = s[f] or d[f]
+        cutoff = now - dt.timedelta(seconds=settings.DEVICE_OFFLINE_SECONDS)
+        for d in out.values():
+            d["online"] = d["last_seen_at"] >= cutoff
+        return sorted(out.values(), key=lambda d: d["last_seen_at"], reverse=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "flushed_rows": self.flushed_rows,
+                "flush_failures": self.flush_failures,
+            }
+
+
+terminal_registry = TerminalRegistry()
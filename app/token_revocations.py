@@ -0,0 +1,118 @@
+import asyncio
+import datetime as dt
+import logging
+import threading
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from .core.config import settings
+from .core.db import SessionLocal
+from .models import TokenRevocation
+
+log = logging.getLogger("app.token_revocations")
+
+# Rows are re-read for this long after they were created, so a revocation
+# committed late by a concurrent transaction (out of id order) is not missed.
+_SYNC_OVERLAP = dt.timedelta(seconds=60)
+
+
+def _ms(v: dt.datetime) -> int:
+    v = v if v.tzinfo else v.replace(tzinfo=dt.timezone.utc)
+    return int(v.timestamp() * 1000)
+
+
+class RevocationList:
+    """In-memory denylist for signed access tokens.
+
+    Holds revoked jtis and per-account "revoked before" cut-offs. Revocations
+    are written to `token_revocations` and applied locally at once; other
+    workers pick them up within TOKEN_REVOCATION_SYNC_SECONDS via `sync()`.
+    Entries are dropped once every token they cover has expired, so the list
+    stays as small as the number of revocations in the last AUTH_TOKEN_TTL_HOURS.
+    """
+
+    def __init__(self) -> None:
+        self._jtis: dict[str, int] = {}  # jti -> expires (unix s)
+        self._accounts: dict[int, tuple[int, int]] = {}  # account_id -> (revoked_before ms, expires unix s)
+        self._synced_at: dt.datetime | None = None
+        self._lock = threading.Lock()
+
+    def is_revoked(self, claims: dict) -> bool:
+        if claims["jti"] in self._jtis:
+            return True
+        acc = self._accounts.get(claims["a"])
+        return acc is not None and claims["iat"] <= acc[0]
+
+    def _apply(self, row: TokenRevocation) -> None:
+        exp = _ms(row.expires_at) // 1000
+        with self._lock:
+            if row.jti:
+                self._jtis[row.jti] = exp
+            if row.account_id is not None and row.revoked_before is not None:
+                before = _ms(row.revoked_before)
+                cur = self._accounts.get(row.account_id)
+                if cur is None or cur[0] < before:
+                    self._accounts[row.account_id] = (before, exp)
+
+    # ----- writers (caller's Session) -----
+
+    def revoke_token(self, db: Session, claims: dict) -> None:
+        row = TokenRevocation(
+            jti=claims["jti"],
+            account_id=claims["a"],
+            expires_at=dt.datetime.fromtimestamp(int(claims["exp"]), dt.timezone.utc),
+        )
+        db.add(row)
+        db.commit()
+        self._apply(row)
+
+    def revoke_account(self, db: Session, account_id: int) -> None:
+        now = dt.datetime.now(dt.timezone.utc)
+        row = TokenRevocation(
+            account_id=account_id,
+            revoked_before=now,
+            expires_at=now + dt.timedelta(hours=int(settings.AUTH_TOKEN_TTL_HOURS)),
+        )
+        db.add(row)
+        db.commit()
+        self._apply(row)
+
+    # ----- cross-worker sync -----
+
+    def sync(self) -> int:
+        now = dt.datetime.now(dt.timezone.utc)
+        db = SessionLocal()
+        try:
+            qry = db.query(TokenRevocation).filter(TokenRevocation.expires_at > now)
+            if self._synced_at is not None:
+                qry = qry.filter(TokenRevocation.created_at > self._synced_at - _SYNC_OVERLAP)
+            rows = qry.all()
+            for row in rows:
+                self._apply(row)
+        finally:
+            db.close()
+        self._synced_at = now
+        self._prune(int(now.timestamp()))
+        return len(rows)
+
+    def _prune(self, now_s: int) -> None:
+        with self._lock:
+            for jti in [j for j, exp in self._jtis.items() if exp <= now_s]:
+                del self._jtis[jti]
+            for acc_id in [a for a, (_b, exp) in self._accounts.items() if exp <= now_s]:
+                del self._accounts[acc_id]
+
+    async def run_sync(self, interval_seconds: float) -> None:
+        while True:
+            try:
+                await run_in_threadpool(self.sync)
+            except Exception:
+                log.exception("token revocation sync failed")
+            await asyncio.sleep(interval_seconds)
+
+    def stats(self) -> dict:
+        return {"jtis": len(self._jtis), "accounts": len(self._accounts)}
+
+
+revocations = RevocationList()
@@ -0,0 +1,97 @@
+"""Per-user first_seen_at / last_seen_at / event_count (table user_activity).
+
+Maintained incrementally by the webhook, in the same transaction as the
+event insert. `rebuild` recomputes it from event_logs, e.g. after the
+table was added to an existing deployment:
+
+    python -m app.user_activity [--company-id N]
+"""
+
+import argparse
+import datetime as dt
+import logging
+import time
+
+from sqlalchemy import case, delete, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .models import Company, EventLog, User, UserActivity
+
+log = logging.getLogger("app.user_activity")
+
+
+def _insert(db: Session):
+    dialect = db.get_bind().dialect.name
+    return (postgresql.insert if dialect == "postgresql" else sqlite.insert)(UserActivity)
+
+
+def record_event(db: Session, company_id: int, user_id: int, ts: dt.datetime) -> None:
+    """Count one new event for the user (no commit; joins the caller's transaction)."""
+    t = UserActivity.__table__
+    stmt = _insert(db).values(
+        user_id=user_id, company_id=company_id, first_seen_at=ts, last_seen_at=ts, event_count=1,
+    )
+    ex = stmt.excluded
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[t.c.user_id],
+        set_={
+            "event_count": t.c.event_count + 1,
+            "first_seen_at": case((ex.first_seen_at < t.c.first_seen_at, ex.first_seen_at), else_=t.c.first_seen_at),
+            "last_seen_at": case((ex.last_seen_at > t.c.last_seen_at, ex.last_seen_at), else_=t.c.last_seen_at),
+        },
+    ))
+
+
+def rebuild(db: Session, company_id: int) -> int:
+    """Recompute the company's rows from event_logs in one transaction;
+    returns the number of users with events. Events ingested while this
+    runs may be missed; run it again or at a quiet time to be exact."""
+    agg = (
+        select(
+            EventLog.user_id,
+            EventLog.company_id,
+            func.min(EventLog.ts),
+            func.max(EventLog.ts),
+            func.count(EventLog.id),
+        )
+        .join(User, (User.id == EventLog.user_id) & (User.company_id == EventLog.company_id))
+        .where(EventLog.company_id == company_id, EventLog.user_id.is_not(None))
+        .group_by(EventLog.user_id, EventLog.company_id)
+    )
+    cols = ["user_id", "company_id", "first_seen_at", "last_seen_at", "event_count"]
+    stmt = _insert(db).from_select(cols, agg)
+    ex = stmt.excluded
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserActivity.user_id],
+        set_={c: getattr(ex, c) for c in cols[2:]},
+    )
+    db.execute(delete(UserActivity).where(UserActivity.company_id == company_id))
+    db.execute(stmt)
+    n = db.query(func.count(UserActivity.user_id)).filter(UserActivity.company_id == company_id).scalar()
+    db.commit()
+    return n or 0
+
+
+def main() -> None:
+    from .core.db import Base, SessionLocal, engine
+
+    ap = argparse.ArgumentParser(description="Rebuild user_activity from event_logs")
+    ap.add_argument("--company-id", type=int, help="only this company (default: all)")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        ids = [args.company_id] if args.company_id else [i for (i,) in db.query(Company.id).order_by(Company.id)]
+        for cid in ids:
+            t0 = time.perf_counter()
+            n = rebuild(db, cid)
+            log.info("company %s: %d users with events (%.0f ms)", cid, n, (time.perf_counter() - t0) * 1000)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
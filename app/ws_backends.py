@@ -0,0 +1,346 @@
+"""Broadcast backends for cross-worker WebSocket fan-out.
+
+A backend carries already-encoded frames from the worker that published them
+to every worker (including itself), which then hand them to their local
+clients via `deliver(company_id, frame)`.
+
+  - memory:   single process, delivers directly (default)
+  - postgres: LISTEN/NOTIFY on WS_PG_CHANNEL, frames batched per NOTIFY
+  - unix:     tiny line-based broker on WS_UNIX_SOCKET; the worker holding
+              `<socket>.lock` runs it, the others connect (and take over if
+              it goes away)
+"""
+
+import abc
+import asyncio
+import fcntl
+import itertools
+import logging
+import os
+import select
+import threading
+from typing import Callable
+
+from sqlalchemy.engine import make_url
+
+from .core.config import settings
+
+log = logging.getLogger("app.ws")
+
+Deliver = Callable[[int, str], None]
+
+
+class BroadcastBackend(abc.ABC):
+    # True if publish() only ever reaches this process
+    local_only = False
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    @abc.abstractmethod
+    async def publish(self, company_id: int, frame: str) -> None:
+        ...
+
+    async def stop(self) -> None:
+        pass
+
+
+class MemoryBackend(BroadcastBackend):
+    local_only = True
+
+    def __init__(self, deliver: Deliver | None = None) -> None:
+        self._deliver = deliver
+
+    async def publish(self, company_id: int, frame: str) -> None:
+        self._deliver(company_id, frame)
+
+
+# ===== Wire format (postgres/unix) =====
+# One frame per line: "<company_id>:<frame>". orjson never emits raw newlines.
+# Lines longer than the transport limit are split into
+# "#<msg_id>:<i>:<n>:<company_id>:<chunk>" parts and reassembled on receipt.
+
+
+def _split_utf8(data: bytes, size: int) -> list[bytes]:
+    out = []
+    while data:
+        cut = min(size, len(data))
+        while cut < len(data) and (data[cut] & 0xC0) == 0x80:
+            cut -= 1  # don't split a multi-byte character
+        out.append(data[:cut])
+        data = data[cut:]
+    return out
+
+
+class _Decoder:
+    def __init__(self, deliver: Deliver) -> None:
+        self.deliver = deliver
+        self._parts: dict[str, list[str | None]] = {}
+
+    def feed_line(self, line: str) -> None:
+        if not line:
+            return
+        try:
+            if line[0] != "#":
+                cid, frame = line.split(":", 1)
+                self.deliver(int(cid), frame)
+                return
+            msg_id, i, n, cid, chunk = line[1:].split(":", 4)
+            parts = self._parts.setdefault(msg_id, [None] * int(n))
+            parts[int(i)] = chunk
+            if all(p is not None for p in parts):
+                del self._parts[msg_id]
+                self.deliver(int(cid), "".join(parts))  # type: ignore[arg-type]
+            elif len(self._parts) > 1000:
+                self._parts.pop(next(iter(self._parts)))  # lost parts, don't leak
+        except Exception:
+            log.exception("bad broadcast line dropped")
+
+
+class _Encoder:
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self._ids = itertools.count()
+        self._prefix = "%x-%x" % (os.getpid(), id(self))
+
+    def lines(self, company_id: int, frame: str) -> list[str]:
+        line = f"{company_id}:{frame}"
+        if len(line.encode("utf-8")) <= self.limit:
+            return [line]
+        msg_id = f"{self._prefix}-{next(self._ids)}"
+        chunks = _split_utf8(frame.encode("utf-8"), self.limit - 64)
+        return [f"#{msg_id}:{i}:{len(chunks)}:{company_id}:{c.decode('utf-8')}" for i, c in enumerate(chunks)]
+
+
+# ===== PostgreSQL LISTEN/NOTIFY =====
+
+
+class PostgresBackend(BroadcastBackend):
+    """NOTIFY payloads are capped at 8000 bytes; frames published within
+    `batch_ms` are packed into as few NOTIFYs as fit."""
+
+    PAYLOAD_LIMIT = 7900
+
+    def __init__(self, dsn: str, channel: str, batch_ms: int) -> None:
+        self.dsn = dsn
+        self.channel = channel
+        self.batch_s = batch_ms / 1000
+        self._buf: list[str] = []
+        self._flush_task: asyncio.Task | None = None
+        self._pub_conn = None
+        self._pub_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._enc = _Encoder(self.PAYLOAD_LIMIT)
+        self.notifies = 0
+
+    async def start(self, deliver: Deliver) -> None:
+        self._loop = asyncio.get_running_loop()
+        dec = _Decoder(deliver)
+        self._on_payload = lambda payload: [dec.feed_line(x) for x in payload.split("\n")]
+        self._thread = threading.Thread(target=self._listen, name="ws-pg-listen", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        import psycopg2
+        import psycopg2.extensions
+
+        conn = psycopg2.connect(self.dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def _listen(self) -> None:
+        while not self._stopping.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                conn.cursor().execute(f'LISTEN "{self.channel}"')
+                while not self._stopping.is_set():
+                    if select.select([conn], [], [], 1.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        n = conn.notifies.pop(0)
+                        self._loop.call_soon_threadsafe(self._on_payload, n.payload)
+            except Exception:
+                log.exception("pg LISTEN connection lost, reconnecting")
+                self._stopping.wait(1.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    async def publish(self, company_id: int, frame: str) -> None:
+        self._buf.extend(self._enc.lines(company_id, frame))
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.batch_s)
+        lines, self._buf = self._buf, []
+        self._flush_task = None
+        payloads: list[str] = []
+        cur: list[str] = []
+        size = 0
+        for line in lines:
+            n = len(line.encode("utf-8")) + 1
+            if cur and size + n > self.PAYLOAD_LIMIT:
+                payloads.append("\n".join(cur))
+                cur, size = [], 0
+            cur.append(line)
+            size += n
+        if cur:
+            payloads.append("\n".join(cur))
+        try:
+            await self._loop.run_in_executor(None, self._notify, payloads)
+        except Exception:
+            log.exception("pg NOTIFY failed, %d frames dropped", len(lines))
+
+    def _notify(self, payloads: list[str]) -> None:
+        with self._pub_lock:
+            for attempt in (0, 1):
+                try:
+                    if self._pub_conn is None or self._pub_conn.closed:
+                        self._pub_conn = self._connect()
+                    cur = self._pub_conn.cursor()
+                    for p in payloads:
+                        cur.execute("SELECT pg_notify(%s, %s)", (self.channel, p))
+                    self.notifies += len(payloads)
+                    return
+                except Exception:
+                    self._pub_conn = None
+                    if attempt:
+                        raise
+
+    async def stop(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        self._stopping.set()
+        if self._pub_conn is not None:
+            self._pub_conn.close()
+
+
+# ===== Local Unix-socket broker =====
+
+
+class UnixSocketBackend(BroadcastBackend):
+    """Workers on one host exchange frames through a Unix socket broker.
+
+    Every worker runs a client connection; whichever worker holds the flock on
+    `<path>.lock` also runs the broker, which relays each line to all clients.
+    """
+
+    PEER_BUFFER_LIMIT = 32 * 1024 * 1024
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock_fd: int | None = None
+        self._server: asyncio.AbstractServer | None = None
+        self._peers: set[asyncio.StreamWriter] = set()
+        self._writer: asyncio.StreamWriter | None = None
+        self._task: asyncio.Task | None = None
+        self._enc = _Encoder(64 * 1024)
+        self._connected = asyncio.Event()
+
+    async def start(self, deliver: Deliver) -> None:
+        self._dec = _Decoder(deliver)
+        self._task = asyncio.create_task(self._run())
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            log.warning("ws unix broker not reachable yet at %s", self.path)
+
+    # --- broker role ---
+
+    def _try_become_broker(self) -> bool:
+        if self._lock_fd is not None:
+            return True
+        fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def _serve(self) -> None:
+        try:
+            os.unlink(self.path)  # stale socket of a dead broker; we hold the lock
+        except FileNotFoundError:
+            pass
+        self._server = await asyncio.start_unix_server(self._on_peer, path=self.path, limit=1 << 24)
+        log.info("ws unix broker listening on %s (pid %s)", self.path, os.getpid())
+
+    async def _on_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._peers.add(writer)
+        try:
+            while line := await reader.readline():
+                for w in list(self._peers):
+                    if w.transport.get_write_buffer_size() > self.PEER_BUFFER_LIMIT:
+                        log.warning("ws unix broker dropping stalled worker connection")
+                        self._peers.discard(w)
+                        w.close()
+                        continue
+                    w.write(line)
+        except (Exception, asyncio.CancelledError):
+            pass  # worker went away or broker shutting down
+        finally:
+            self._peers.discard(writer)
+            writer.close()
+
+    # --- client role (every worker) ---
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if self._server is None and self._try_become_broker():
+                    await self._serve()
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=1 << 24)
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(0.2)
+                continue
+            self._writer = writer
+            self._connected.set()
+            try:
+                while line := await reader.readline():
+                    self._dec.feed_line(line.decode("utf-8").rstrip("\n"))
+            except Exception:
+                pass
+            finally:
+                self._writer = None
+                self._connected.clear()
+                writer.close()
+            log.warning("ws unix broker connection lost, reconnecting")
+            await asyncio.sleep(0.2)
+
+    async def publish(self, company_id: int, frame: str) -> None:
+        w = self._writer
+        if w is None:
+            log.warning("ws unix broker down, frame for company %s dropped", company_id)
+            return
+        for line in self._enc.lines(company_id, frame):
+            w.write(line.encode("utf-8") + b"\n")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        if self._server is not None:
+            self._server.close()
+            for w in list(self._peers):
+                w.close()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+
+def make_backend() -> BroadcastBackend:
+    kind = settings.WS_BACKEND
+    if kind == "postgres":
+        url = make_url(settings.WS_PG_URL or settings.DATABASE_URL).set(drivername="postgresql")
+        return PostgresBackend(url.render_as_string(hide_password=False), settings.WS_PG_CHANNEL, settings.WS_PG_BATCH_MS)
+    if kind == "unix":
+        return UnixSocketBackend(settings.WS_UNIX_SOCKET)
+    return MemoryBackend()
@@ -1,7 +1,100 @@
 import asyncio
-from typing import Dict, Set
+import logging
+import secrets
+import time
+from collections import Counter, deque
+from itertools import islice
+from typing import Dict
 
+import orjson
 from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+
+from .core.config import settings
+from .ws_backends import BroadcastBackend, MemoryBackend, make_backend
+
+log = logging.getLogger("app.ws")
+
+
+class _Filter:
+    """Server-side subscription filter; a None field matches everything.
+
+    A message lacking a filtered field (e.g. an unmapped event when user_ids
+    is set) does not match.
+    """
+
+    __slots__ = ("types", "prefixes", "user_ids", "device_ids")
+
+    def __init__(
+        self,
+        types: list[str] | None,
+        user_ids: list[int] | None,
+        device_ids: list[str] | None,
+    ) -> None:
+        self.types = None if types is None else {t for t in types if not t.endswith("*")}
+        self.prefixes = tuple(t[:-1] for t in types or () if t.endswith("*"))
+        self.user_ids = None if user_ids is None else set(user_ids)
+        self.device_ids = None if device_ids is None else {d.strip().lower() for d in device_ids}
+
+    def match(self, meta: tuple) -> bool:
+        mtype, user_id, device_id = meta
+        if self.types is not None and mtype not in self.types and not mtype.startswith(self.prefixes):
+            return False
+        if self.user_ids is not None and user_id not in self.user_ids:
+            return False
+        if self.device_ids is not None and (device_id or "").lower() not in self.device_ids:
+            return False
+        return True
+
+
+def _meta(frame: str) -> tuple:
+    """(type, user_id, device_id) of an encoded message, for filtering."""
+    msg = orjson.loads(frame)
+    mtype = msg.get("type") or ""
+    data = msg.get("data")
+    if not isinstance(data, dict):
+        return mtype, None, None
+    user_id = data.get("user_id")
+    if user_id is None and mtype.startswith("users."):
+        user_id = data.get("id")
+    return mtype, user_id, data.get("device_id")
+
+
+class _Client:
+    """One connected socket: a bounded outbound queue drained by its own writer task."""
+
+    __slots__ = (
+        "company_id", "ws", "queue", "task", "sent", "closed", "send_started", "filter", "coalesce",
+        "last_seen", "heartbeat",
+    )
+
+    def __init__(self, company_id: int, ws: WebSocket, queue_size: int) -> None:
+        self.company_id = company_id
+        self.ws = ws
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.task: asyncio.Task | None = None
+        self.sent = 0
+        self.closed = False
+        # loop.time() when the in-flight send began; None while idle
+        self.send_started: float | None = None
+        self.filter: _Filter | None = None
+        self.coalesce = 0.0  # seconds; >0 batches queued messages into one frame
+        # time.monotonic() of the last client->server message; clients that
+        # have sent anything (e.g. a pong) are held to the idle timeout
+        self.last_seen = time.monotonic()
+        self.heartbeat = False
+
+
+class _Replay:
+    """Per-company message sequence and ring buffer of recent (seq, frame)."""
+
+    __slots__ = ("seq", "frames", "idle_since")
+
+    def __init__(self, size: int) -> None:
+        self.seq = 0
+        self.frames: deque = deque(maxlen=size)
+        # time.monotonic() when the last local client left; None while in use
+        self.idle_since: float | None = None
 
 
 class CompanyWSManager:
@@ -10,27 +103,311 @@ class CompanyWSManager:
     Edge/local-device websocket support is intentionally removed.
     Your Hikvision devices push events directly to HTTP webhook, and
     the frontend listens here for realtime updates.
+
+    `broadcast_to_clients` only enqueues; each client has a writer task, so a
+    slow browser tab never delays the webhook or other clients. A client whose
+    queue overflows or whose send fails/times out is evicted (socket closed).
+
+    Each message is encoded once (orjson) and the same text frame is queued
+    for every subscriber.
+
+    Frames travel through a broadcast backend (see ws_backends) so that with
+    several uvicorn workers every worker delivers to its own sockets.
+
+    Every delivered message carries a per-company `seq`. The last
+    `replay_size` messages are kept so a reconnecting client can pass
+    `since=<seq>&epoch=<epoch>` and get only the gap; if the gap is no longer
+    buffered (or the stream restarted) it gets `ws.resync_required` instead.
+    Sequences belong to this process (`epoch`); with several workers a resume
+    that lands on another worker is answered with a resync.
+
+    Clients may `subscribe()` with filters (evaluated here, once per message,
+    before queueing) and a coalescing window, in which case everything queued
+    during the window goes out as one `{"type": "batch", "data": [...]}` frame.
+
+    Every `ping_interval` seconds each client gets a `ws.ping`. Clients that
+    talk back (pong or any message) and then stay silent for `idle_timeout`
+    are reaped, as are sockets the server already sees as disconnected.
     """
 
-    def __init__(self) -> None:
-        self._clients: Dict[int, Set[WebSocket]] = {}
+    def __init__(
+        self,
+        queue_size: int = 256,
+        send_timeout: float = 10.0,
+        backend: BroadcastBackend | None = None,
+        replay_size: int = 200,
+        replay_retention: float = 600,
+        ping_interval: float = 25,
+        idle_timeout: float = 75,
+    ) -> None:
+        self._clients: Dict[int, Dict[WebSocket, _Client]] = {}
         self._lock = asyncio.Lock()
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.evictions: Counter = Counter()
+        self.enqueued = 0
+        self.filtered = 0
+        self._watchdog: asyncio.Task | None = None
+        self.backend = backend or MemoryBackend(self._deliver)
+        self.epoch = secrets.token_hex(4)
+        self.replay_size = replay_size
+        self.replay_retention = replay_retention
+        self._replay: Dict[int, _Replay] = {}
+        self.replayed = 0
+        self.resyncs = 0
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
 
-    async def add_client(self, company_id: int, ws: WebSocket):
+    async def start(self):
+        await self.backend.start(self._deliver)
+
+    async def stop(self):
+        await self.backend.stop()
+
+    async def add_client(
+        self,
+        company_id: int,
+        ws: WebSocket,
+        since: int | None = None,
+        epoch: str | None = None,
+    ):
+        c = _Client(company_id, ws, self.queue_size)
+        c.task = asyncio.create_task(self._writer(c))
         async with self._lock:
-            self._clients.setdefault(company_id, set()).add(ws)
+            r = self._replay.get(company_id)
+            if r is None:
+                r = self._replay[company_id] = _Replay(self.replay_size)
+            r.idle_since = None
+            # hello/replay are queued and the client registered with no await
+            # in between, so no live message can slip past or be duplicated
+            for frame in self._resume(company_id, r, since, epoch):
+                c.queue.put_nowait(frame)
+            self._clients.setdefault(company_id, {})[ws] = c
+        if self._watchdog is None or self._watchdog.done():
+            self._watchdog = asyncio.create_task(self._watch())
 
     async def remove_client(self, company_id: int, ws: WebSocket):
         async with self._lock:
-            self._clients.get(company_id, set()).discard(ws)
+            c = self._detach(company_id, ws)
+        if c and c.task and c.task is not asyncio.current_task():
+            c.task.cancel()
+
+    def _resume(self, company_id: int, r: _Replay, since: int | None, epoch: str | None) -> list[str]:
+        info = {"epoch": self.epoch, "seq": r.seq}
+        if since is None:
+            return [orjson.dumps({"type": "ws.hello", "data": {**info, "replayed": 0}}).decode("utf-8")]
+        missed = r.seq - since
+        first = r.frames[0][0] if r.frames else r.seq + 1
+        # the queue must hold the hello plus every missed frame
+        if epoch != self.epoch or missed < 0 or since + 1 < first or missed >= self.queue_size:
+            self.resyncs += 1
+            log.info("ws resync required: company_id=%s since=%s seq=%s", company_id, since, r.seq)
+            return [orjson.dumps({"type": "ws.resync_required", "data": info}).decode("utf-8")]
+        self.replayed += missed
+        hello = orjson.dumps({"type": "ws.hello", "data": {**info, "replayed": missed}}).decode("utf-8")
+        return [hello] + [f for _, f in islice(r.frames, len(r.frames) - missed, None)]
+
+    def subscribe(
+        self,
+        company_id: int,
+        ws: WebSocket,
+        types: list[str] | None = None,
+        user_ids: list[int] | None = None,
+        device_ids: list[str] | None = None,
+        coalesce_ms: int = 0,
+    ) -> None:
+        c = self._clients.get(company_id, {}).get(ws)
+        if c is None:
+            return
+        if types is None and user_ids is None and device_ids is None:
+            c.filter = None
+        else:
+            c.filter = _Filter(types, user_ids, device_ids)
+        c.coalesce = coalesce_ms / 1000
+        self.send_control(company_id, ws, {
+            "type": "ws.subscribed",
+            "data": {"types": types, "user_ids": user_ids, "device_ids": device_ids, "coalesce_ms": coalesce_ms},
+        })
+
+    def touch(self, company_id: int, ws: WebSocket) -> None:
+        """Record a client->server message (pong or anything else)."""
+        c = self._clients.get(company_id, {}).get(ws)
+        if c is not None:
+            c.last_seen = time.monotonic()
+            c.heartbeat = True
+
+    def send_control(self, company_id: int, ws: WebSocket, msg: dict) -> None:
+        """Queue a message for one client only (acks, errors); bypasses filters."""
+        c = self._clients.get(company_id, {}).get(ws)
+        if c is None:
+            return
+        try:
+            c.queue.put_nowait(orjson.dumps(msg).decode("utf-8"))
+        except asyncio.QueueFull:
+            self._evict(c, "queue_full")
+
+    def _detach(self, company_id: int, ws: WebSocket) -> _Client | None:
+        clients = self._clients.get(company_id)
+        if not clients:
+            return None
+        c = clients.pop(ws, None)
+        if not clients:
+            self._clients.pop(company_id, None)
+            r = self._replay.get(company_id)
+            if r is not None:
+                r.idle_since = time.monotonic()
+        if c is not None:
+            c.closed = True
+        return c
+
+    async def close_all(self):
+        """Stop every writer task (app shutdown)."""
+        async with self._lock:
+            clients = [c for cs in self._clients.values() for c in cs.values()]
+            for c in clients:
+                self._detach(c.company_id, c.ws)
+        for c in clients:
+            if c.task:
+                c.task.cancel()
+        if self._watchdog is not None:
+            self._watchdog.cancel()
+            self._watchdog = None
+
+    async def disconnect_company(self, company_id: int) -> None:
+        """Close this worker's sockets of a company (company deleted)."""
+        async with self._lock:
+            clients = list(self._clients.get(company_id, {}).values())
+        for c in clients:
+            self._evict(c, "company_deleted")
 
     async def broadcast_to_clients(self, company_id: int, msg: dict):
-        clients = list(self._clients.get(company_id, set()))
-        for ws in clients:
+        if self.backend.local_only and company_id not in self._replay:
+            return
+        await self.backend.publish(company_id, orjson.dumps(msg).decode("utf-8"))
+
+    def _deliver(self, company_id: int, frame: str) -> None:
+        """Number, buffer and queue an encoded frame for this worker's sockets."""
+        r = self._replay.get(company_id)
+        if r is None:
+            return  # no client of this company has connected here recently
+        r.seq += 1
+        frame = f'{{"seq":{r.seq},{frame[1:]}'
+        r.frames.append((r.seq, frame))
+        meta = None
+        for c in list(self._clients.get(company_id, {}).values()):
+            if c.filter is not None:
+                if meta is None:
+                    meta = _meta(frame)
+                if not c.filter.match(meta):
+                    self.filtered += 1
+                    continue
             try:
-                await ws.send_json(msg)
-            except Exception:
-                pass
+                c.queue.put_nowait(frame)
+                self.enqueued += 1
+            except asyncio.QueueFull:
+                self._evict(c, "queue_full")
+
+    async def _writer(self, c: _Client):
+        loop = asyncio.get_running_loop()
+        try:
+            while not c.closed:
+                frame = await c.queue.get()
+                if c.coalesce:
+                    await asyncio.sleep(c.coalesce)
+                    if not c.queue.empty():
+                        frames = [frame]
+                        while not c.queue.empty():
+                            frames.append(c.queue.get_nowait())
+                        frame = '{"type":"batch","data":[' + ",".join(frames) + "]}"
+                c.send_started = loop.time()
+                try:
+                    await c.ws.send_text(frame)
+                except Exception:
+                    self._evict(c, "send_error")
+                    return
+                c.send_started = None
+                c.sent += 1
+        except asyncio.CancelledError:
+            pass
+
+    async def _watch(self):
+        """Housekeeping for all clients in one task: evict sends stuck past
+        send_timeout (instead of a wait_for() around every send), send pings,
+        reap idle/disconnected sockets, drop stale replay buffers.
+        """
+        loop = asyncio.get_running_loop()
+        interval = max(0.05, min(1.0, self.send_timeout / 2))
+        next_ping = time.monotonic() + self.ping_interval
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            send_deadline = loop.time() - self.send_timeout
+            ping = None
+            if self.ping_interval and now >= next_ping:
+                next_ping = now + self.ping_interval
+                ping = orjson.dumps({"type": "ws.ping", "data": {"ts": int(time.time() * 1000)}}).decode("utf-8")
+            for cs in list(self._clients.values()):
+                for c in list(cs.values()):
+                    if c.send_started is not None and c.send_started < send_deadline:
+                        self._evict(c, "send_timeout")
+                    elif getattr(c.ws, "client_state", None) == WebSocketState.DISCONNECTED:
+                        self._evict(c, "disconnected")
+                    elif self.idle_timeout and c.heartbeat and c.last_seen < now - self.idle_timeout:
+                        self._evict(c, "idle_timeout")
+                    elif ping is not None:
+                        try:
+                            c.queue.put_nowait(ping)
+                        except asyncio.QueueFull:
+                            self._evict(c, "queue_full")
+            self._prune_replay()
+
+    def _prune_replay(self) -> None:
+        cutoff = time.monotonic() - self.replay_retention
+        for cid, r in list(self._replay.items()):
+            if r.idle_since is not None and r.idle_since < cutoff:
+                del self._replay[cid]
+
+    def _evict(self, c: _Client, reason: str) -> None:
+        if self._detach(c.company_id, c.ws) is None:
+            return  # already gone
+        self.evictions[reason] += 1
+        log.info("ws client evicted: company_id=%s reason=%s", c.company_id, reason)
+        if c.task and c.task is not asyncio.current_task():
+            c.task.cancel()
+        asyncio.create_task(self._close(c.ws))
+
+    @staticmethod
+    async def _close(ws: WebSocket):
+        try:
+            await ws.close(code=1013)  # try again later
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        depths = [c.queue.qsize() for cs in self._clients.values() for c in cs.values()]
+        return {
+            "backend": type(self.backend).__name__,
+            "companies": len(self._clients),
+            "clients": len(depths),
+            "queue_depth_total": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "queue_size": self.queue_size,
+            "enqueued": self.enqueued,
+            "filtered": self.filtered,
+            "evictions": dict(self.evictions),
+            "epoch": self.epoch,
+            "replay_buffers": len(self._replay),
+            "replayed": self.replayed,
+            "resyncs": self.resyncs,
+        }
 
 
-manager = CompanyWSManager()
+manager = CompanyWSManager(
+    queue_size=settings.WS_SEND_QUEUE_SIZE,
+    send_timeout=settings.WS_SEND_TIMEOUT_SECONDS,
+    backend=make_backend(),
+    replay_size=settings.WS_REPLAY_BUFFER_SIZE,
+    replay_retention=settings.WS_REPLAY_RETENTION_SECONDS,
+    ping_interval=settings.WS_PING_INTERVAL_SECONDS,
+    idle_timeout=settings.WS_IDLE_TIMEOUT_SECONDS,
+)
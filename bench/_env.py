@@ -0,0 +1,28 @@
+"""Shared environment for the check scripts.
+
+`setup_env()` must run before anything from `app` is imported: settings are
+read once, at import time.
+"""
+
+import os
+import tempfile
+
+
+def setup_env(prefix: str, **overrides) -> str:
+    """Point the app at a fresh temp dir (SQLite file, logs, face store) with
+    admin/adminpw, cheap password hashing and provisioning off; `overrides`
+    are set on top (`{tmp}` in a value is replaced by the temp dir).
+    Returns the temp dir."""
+    tmp = tempfile.mkdtemp(prefix=f"faceid-{prefix}-")
+    env = {
+        "DATABASE_URL": "sqlite:///{tmp}/app.db",
+        "LOG_DIR": "{tmp}/logs",
+        "FACE_STORAGE_DIR": "{tmp}/faces",
+        "ROOT_ADMIN_PASSWORD": "adminpw",
+        "PASSWORD_PBKDF2_ITERATIONS": "1000",
+        "PROVISIONING_ENABLED": "false",
+        **overrides,
+    }
+    for k, v in env.items():
+        os.environ[k] = str(v).replace("{tmp}", tmp)
+    return tmp
@@ -0,0 +1,71 @@
+"""require_account latency per AUTH_TOKEN_MODE.
+
+Calls the real dependency with a fresh Session per call (as a request would)
+against a temp SQLite file:
+  - session, cache off: SELECT session + SELECT account (+ touch)
+  - session, cache on:  in-process SessionCache hit
+  - signed:             HMAC verify + denylist check, no DB
+
+Run:
+    python -m bench.bench_auth [iterations]
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmp}/bench.db"
+os.environ.setdefault("AUTH_TOKEN_SECRET", "bench-secret")
+os.environ.setdefault("PASSWORD_PBKDF2_ITERATIONS", "1000")
+
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.db import Base, SessionLocal, engine  # noqa: E402
+from app.crud import create_session, create_signed_token, ensure_bootstrap_admin  # noqa: E402
+from app.deps import require_account  # noqa: E402
+from app.session_cache import session_cache  # noqa: E402
+
+
+def _measure(token: str, n: int) -> tuple[float, float]:
+    cred = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+    lat = []
+    for _ in range(n):
+        db = SessionLocal()
+        t0 = time.perf_counter()
+        require_account(db=db, cred=cred)
+        lat.append(time.perf_counter() - t0)
+        db.close()
+    lat.sort()
+    return statistics.median(lat) * 1e6, lat[int(len(lat) * 0.99)] * 1e6
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    acc = ensure_bootstrap_admin(db, username="admin", password="bench-admin")
+    opaque, _ = create_session(db, acc)
+    signed, _ = create_signed_token(db, acc)
+    db.close()
+
+    ttl = session_cache.ttl
+    rows = []
+    settings.AUTH_TOKEN_MODE = "session"
+    session_cache.ttl = ttl * 0
+    rows.append(("session, cache off", *_measure(opaque, n)))
+    session_cache.ttl = ttl
+    rows.append(("session, cache on", *_measure(opaque, n)))
+    settings.AUTH_TOKEN_MODE = "signed"
+    rows.append(("signed", *_measure(signed, n)))
+
+    print(f"require_account, {n} calls, SQLite")
+    for name, p50, p99 in rows:
+        print(f"  {name:<20} p50 {p50:8.1f} us   p99 {p99:8.1f} us")
+
+
+if __name__ == "__main__":
+    main()
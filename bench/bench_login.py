@@ -0,0 +1,102 @@
+"""Login throughput under concurrency, and what it does to other sync endpoints.
+
+Drives the app in-process (httpx ASGITransport) against a temp SQLite file.
+For each executor kind it fires `--logins` concurrent /auth/login calls and,
+at the same time, probes the sync /health endpoint to see whether the API
+threadpool is starved.
+
+Run:
+    python -m bench.bench_login [--logins 200] [--concurrency 100] [--kinds threadpool,thread,process]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _pct(xs: list[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))] * 1000 if xs else 0.0
+
+
+async def _run(logins: int, concurrency: int) -> None:
+    import httpx
+
+    from app.core.auth import hash_pool
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+            body = {"username": "admin", "password": os.environ["ROOT_ADMIN_PASSWORD"]}
+            await c.post("/auth/login", json=body)  # warm up the pool
+
+            sem = asyncio.Semaphore(concurrency)
+            codes: list[int] = []
+            probe_lat: list[float] = []
+            done = asyncio.Event()
+
+            async def one_login():
+                async with sem:
+                    r = await c.post("/auth/login", json=body)
+                    codes.append(r.status_code)
+
+            async def probe():
+                while not done.is_set():
+                    t0 = time.perf_counter()
+                    await c.get("/health")
+                    probe_lat.append(time.perf_counter() - t0)
+                    await asyncio.sleep(0.01)
+
+            p = asyncio.create_task(probe())
+            t0 = time.perf_counter()
+            await asyncio.gather(*(one_login() for _ in range(logins)))
+            elapsed = time.perf_counter() - t0
+            done.set()
+            await p
+
+    ok = codes.count(200)
+    print(
+        f"{hash_pool.kind:<10} logins ok={ok:<4} 503={codes.count(503):<4} "
+        f"{ok / elapsed:7.1f} logins/s   /health p50={_pct(probe_lat, 0.5):7.1f}ms "
+        f"p99={_pct(probe_lat, 0.99):7.1f}ms max={max(probe_lat) * 1000:7.1f}ms"
+    )
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--logins", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=100)
+    ap.add_argument("--kinds", default="threadpool,thread,process")
+    ap.add_argument("--child", action="store_true")
+    args = ap.parse_args()
+
+    if args.child:
+        asyncio.run(_run(args.logins, args.concurrency))
+        return
+
+    print(f"cpus={os.cpu_count()} logins={args.logins} concurrency={args.concurrency}")
+    for kind in args.kinds.split(","):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                DATABASE_URL=f"sqlite:///{tmp}/bench.db",
+                LOG_DIR=tmp,
+                ROOT_ADMIN_PASSWORD="bench-admin",
+                PASSWORD_HASH_EXECUTOR=kind,
+                PASSWORD_HASH_MAX_PENDING=str(args.logins + 1),
+            )
+            subprocess.run(
+                [sys.executable, "-m", "bench.bench_login", "--child", "--logins", str(args.logins), "--concurrency", str(args.concurrency)],
+                env=env,
+                check=True,
+            )
+
+
+if __name__ == "__main__":
+    main()
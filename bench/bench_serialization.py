@@ -0,0 +1,109 @@
+"""Per-row serialization cost: pydantic models + response_model vs dict + orjson.
+
+No database needed; rows are synthetic tuples shaped like the column projection
+used by /events and /attendance/range.
+
+Run:
+    python -m bench.bench_serialization [rows]
+"""
+
+import datetime as dt
+import json
+import sys
+import time
+
+from pydantic import TypeAdapter
+
+from app.core.responses import FastJSONResponse
+from app.routers.events import _attendance_row, _event_row
+from app.schemas import AttendancePageOut, AttendanceRowOut, EventOut, EventPageOut
+
+
+def _event_rows(n: int) -> list[tuple]:
+    base = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc)
+    return [
+        (i, "%032x" % i, 1, i % 500 or None, str(i % 500), None, "access", base + dt.timedelta(seconds=i))
+        for i in range(n)
+    ]
+
+
+def _old_events(rows: list[tuple]) -> bytes:
+    items = [
+        EventOut(
+            id=r[0],
+            event_id=r[1],
+            company_id=r[2],
+            user_id=r[3],
+            employee_no=r[4],
+            device_id=r[5],
+            event_type=r[6],
+            ts=r[7].astimezone(dt.timezone.utc).isoformat(),
+        )
+        for r in rows
+    ]
+    # What FastAPI does with a response_model: validate, dump, json.dumps.
+    ta = TypeAdapter(EventPageOut)
+    v = ta.validate_python({"total": len(items), "items": items}, from_attributes=True)
+    return json.dumps(ta.dump_python(v, mode="json"), separators=(",", ":")).encode()
+
+
+def _new_events(rows: list[tuple]) -> bytes:
+    items = [_event_row(r, False) for r in rows]
+    return FastJSONResponse({"total": len(items), "items": items}).body
+
+
+def _old_attendance(n: int) -> bytes:
+    info = {"min": dt.datetime(2026, 1, 1, 4, tzinfo=dt.timezone.utc), "max": dt.datetime(2026, 1, 1, 13, tzinfo=dt.timezone.utc), "count": 4}
+    items = [
+        AttendanceRowOut(
+            company_id=1,
+            user_id=i,
+            date="2026-01-01",
+            first_in=info["min"].isoformat(),
+            last_out=info["max"].isoformat(),
+            duration_min=540,
+            events_count=4,
+            first_name="Ali",
+            last_name="Valiyev",
+            phone="+998901234567",
+        )
+        for i in range(n)
+    ]
+    ta = TypeAdapter(AttendancePageOut)
+    v = ta.validate_python({"total": len(items), "items": items}, from_attributes=True)
+    return json.dumps(ta.dump_python(v, mode="json"), separators=(",", ":")).encode()
+
+
+def _new_attendance(n: int) -> bytes:
+    info = {"min": dt.datetime(2026, 1, 1, 4, tzinfo=dt.timezone.utc), "max": dt.datetime(2026, 1, 1, 13, tzinfo=dt.timezone.utc), "count": 4}
+    items = [
+        _attendance_row(1, i, "2026-01-01", info, dt.timezone.utc, "Ali", "Valiyev", "+998901234567")
+        for i in range(n)
+    ]
+    return FastJSONResponse({"total": len(items), "items": items}).body
+
+
+def _per_row_us(fn, arg, n: int, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - t0)
+    return best / n * 1e6
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rows = _event_rows(n)
+    print(f"rows={n}")
+    for name, old, new, arg in (
+        ("events", _old_events, _new_events, rows),
+        ("attendance", _old_attendance, _new_attendance, n),
+    ):
+        o = _per_row_us(old, arg, n)
+        w = _per_row_us(new, arg, n)
+        print(f"{name:<11} before {o:7.2f} us/row   after {w:7.2f} us/row   x{o / w:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""WebSocket fan-out cost per event: encode per client vs encode once.
+
+Uses in-memory fake sockets, so only the server-side CPU cost of broadcasting
+is measured. The message is an events.access frame with a realistic
+Hikvision AccessControllerEvent payload.
+
+Run:
+    python -m bench.bench_ws_fanout [clients] [events]
+"""
+
+import asyncio
+import json
+import sys
+import time
+
+from app.ws_manager import CompanyWSManager
+
+PAYLOAD = {
+    "ipAddress": "192.168.100.59",
+    "portNo": 80,
+    "protocol": "HTTP",
+    "macAddress": "bc:5e:33:5f:1c:2a",
+    "channelID": 1,
+    "dateTime": "2026-10-19T09:00:01+05:00",
+    "activePostCount": 1,
+    "eventType": "AccessControllerEvent",
+    "eventState": "active",
+    "eventDescription": "Access Controller Event",
+    "AccessControllerEvent": {
+        "deviceName": "Entrance-1",
+        "majorEventType": 5,
+        "subEventType": 75,
+        "name": "Ali Valiyev",
+        "cardReaderKind": 1,
+        "cardReaderNo": 1,
+        "verifyNo": 172,
+        "employeeNoString": "33",
+        "serialNo": 10482,
+        "userType": "normal",
+        "currentVerifyMode": "cardOrFaceOrFp",
+        "frontSerialNo": 10481,
+        "attendanceStatus": "checkIn",
+        "label": "Check In",
+        "statusValue": 0,
+        "mask": "no",
+        "helmet": "unknown",
+        "picturesNumber": 1,
+        "purePwdVerifyEnable": True,
+        "FaceRect": {"height": 0.29, "width": 0.164, "x": 0.416, "y": 0.386},
+    },
+}
+
+MSG = {
+    "type": "events.access",
+    "data": {"company_id": 1, "user_id": 33, "employee_no": "33", "ts": "2026-10-19T04:00:01+00:00", "payload": PAYLOAD},
+}
+
+
+class _FakeWS:
+    __slots__ = ("n",)
+
+    def __init__(self) -> None:
+        self.n = 0
+
+    async def send_text(self, data: str) -> None:
+        self.n += 1
+
+    async def send_json(self, data) -> None:
+        # what starlette.WebSocket.send_json does before send_text
+        await self.send_text(json.dumps(data, separators=(",", ":"), ensure_ascii=False))
+
+
+async def _before(clients: int, events: int) -> float:
+    sockets = [_FakeWS() for _ in range(clients)]
+    t0 = time.perf_counter()
+    for _ in range(events):
+        for ws in sockets:
+            await ws.send_json(MSG)
+    return time.perf_counter() - t0
+
+
+async def _after(clients: int, events: int, msg: dict) -> float:
+    m = CompanyWSManager(queue_size=events + 1)
+    sockets = [_FakeWS() for _ in range(clients)]
+    for ws in sockets:
+        await m.add_client(1, ws)
+    t0 = time.perf_counter()
+    for _ in range(events):
+        await m.broadcast_to_clients(1, msg)
+    while any(ws.n < events for ws in sockets):
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - t0
+    await m.close_all()
+    return elapsed
+
+
+def main() -> None:
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    events = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    no_payload = {"type": MSG["type"], "data": {k: v for k, v in MSG["data"].items() if k != "payload"}}
+    print(f"clients={clients} events={events} frame={len(json.dumps(MSG))}B (no payload: {len(json.dumps(no_payload))}B)")
+    for name, coro in (
+        ("encode per client", _before(clients, events)),
+        ("encode once", _after(clients, events, MSG)),
+        ("encode once, no payload", _after(clients, events, no_payload)),
+    ):
+        t = asyncio.run(coro)
+        print(f"  {name:<24} {t / events * 1e6:8.1f} us/event")
+
+
+if __name__ == "__main__":
+    main()
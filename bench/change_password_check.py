@@ -0,0 +1,58 @@
+"""POST /auth/change-password in both AUTH_TOKEN_MODEs.
+
+For each mode: log in as an owner, reject a wrong old password, change it,
+and check that the old token is revoked and the new password logs in while
+the old one doesn't. Signed tokens carry no password_hash, so that is the
+path where it has to be loaded from the row.
+
+Run:
+    python -m bench.change_password_check
+"""
+
+import sys
+
+from ._env import setup_env
+
+setup_env("passwd", AUTH_TOKEN_MODE="signed", AUTH_TOKEN_SECRET="check-secret")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+def _login(c: TestClient, username: str, password: str):
+    return c.post("/auth/login", json={"username": username, "password": password})
+
+
+def main() -> None:
+    ok = True
+    with TestClient(app) as c:
+        cid = None
+        for mode in ("signed", "session"):
+            settings.AUTH_TOKEN_MODE = mode
+            tok = _login(c, "admin", "adminpw").json()["access_token"]
+            H = {"Authorization": f"Bearer {tok}"}
+            cid = cid or c.post("/admin/companies", json={"name": "Pw"}, headers=H).json()["id"]
+            user = f"own-{mode}"
+            c.post("/admin/owners", headers=H, json={"username": user, "password": "oldpass1", "company_id": cid})
+            otok = _login(c, user, "oldpass1").json()["access_token"]
+            OH = {"Authorization": f"Bearer {otok}"}
+            wrong = c.post("/auth/change-password", headers=OH,
+                           json={"old_password": "nope1234", "new_password": "newpass1"})
+            r = c.post("/auth/change-password", headers=OH,
+                       json={"old_password": "oldpass1", "new_password": "newpass1"})
+            after = c.get("/auth/me", headers=OH).status_code
+            new_login = _login(c, user, "newpass1").status_code
+            old_login = _login(c, user, "oldpass1").status_code
+            print(f"{mode:8} wrong old={wrong.status_code} change={r.status_code} old token={after} "
+                  f"login new={new_login} old={old_login}")
+            ok = ok and wrong.status_code == 400 and r.status_code == 200 and after == 401
+            ok = ok and new_login == 200 and old_login == 401
+
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
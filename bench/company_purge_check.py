@@ -0,0 +1,156 @@
+"""Company delete: immediate lockout, batched purge in the background.
+
+Seeds two identical companies (N users, M events, a device, some faces)
+and a third one that must stay untouched. The first is deleted the old
+way (ORM cascade in one transaction) to time it and count what it leaves
+behind. The second goes through DELETE /admin/companies/{id}: checks its
+edge_key, api_key and owner token stop working right away, webhook
+latency while the purge runs, that progress is visible, and that nothing
+of it is left afterwards (face files included).
+
+Run:
+    python -m bench.company_purge_check [users] [events]
+"""
+
+import datetime as dt
+import os
+import statistics
+import sys
+import time
+
+from ._env import setup_env
+
+setup_env("purge", JOB_PROGRESS_FLUSH_SECONDS="0.1")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import func, insert  # noqa: E402
+
+from app.core.db import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Company, Device, DeviceFace, EventLog, Face, User, UserActivity  # noqa: E402
+from app.user_activity import rebuild  # noqa: E402
+
+T0 = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc)
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 2000 + b"\xff\xd9"
+
+
+def _seed(c: TestClient, H: dict, name: str, n_users: int, n_events: int) -> dict:
+    co = c.post("/admin/companies", json={"name": name}, headers=H).json()
+    cid = co["id"]
+    csv = "first_name,last_name\n" + "".join(f"U{i},{name}\n" for i in range(n_users))
+    r = c.post(f"/companies/{cid}/users/import", content=csv, headers={**H, "Content-Type": "text/csv"})
+    ids = [u["id"] for u in r.json()["users"]]
+    c.post(f"/companies/{cid}/devices", headers=H, json={
+        "name": "gate", "base_url": "http://127.0.0.1:9", "username": "admin", "password": "x",
+    })
+    for i, uid in enumerate(ids[:20]):
+        body = JPEG + name.encode() + bytes([i])
+        c.put(f"/companies/{cid}/users/{uid}/face", content=body, headers={**H, "Content-Type": "image/jpeg"})
+    db = SessionLocal()
+    dev = db.query(Device.id).filter(Device.company_id == cid).scalar()
+    db.execute(insert(DeviceFace), [{"device_id": dev, "user_id": u, "sha256": "0" * 64} for u in ids[:20]])
+    rows = [
+        {"event_id": f"{name}-{i}", "company_id": cid, "user_id": ids[i % len(ids)],
+         "employee_no": str(ids[i % len(ids)]), "event_type": "access", "payload": {},
+         "ts": T0 + dt.timedelta(seconds=i)}
+        for i in range(n_events)
+    ]
+    for i in range(0, n_events, 10_000):
+        db.execute(insert(EventLog), rows[i:i + 10_000])
+    db.commit()
+    rebuild(db, cid)
+    db.close()
+    return co
+
+
+def _left(cid: int) -> dict:
+    db = SessionLocal()
+    try:
+        return {
+            "companies": db.query(func.count(Company.id)).filter(Company.id == cid).scalar(),
+            "users": db.query(func.count(User.id)).filter(User.company_id == cid).scalar(),
+            "events": db.query(func.count(EventLog.id)).filter(EventLog.company_id == cid).scalar(),
+            "activity": db.query(func.count(UserActivity.user_id)).filter(UserActivity.company_id == cid).scalar(),
+            "faces": db.query(func.count(Face.user_id)).filter(Face.company_id == cid).scalar(),
+            "devices": db.query(func.count(Device.id)).filter(Device.company_id == cid).scalar(),
+            # all companies: rows left pointing at users that no longer exist
+            "orphan_device_faces": db.query(func.count(DeviceFace.user_id)).filter(
+                ~DeviceFace.user_id.in_(db.query(User.id))
+            ).scalar(),
+        }
+    finally:
+        db.close()
+
+
+def _face_files() -> int:
+    return sum(len(fs) for _, _, fs in os.walk(os.environ["FACE_STORAGE_DIR"]))
+
+
+def main(n_users: int, n_events: int) -> None:
+    ok = True
+    with TestClient(app) as c:
+        tok = c.post("/auth/login", json={"username": "admin", "password": "adminpw"}).json()["access_token"]
+        H = {"Authorization": f"Bearer {tok}"}
+        old = _seed(c, H, "Old", n_users, n_events)
+        new = _seed(c, H, "New", n_users, n_events)
+        keep = _seed(c, H, "Keep", 100, 1000)
+        c.post("/admin/owners", headers=H, json={"username": "own", "password": "ownerpw1", "company_id": new["id"]})
+        otok = c.post("/auth/login", json={"username": "own", "password": "ownerpw1"}).json()["access_token"]
+        OH = {"Authorization": f"Bearer {otok}"}
+        print(f"seeded 2 x {n_users} users / {n_events} events; face files {_face_files()}")
+
+        db = SessionLocal()
+        t = time.perf_counter()
+        db.delete(db.get(Company, old["id"]))
+        db.commit()
+        db.close()
+        print(f"old: ORM cascade delete {(time.perf_counter() - t) * 1000:.0f} ms in one transaction, "
+              f"left behind {_left(old['id'])}")
+
+        files = _face_files()
+        t = time.perf_counter()
+        r = c.delete(f"/admin/companies/{new['id']}", headers=H).json()
+        print(f"new: DELETE answered in {(time.perf_counter() - t) * 1000:.0f} ms, job {r['job_id']}")
+        hook = c.post(f"/hooks/hikvision/{new['edge_key']}/acs_events", json={"dateTime": T0.isoformat()})
+        owner = c.get(f"/companies/{new['id']}/users", headers=OH)
+        admin = c.get(f"/admin/companies/{new['id']}", headers=H)
+        listed = [x["id"] for x in c.get("/admin/companies", headers=H).json()["items"]]
+        print(f"right after: webhook {hook.status_code}, owner token {owner.status_code}, "
+              f"admin GET {admin.status_code}, listed={new['id'] in listed}")
+        ok = ok and hook.status_code == 404 and owner.status_code == 401 and admin.status_code == 404
+        ok = ok and new["id"] not in listed
+
+        lat, snaps, k = [], set(), 0
+        while True:
+            jobs = c.get("/admin/jobs", headers=H, params={"kind": "purge_company"}).json()["items"]
+            job = next(j for j in jobs if j["id"] == r["job_id"])
+            p = job["progress"]
+            snaps.add((p.get("phase"), p.get("events_deleted"), p.get("users_deleted")))
+            if job["status"] in ("done", "failed"):
+                break
+            t = time.perf_counter()
+            c.post(f"/hooks/hikvision/{keep['edge_key']}/acs_events", json={"dateTime": T0.isoformat(), "k": k})
+            lat.append((time.perf_counter() - t) * 1000)
+            k += 1
+        print(f"job {job['status']}: {job['result']} progress snapshots={len(snaps)} "
+              f"(last {job['progress']})")
+        if lat:
+            lat.sort()
+            print(f"other company's webhook during purge: n={len(lat)} p50={statistics.median(lat):.1f} ms "
+                  f"max={lat[-1]:.1f} ms")
+        before = _left(old["id"])["orphan_device_faces"]
+        left = _left(new["id"])
+        print(f"left behind: {left}; face files {files} -> {_face_files()}")
+        ok = ok and job["status"] == "done" and len(snaps) > 2
+        ok = ok and left.pop("orphan_device_faces") == before and not any(left.values())
+        ok = ok and _face_files() == files - 20
+        kept = _left(keep["id"])
+        print(f"untouched company: {kept}")
+        ok = ok and kept["users"] == 100 and kept["events"] == 1000 + k and kept["faces"] == 20
+
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000, int(sys.argv[2]) if len(sys.argv) > 2 else 200_000)
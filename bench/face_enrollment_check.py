@@ -0,0 +1,206 @@
+"""End-to-end check of face enrollment against fake ISAPI terminals.
+
+Three fake terminals (one answering 503 on 30% of requests), the app
+in-process on a temp SQLite DB and face store. Uploads a photo per user
+(some users share one), waits for the provisioning queue to drain, and
+checks every terminal holds the right image for every user. Then:
+
+- POST /faces/sync with nothing changed must not upload anything;
+- replacing a few photos must re-upload only those;
+- rejected uploads (not a JPEG, too large, empty) leave no file behind;
+- replacing one user's photo while another user uploads that same photo
+  must not delete the file under the second user;
+- the multipart body streamed to the devices must stay ~one chunk in
+  memory however large the image is.
+
+Run:
+    python -m bench.face_enrollment_check [users]
+"""
+
+import asyncio
+import os
+import random
+import sys
+import time
+import tracemalloc
+import threading
+
+from ._env import setup_env
+
+_tmp = setup_env("faces", PROVISIONING_ENABLED="true", PROVISION_BACKOFF_SECONDS="0.02", PROVISION_RETRIES="6")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.db import SessionLocal  # noqa: E402
+from app.crud import release_face_blob  # noqa: E402
+from app.face_store import face_store  # noqa: E402
+from app.isapi import _FaceBody  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Face  # noqa: E402
+
+from .fake_isapi import FakeISAPI, serve_in_thread  # noqa: E402
+from .provisioning_check import _wait_drained  # noqa: E402
+
+PORT = 18151
+
+
+def _jpeg(size: int) -> bytes:
+    return b"\xff\xd8\xff\xe0" + random.randbytes(size - 6) + b"\xff\xd9"
+
+
+def _stream_peak(size: int) -> int:
+    """Peak Python allocation while iterating a face body over a `size`-byte file."""
+    path = os.path.join(_tmp, "big.jpg")
+    with open(path, "wb") as f:
+        f.write(_jpeg(size))
+
+    async def drain():
+        n = 0
+        async for chunk in _FaceBody({"FPID": "1"}, path):
+            n += len(chunk)
+        return n
+
+    tracemalloc.start()
+    sent = asyncio.run(drain())
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert sent > size
+    return peak
+
+
+def _release_during_upload(a: int, b: int) -> bool:
+    """User a drops photo X (release_face_blob in another thread, as a
+    cleanup job does) after b's upload of X found the file already stored
+    but before b's row is committed; X must survive."""
+    img = _jpeg(20_000)
+    db = SessionLocal()
+    try:
+        sha = asyncio.run(_save_once(img))
+        db.query(Face).filter(Face.user_id == a).update({"sha256": sha})
+        db.commit()
+
+        async def upload_as_b():
+            async def body():
+                yield img
+
+            async with face_store.save(body(), len(img)) as (sha, _):
+                db.query(Face).filter(Face.user_id == a).update({"sha256": "0" * 64})
+                db.commit()
+                t = threading.Thread(target=_release, args=(sha,))
+                t.start()
+                t.join(0.3)  # with the lock held it can't get past the check yet
+                db.query(Face).filter(Face.user_id == b).update({"sha256": sha})
+                db.commit()
+            t.join()
+            return sha
+
+        return face_store.exists(asyncio.run(upload_as_b()))
+    finally:
+        db.close()
+
+
+def _release(sha: str) -> None:
+    db = SessionLocal()
+    try:
+        release_face_blob(db, sha)
+    finally:
+        db.close()
+
+
+async def _save_once(img: bytes) -> str:
+    async def body():
+        yield img
+
+    async with face_store.save(body(), len(img)) as (sha, _):
+        return sha
+
+
+def _face_files() -> int:
+    return sum(f.endswith(".jpg") for _, _, fs in os.walk(os.path.join(_tmp, "faces")) for f in fs)
+
+
+def main(n: int) -> None:
+    fakes = [FakeISAPI(latency=0.01), FakeISAPI(latency=0.01), FakeISAPI(latency=0.02, fail_rate=0.3)]
+    urls = serve_in_thread(fakes, PORT)
+    ok = True
+
+    with TestClient(app) as c:
+        tok = c.post("/auth/login", json={"username": "admin", "password": "adminpw"}).json()["access_token"]
+        H = {"Authorization": f"Bearer {tok}"}
+        cid = c.post("/admin/companies", json={"name": "Faces"}, headers=H).json()["id"]
+        for i, url in enumerate(urls):
+            c.post(f"/companies/{cid}/devices", headers=H, json={
+                "name": f"gate-{i}", "base_url": url, "username": "admin", "password": "secret",
+            })
+        csv = "first_name,last_name\n" + "".join(f"U{i},Face\n" for i in range(n))
+        ids = [u["id"] for u in c.post(f"/companies/{cid}/users/import", content=csv,
+                                       headers={**H, "Content-Type": "text/csv"}).json()["users"]]
+        _wait_drained(c, H)
+
+        photos = {uid: _jpeg(random.randint(40_000, 150_000)) for uid in ids}
+        shared = photos[ids[0]]
+        for uid in ids[1:4]:
+            photos[uid] = shared  # same photo for several users: stored once
+        jh = {**H, "Content-Type": "image/jpeg"}
+        t0 = time.perf_counter()
+        for uid, img in photos.items():
+            r = c.put(f"/companies/{cid}/users/{uid}/face", content=img, headers=jh)
+            assert r.status_code == 200, r.text
+        st0 = _wait_drained(c, H)
+        t_enroll = time.perf_counter() - t0
+        uploads0 = [f.face_uploads for f in fakes]
+        blobs = _face_files()
+
+        for i, f in enumerate(fakes):
+            match = all(f.faces.get(str(uid)) == img for uid, img in photos.items())
+            print(f"gate-{i}: faces={len(f.faces)} match={match} uploads={f.face_uploads} 503s={f.failures}")
+            ok = ok and match
+        print(f"enrolled {len(photos)} faces x {len(fakes)} devices in {t_enroll:.2f}s, "
+              f"{blobs} files on disk, retries={st0.get('retries', 0)}")
+
+        t0 = time.perf_counter()
+        queued = c.post(f"/companies/{cid}/faces/sync", headers=H).json()["queued"]
+        st1 = _wait_drained(c, H)
+        sync_new = sum(f.face_uploads for f in fakes) - sum(uploads0)
+        print(f"sync unchanged: queued={queued} uploads={sync_new} "
+              f"skipped={st1['faces_skipped'] - st0.get('faces_skipped', 0)} in {time.perf_counter() - t0:.2f}s")
+        ok = ok and sync_new == 0
+
+        changed = ids[-5:]
+        for uid in changed:
+            photos[uid] = _jpeg(60_000)
+            c.put(f"/companies/{cid}/users/{uid}/face", content=photos[uid], headers=jh)
+        _wait_drained(c, H)
+        replaced = sum(f.face_uploads for f in fakes) - sum(uploads0)
+        c.post(f"/companies/{cid}/faces/sync", headers=H)
+        _wait_drained(c, H)
+        redo = sum(f.face_uploads for f in fakes) - sum(uploads0) - replaced
+        fresh = all(f.faces.get(str(uid)) == photos[uid] for f in fakes for uid in changed)
+        print(f"{len(changed)} photos replaced: uploads={replaced}, then sync uploads={redo}, devices up to date={fresh}")
+        ok = ok and fresh and replaced == len(changed) * len(fakes) and redo == 0
+
+        r = c.get(f"/companies/{cid}/users/{ids[-1]}/face", headers=H)
+        ok = ok and r.content == photos[ids[-1]]
+        r = c.put(f"/companies/{cid}/users/{ids[0]}/face", content=b"GIF89a....", headers=jh)
+        ok = ok and r.status_code == 415
+        r = c.put(f"/companies/{cid}/users/{ids[0]}/face", content=_jpeg(300_000), headers=jh)
+        ok = ok and r.status_code == 413
+        files = _face_files()
+        r = c.put(f"/companies/{cid}/users/{ids[0]}/face", content=b"", headers=jh)
+        print(f"rejected uploads: not a JPEG, too large, empty={r.status_code}; "
+              f"files on disk {files} -> {_face_files()}")
+        ok = ok and r.status_code == 400 and _face_files() == files
+
+        kept = _release_during_upload(ids[4], ids[5])
+        print(f"photo released by one user while another uploads it: file kept={kept}")
+        ok = ok and kept
+
+    for size in (200_000, 20_000_000):
+        print(f"streaming a {size / 1e6:.1f} MB image: peak alloc {_stream_peak(size) / 1024:.0f} KiB")
+
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,224 @@
+"""Fake Hikvision ISAPI terminal for exercising provisioning locally.
+
+Implements digest auth (MD5, qop=auth) and the UserInfo calls the app uses:
+Record, Modify, Delete, Count, Search; plus FDLib/FaceDataRecord for face
+uploads. State is kept in memory and exposed on the object for checks.
+
+    fake = FakeISAPI(fail_rate=0.2, latency=0.02)
+    servers = serve_in_thread([fake], base_port=18100)   # http://127.0.0.1:18100
+
+Run standalone:
+    python -m bench.fake_isapi [port]
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import secrets
+import sys
+import threading
+import time
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+REALM = "DS-K1T"
+
+
+def _md5(s: str) -> str:
+    return hashlib.md5(s.encode()).hexdigest()
+
+
+def _ok() -> JSONResponse:
+    return JSONResponse({"statusCode": 1, "statusString": "OK", "subStatusCode": "ok"})
+
+
+def _err(status: int, sub: str, code: int = 6) -> JSONResponse:
+    return JSONResponse({"statusCode": code, "statusString": "Invalid Content", "subStatusCode": sub}, status_code=status)
+
+
+class FakeISAPI:
+    def __init__(
+        self,
+        username: str = "admin",
+        password: str = "secret",
+        fail_rate: float = 0.0,
+        latency: float = 0.0,
+        seed: int | None = 0,
+    ) -> None:
+        self.username = username
+        self.password = password
+        self.fail_rate = fail_rate
+        self.latency = latency
+        self._rng = random.Random(seed)  # same failure sequence on every run
+        self.users: dict[str, dict] = {}
+        self.faces: dict[str, bytes] = {}  # FPID -> image bytes
+        self.face_uploads = 0
+        self.requests = 0
+        self.challenges = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._nonces: set[str] = set()
+        self.app = Starlette(routes=[
+            Route("/ISAPI/AccessControl/UserInfo/Record", self._record, methods=["POST"]),
+            Route("/ISAPI/AccessControl/UserInfo/Modify", self._modify, methods=["PUT"]),
+            Route("/ISAPI/AccessControl/UserInfo/Delete", self._delete, methods=["PUT"]),
+            Route("/ISAPI/AccessControl/UserInfo/Count", self._count, methods=["GET"]),
+            Route("/ISAPI/AccessControl/UserInfo/Search", self._search, methods=["POST"]),
+            Route("/ISAPI/Intelligent/FDLib/FaceDataRecord", self._face, methods=["POST"]),
+            Route("/ISAPI/Intelligent/FDLib/FDModify", self._face, methods=["PUT", "POST"]),
+        ])
+
+    # ----- digest auth -----
+
+    def _challenge(self) -> Response:
+        self.challenges += 1
+        nonce = secrets.token_hex(16)
+        self._nonces.add(nonce)
+        hdr = f'Digest realm="{REALM}", qop="auth", nonce="{nonce}", algorithm=MD5'
+        return Response(status_code=401, headers={"WWW-Authenticate": hdr})
+
+    def _authorized(self, req: Request) -> bool:
+        h = req.headers.get("authorization", "")
+        if not h.startswith("Digest "):
+            return False
+        p = {}
+        for part in h[7:].split(","):
+            k, _, v = part.strip().partition("=")
+            p[k] = v.strip('"')
+        if p.get("username") != self.username or p.get("nonce") not in self._nonces:
+            return False
+        ha1 = _md5(f"{self.username}:{REALM}:{self.password}")
+        ha2 = _md5(f"{req.method}:{p.get('uri')}")
+        want = _md5(f"{ha1}:{p['nonce']}:{p.get('nc')}:{p.get('cnonce')}:{p.get('qop')}:{ha2}")
+        return secrets.compare_digest(want, p.get("response", ""))
+
+    async def _guard(self, req: Request, handler):
+        self.requests += 1
+        if not self._authorized(req):
+            return self._challenge()
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if self.fail_rate and self._rng.random() < self.fail_rate:
+                self.failures += 1
+                return _err(503, "deviceBusy", code=2)
+            return await handler(req)
+        finally:
+            self.in_flight -= 1
+
+    # ----- UserInfo -----
+
+    async def _record(self, req: Request):
+        async def h(req):
+            info = (await req.json())["UserInfo"]
+            if info["employeeNo"] in self.users:
+                return _err(400, "employeeNoAlreadyExist")
+            self.users[info["employeeNo"]] = info
+            return _ok()
+        return await self._guard(req, h)
+
+    async def _modify(self, req: Request):
+        async def h(req):
+            info = (await req.json())["UserInfo"]
+            if info["employeeNo"] not in self.users:
+                return _err(400, "employeeNoNotExist")
+            self.users[info["employeeNo"]].update(info)
+            return _ok()
+        return await self._guard(req, h)
+
+    async def _delete(self, req: Request):
+        async def h(req):
+            cond = (await req.json())["UserInfoDelCond"]
+            for e in cond.get("EmployeeNoList", []):
+                self.users.pop(e["employeeNo"], None)
+                self.faces.pop(e["employeeNo"], None)
+            return _ok()
+        return await self._guard(req, h)
+
+    async def _count(self, req: Request):
+        async def h(req):
+            return JSONResponse({"UserInfoCount": {"userNumber": len(self.users)}})
+        return await self._guard(req, h)
+
+    async def _search(self, req: Request):
+        async def h(req):
+            cond = (await req.json())["UserInfoSearchCond"]
+            pos, n = int(cond.get("searchResultPosition", 0)), int(cond.get("maxResults", 30))
+            wanted = {e["employeeNo"] for e in cond.get("EmployeeNoList") or []}
+            xs = [u for k, u in sorted(self.users.items()) if not wanted or k in wanted]
+            page = xs[pos:pos + n]
+            return JSONResponse({"UserInfoSearch": {
+                "searchID": cond.get("searchID", "1"),
+                "responseStatusStrg": "MORE" if pos + n < len(xs) else "OK",
+                "numOfMatches": len(page),
+                "totalMatches": len(xs),
+                "UserInfo": page,
+            }})
+        return await self._guard(req, h)
+
+    # ----- faces -----
+
+    async def _face(self, req: Request):
+        async def h(req):
+            parts = _multipart(req.headers.get("content-type", ""), await req.body())
+            rec = json.loads(parts["FaceDataRecord"])
+            img = parts.get("FaceImage", b"")
+            fpid = str(rec["FPID"])
+            if not img.startswith(b"\xff\xd8"):
+                return _err(400, "badFaceImage")
+            if fpid not in self.users:
+                return _err(400, "employeeNoNotExist")
+            if req.url.path.endswith("FaceDataRecord") and fpid in self.faces:
+                return _err(400, "deviceUserAlreadyExistFace")
+            self.faces[fpid] = img
+            self.face_uploads += 1
+            return _ok()
+        return await self._guard(req, h)
+
+
+def _multipart(content_type: str, body: bytes) -> dict[str, bytes]:
+    """name -> raw bytes of each form-data part."""
+    boundary = content_type.partition("boundary=")[2].strip('"').encode()
+    out = {}
+    for part in body.split(b"--" + boundary)[1:]:
+        if part.startswith(b"--"):
+            break
+        head, _, data = part.partition(b"\r\n\r\n")
+        name = head.partition(b'name="')[2].partition(b'"')[0].decode()
+        out[name] = data[:-2] if data.endswith(b"\r\n") else data
+    return out
+
+
+def serve_in_thread(fakes: list[FakeISAPI], base_port: int) -> list[str]:
+    """Serve each fake on base_port + i from one background thread; returns base URLs."""
+    servers = [
+        uvicorn.Server(uvicorn.Config(f.app, host="127.0.0.1", port=base_port + i, log_level="warning"))
+        for i, f in enumerate(fakes)
+    ]
+
+    threading.Thread(target=lambda: asyncio.run(_serve_all(servers)), daemon=True).start()
+    deadline = time.time() + 10
+    while not all(s.started for s in servers):
+        if time.time() > deadline:
+            raise RuntimeError("fake ISAPI servers did not start")
+        time.sleep(0.05)
+    return [f"http://127.0.0.1:{base_port + i}" for i in range(len(fakes))]
+
+
+async def _serve_all(servers) -> None:
+    await asyncio.gather(*(s.serve() for s in servers))
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 18100
+    fake = FakeISAPI()
+    print(f"fake ISAPI on http://127.0.0.1:{port} (admin/secret)")
+    uvicorn.run(fake.app, host="127.0.0.1", port=port, log_level="info")
@@ -0,0 +1,444 @@
+"""End-to-end load test: synthetic Hikvision ACS traffic + attendance reads.
+
+Seeds, through the API, `--companies` companies with `--users` users each
+(ingest targets, one edge_key per company) plus one company per
+`--attendance-users` scale with `--history-days` of past events. Then:
+
+  ingest      `--events` webhook posts over all edge_keys, `--concurrency`
+              at a time. Each post is multipart like a terminal sends it:
+              an AccessControllerEvent JSON part plus a JPEG part
+              (`--jpeg-kb`). The mix is `--mapped` (known employee),
+              `--duplicate` (an earlier post sent again) and the rest
+              unmapped (unknown employee / stranger). Afterwards the stored
+              rows per company are checked against what was sent.
+  attendance  /attendance/days, /attendance/range and /events per scale,
+              `--requests` times each, sequentially.
+
+Reports events/sec, p50/p99 latency and, in-process, SQL statements per
+request (engine event hook). `--json PATH` writes the numbers for comparing
+releases.
+
+In-process (default): temp SQLite file, app driven through httpx's ASGI
+transport, history rows inserted directly. Over HTTP (`--url`): a running
+server with its own database; history goes through the webhook (JSON, no
+picture), so keep `--history-days` small.
+
+Run:
+    python -m bench.loadtest [--events 5000] [--attendance-users 1000,10000]
+    python -m bench.loadtest --url http://127.0.0.1:8000 --admin-password ...
+"""
+
+import argparse
+import asyncio
+import datetime as dt
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BOUNDARY = "MIME_boundary"
+
+
+# ==========================
+# Synthetic terminal traffic
+# ==========================
+
+def fake_jpeg(kb: int, rnd: random.Random) -> bytes:
+    """SOI + JFIF APP0 + filler + EOI: looks like a JPEG to anything that sniffs it."""
+    head = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    return head + rnd.randbytes(max(kb * 1024 - len(head) - 2, 0)) + b"\xff\xd9"
+
+
+class Terminal:
+    """One access terminal of a company: its addresses and serial counter."""
+
+    def __init__(self, company: int, n: int) -> None:
+        self.name = f"gate-{company}-{n}"
+        self.ip = f"10.{company % 250}.{n // 250}.{n % 250 + 1}"
+        self.mac = "b4:a3:82:%02x:%02x:%02x" % (company % 256, n // 256, n % 256)
+        self.serial = 0
+
+    def event(self, employee_no: str | None, name: str | None, ts: dt.datetime) -> dict:
+        self.serial += 1
+        acs = {
+            "deviceName": self.name,
+            "majorEventType": 5,
+            "subEventType": 75 if employee_no else 76,  # 75: face verified, 76: face not matched
+            "cardReaderNo": 1,
+            "verifyNo": 1,
+            "serialNo": self.serial,
+            "currentVerifyMode": "face",
+            "attendanceStatus": "undefined",
+            "mask": "no",
+            "picturesNumber": 1,
+            "FaceRect": {"height": 0.19, "width": 0.107, "x": 0.446, "y": 0.319},
+        }
+        if employee_no:
+            acs.update(employeeNoString=employee_no, name=name or "", userType="normal")
+        return {
+            "ipAddress": self.ip,
+            "portNo": 80,
+            "protocol": "HTTP",
+            "macAddress": self.mac,
+            "channelID": 1,
+            "dateTime": ts.isoformat(timespec="seconds"),
+            "activePostCount": 1,
+            "eventType": "AccessControllerEvent",
+            "eventState": "active",
+            "eventDescription": "Access Controller Event",
+            "AccessControllerEvent": acs,
+        }
+
+
+def multipart(payload: dict, jpeg: bytes) -> bytes:
+    js = json.dumps(payload).encode()
+    return b"".join([
+        f"--{BOUNDARY}\r\n".encode(),
+        b'Content-Disposition: form-data; name="AccessControllerEvent"\r\n',
+        b"Content-Type: application/json\r\n",
+        f"Content-Length: {len(js)}\r\n\r\n".encode(), js, b"\r\n",
+        f"--{BOUNDARY}\r\n".encode(),
+        b'Content-Disposition: form-data; name="Picture"; filename="Picture.jpg"\r\n',
+        b"Content-Type: image/jpeg\r\n",
+        f"Content-Length: {len(jpeg)}\r\n\r\n".encode(), jpeg, b"\r\n",
+        f"--{BOUNDARY}--\r\n".encode(),
+    ])
+
+
+MULTIPART_HEADERS = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+
+
+def traffic(companies: list[dict], n: int, mapped: float, duplicate: float, jpeg: bytes, rnd: random.Random):
+    """Yield (company index, body, kind) for n posts; kind is mapped|unmapped|duplicate."""
+    terminals = [[Terminal(c["id"], i) for i in range(3)] for c in companies]
+    sent: list[tuple[int, bytes]] = []
+    now = dt.datetime.now(dt.timezone.utc)
+    for k in range(n):
+        r = rnd.random()
+        if sent and r < duplicate:
+            ci, body = rnd.choice(sent)
+            yield ci, body, "duplicate"
+            continue
+        ci = rnd.randrange(len(companies))
+        co = companies[ci]
+        ts = now - dt.timedelta(seconds=n - k)
+        term = rnd.choice(terminals[ci])
+        if r < duplicate + mapped:
+            uid = rnd.choice(co["user_ids"])
+            payload, kind = term.event(str(uid), f"User {uid}", ts), "mapped"
+        elif rnd.random() < 0.5:
+            payload, kind = term.event(str(rnd.randrange(10**8, 10**9)), "Visitor", ts), "unmapped"
+        else:
+            payload, kind = term.event(None, None, ts), "unmapped"  # stranger, no employee number
+        body = multipart(payload, jpeg)
+        sent.append((ci, body))
+        yield ci, body, kind
+
+
+# ==========================
+# Measurement helpers
+# ==========================
+
+class QueryCounter:
+    """Counts statements on the app's engines (in-process only)."""
+
+    def __init__(self) -> None:
+        self.n = 0
+
+    def attach(self) -> None:
+        from sqlalchemy import event
+
+        from app.core.db import engine, read_engine
+
+        for e in {engine, read_engine}:
+            event.listen(e, "before_cursor_execute", self._hit)
+
+    def _hit(self, *_a) -> None:
+        self.n += 1
+
+
+def _pct(xs: list[float], p: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * p))] if xs else 0.0
+
+
+def _summary(lat_ms: list[float]) -> dict:
+    return {
+        "n": len(lat_ms),
+        "p50_ms": round(statistics.median(lat_ms), 2) if lat_ms else None,
+        "p99_ms": round(_pct(lat_ms, 0.99), 2),
+        "max_ms": round(max(lat_ms), 2) if lat_ms else None,
+    }
+
+
+# ==========================
+# Seeding
+# ==========================
+
+async def _ok(resp):
+    if resp.status_code >= 400:
+        raise SystemExit(f"{resp.request.method} {resp.request.url} -> {resp.status_code}: {resp.text[:300]}")
+    return resp.json()
+
+
+async def seed_company(c, H: dict, name: str, n_users: int, password: str) -> dict:
+    co = await _ok(await c.post("/admin/companies", json={"name": name}, headers=H))
+    ids: list[int] = []
+    step = 5000  # stays under USER_IMPORT_MAX_ROWS
+    for lo in range(0, n_users, step):
+        rows = "".join(f"U{i},{name}\n" for i in range(lo, min(lo + step, n_users)))
+        r = await _ok(await c.post(
+            f"/companies/{co['id']}/users/import", content="first_name,last_name\n" + rows,
+            headers={**H, "Content-Type": "text/csv"},
+        ))
+        ids += [u["id"] for u in r["users"]]
+    user = f"load-{name.lower()}-{co['id']}"
+    await _ok(await c.post("/admin/owners", headers=H, json={"username": user, "password": password, "company_id": co["id"]}))
+    tok = (await _ok(await c.post("/auth/login", json={"username": user, "password": password})))["access_token"]
+    return {"id": co["id"], "edge_key": co["edge_key"], "user_ids": ids, "H": {"Authorization": f"Bearer {tok}"}}
+
+
+def _history_rows(co: dict, days: int, per_day: int, rnd: random.Random):
+    """`per_day` events per user per day between 04:00 and 13:30 UTC."""
+    today = dt.datetime.now(dt.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    term = Terminal(co["id"], 0)
+    for d in range(days):
+        day = today - dt.timedelta(days=d)
+        for uid in co["user_ids"]:
+            for j in range(per_day):
+                ts = day + dt.timedelta(hours=4 + 9 * j / max(per_day - 1, 1), seconds=rnd.randrange(1800))
+                yield uid, ts, term.event(str(uid), f"User {uid}", ts)
+
+
+def seed_history_db(co: dict, days: int, per_day: int, rnd: random.Random) -> int:
+    import hashlib
+
+    from sqlalchemy import insert
+
+    from app.core.db import SessionLocal
+    from app.models import EventLog
+    from app.user_activity import rebuild
+
+    db = SessionLocal()
+    batch, n = [], 0
+    for uid, ts, payload in _history_rows(co, days, per_day, rnd):
+        batch.append({
+            "event_id": hashlib.sha256(f"h{co['id']}-{n}".encode()).hexdigest()[:32], "company_id": co["id"],
+            "user_id": uid, "employee_no": str(uid), "event_type": "access", "payload": payload, "ts": ts,
+        })
+        n += 1
+        if len(batch) == 10_000:
+            db.execute(insert(EventLog), batch)
+            batch = []
+    if batch:
+        db.execute(insert(EventLog), batch)
+    db.commit()
+    rebuild(db, co["id"])
+    db.close()
+    return n
+
+
+async def seed_history_http(c, co: dict, days: int, per_day: int, rnd: random.Random, concurrency: int) -> int:
+    sem = asyncio.Semaphore(concurrency)
+    url = f"/hooks/hikvision/{co['edge_key']}/acs_events"
+
+    async def one(payload: dict) -> None:
+        async with sem:
+            await c.post(url, json=payload)
+
+    rows = [p for _, _, p in _history_rows(co, days, per_day, rnd)]
+    await asyncio.gather(*(one(p) for p in rows))
+    return len(rows)
+
+
+# ==========================
+# Phases
+# ==========================
+
+async def run_ingest(c, companies: list[dict], args, jpeg: bytes, rnd: random.Random, qc: QueryCounter | None) -> dict:
+    posts = list(traffic(companies, args.events, args.mapped, args.duplicate, jpeg, rnd))
+    kinds = {k: sum(1 for _, _, x in posts if x == k) for k in ("mapped", "unmapped", "duplicate")}
+    before = await _stored(c, companies)
+    sem = asyncio.Semaphore(args.concurrency)
+    lat: list[float] = []
+    codes: dict[int, int] = {}
+
+    async def one(ci: int, body: bytes) -> None:
+        async with sem:
+            t = time.perf_counter()
+            r = await c.post(f"/hooks/hikvision/{companies[ci]['edge_key']}/acs_events", content=body,
+                             headers=MULTIPART_HEADERS)
+            lat.append((time.perf_counter() - t) * 1000)
+            codes[r.status_code] = codes.get(r.status_code, 0) + 1
+
+    q0 = qc.n if qc else 0
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(ci, body) for ci, body, _ in posts))
+    elapsed = time.perf_counter() - t0
+    queries = (qc.n - q0) if qc else None
+
+    after = await _stored(c, companies)
+    stored = {k: after[k] - before[k] for k in after}
+    return {
+        "posts": len(posts),
+        "sent": kinds,
+        "body_kb": round(sum(len(b) for _, b, _ in posts) / len(posts) / 1024, 1) if posts else 0,
+        "elapsed_s": round(elapsed, 2),
+        "events_per_s": round(len(posts) / elapsed, 1) if elapsed else None,
+        **_summary(lat),
+        "status": codes,
+        "stored": stored,
+        "stored_ok": stored == {"mapped": kinds["mapped"], "unmapped": kinds["unmapped"]},
+        "queries_per_post": round(queries / len(posts), 2) if queries is not None and posts else None,
+    }
+
+
+async def _stored(c, companies: list[dict]) -> dict:
+    out = {"mapped": 0, "unmapped": 0}
+    for co in companies:
+        for key, has_user in (("mapped", "true"), ("unmapped", "false")):
+            r = await c.get(f"/companies/{co['id']}/events", headers=co["H"], params={"has_user": has_user, "limit": 1})
+            out[key] += (await _ok(r))["total"]
+    return out
+
+
+async def run_reads(c, co: dict, requests: int, qc: QueryCounter | None) -> dict:
+    base = f"/companies/{co['id']}"
+    endpoints = {
+        "attendance/days": (f"{base}/attendance/days", {"limit": 100}),
+        "attendance/range": (f"{base}/attendance/range", {"limit": 200}),
+        "events": (f"{base}/events", {"limit": 100}),
+    }
+    out = {}
+    for name, (path, params) in endpoints.items():
+        await c.get(path, headers=co["H"], params=params)  # warm-up
+        lat, q0 = [], qc.n if qc else 0
+        for _ in range(requests):
+            t = time.perf_counter()
+            r = await c.get(path, headers=co["H"], params=params)
+            lat.append((time.perf_counter() - t) * 1000)
+            total = (await _ok(r))["total"]
+        out[name] = {
+            **_summary(lat),
+            "rows_total": total,
+            "queries_per_request": round((qc.n - q0) / requests, 1) if qc else None,
+        }
+    return out
+
+
+async def run(args) -> dict:
+    import httpx
+
+    rnd = random.Random(args.seed)
+    jpeg = fake_jpeg(args.jpeg_kb, rnd)
+    qc = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=120)
+        lifespan = None
+    else:
+        from app.main import app
+
+        qc = QueryCounter()
+        qc.attach()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load", timeout=120)
+        lifespan = app.router.lifespan_context(app)
+
+    results: dict = {"mode": "http" if args.url else "in-process", "args": vars(args)}
+    if lifespan is not None:
+        await lifespan.__aenter__()
+    try:
+        async with client as c:
+            tok = (await _ok(await c.post(
+                "/auth/login", json={"username": args.admin_user, "password": args.admin_password},
+            )))["access_token"]
+            H = {"Authorization": f"Bearer {tok}"}
+            run_id = rnd.randrange(10**6)
+
+            t = time.perf_counter()
+            companies = [
+                await seed_company(c, H, f"Ingest{run_id}x{i}", args.users, args.owner_password)
+                for i in range(args.companies)
+            ]
+            print(f"seeded {args.companies} ingest companies x {args.users} users "
+                  f"in {time.perf_counter() - t:.1f}s", flush=True)
+
+            res = await run_ingest(c, companies, args, jpeg, rnd, qc)
+            results["ingest"] = res
+            print(f"ingest: {res['posts']} posts {res['sent']} ~{res['body_kb']} KB each, "
+                  f"concurrency {args.concurrency}")
+            print(f"  {res['events_per_s']} events/s  p50 {res['p50_ms']} ms  p99 {res['p99_ms']} ms  "
+                  f"max {res['max_ms']} ms  status {res['status']}")
+            print(f"  stored {res['stored']} (matches sent: {res['stored_ok']})  "
+                  f"queries/post {res['queries_per_post']}", flush=True)
+
+            results["attendance"] = {}
+            for scale in args.attendance_users:
+                if not scale:
+                    continue
+                t = time.perf_counter()
+                co = await seed_company(c, H, f"Report{run_id}x{scale}", scale, args.owner_password)
+                if args.url:
+                    n = await seed_history_http(c, co, args.history_days, args.history_per_day, rnd, args.concurrency)
+                else:
+                    n = seed_history_db(co, args.history_days, args.history_per_day, rnd)
+                print(f"attendance @ {scale} users ({n} events over {args.history_days} days, "
+                      f"seeded in {time.perf_counter() - t:.1f}s):")
+                res = await run_reads(c, co, args.requests, qc)
+                results["attendance"][str(scale)] = res
+                for name, r in res.items():
+                    print(f"  {name:17} p50 {r['p50_ms']:8.1f} ms  p99 {r['p99_ms']:8.1f} ms  "
+                          f"rows {r['rows_total']:6}  queries/req {r['queries_per_request']}", flush=True)
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+    return results
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    ap.add_argument("--url", help="drive a running server instead of the app in-process")
+    ap.add_argument("--admin-user", default="admin")
+    ap.add_argument("--admin-password", default="adminpw")
+    ap.add_argument("--owner-password", default="loadtest-owner")
+    ap.add_argument("--companies", type=int, default=10, help="ingest companies (edge_keys)")
+    ap.add_argument("--users", type=int, default=200, help="users per ingest company")
+    ap.add_argument("--events", type=int, default=5000, help="webhook posts")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--mapped", type=float, default=0.75)
+    ap.add_argument("--duplicate", type=float, default=0.1)
+    ap.add_argument("--jpeg-kb", type=int, default=40)
+    ap.add_argument("--attendance-users", type=lambda v: [int(x) for x in v.split(",") if x], default=[1000, 10000])
+    ap.add_argument("--history-days", type=int, default=7)
+    ap.add_argument("--history-per-day", type=int, default=2)
+    ap.add_argument("--requests", type=int, default=10, help="requests per read endpoint")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", help="write results here")
+    args = ap.parse_args()
+
+    if not args.url:
+        tmp = tempfile.mkdtemp(prefix="faceid-load-")
+        os.environ.setdefault("DATABASE_URL", f"sqlite:///{tmp}/app.db")
+        os.environ.setdefault("LOG_DIR", f"{tmp}/logs")
+        os.environ.setdefault("FACE_STORAGE_DIR", f"{tmp}/faces")
+        os.environ["ROOT_ADMIN_USERNAME"] = args.admin_user
+        os.environ["ROOT_ADMIN_PASSWORD"] = args.admin_password
+        os.environ.setdefault("PASSWORD_PBKDF2_ITERATIONS", "1000")
+        os.environ.setdefault("PROVISIONING_ENABLED", "false")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    print(f"{'HTTP ' + args.url if args.url else 'in-process, SQLite'}; cpus={os.cpu_count()}", flush=True)
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2, default=str)
+    ok = results["ingest"]["stored_ok"] and set(results["ingest"]["status"]) == {200}
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
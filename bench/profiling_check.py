@@ -0,0 +1,132 @@
+"""Per-request SQL profiling: are the numbers right, and what do they cost?
+
+Runs a few routes (login, user create/list, webhook, /events,
+/attendance/days) and counts statements and commits with a second,
+independent engine listener. Checks that /admin/profiling/routes
+reports the same statement and commit counts for each route, that /events
+reports at least as many rows as it returned, and that with
+SLOW_REQUEST_MS=0 every request lands in /admin/profiling/slow with its
+statements.
+
+Then runs the load harness twice in subprocesses, with
+PROFILING_ENABLED=true and false, and prints the ingest numbers side by side.
+
+Run:
+    python -m bench.profiling_check [events for the load runs]
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from ._env import setup_env
+
+_tmp = setup_env("profiling", PROFILING_ENABLED="true", SLOW_REQUEST_MS="0")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+from app.core.db import engine  # noqa: E402
+from app.main import app  # noqa: E402
+
+_seen = {"statements": 0, "commits": 0}
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _count(*_):
+    _seen["statements"] += 1
+
+
+@event.listens_for(engine, "commit")
+def _count_commit(*_):
+    _seen["commits"] += 1
+
+
+def _load(events: int, enabled: bool) -> dict:
+    out = f"{_tmp}/load-{enabled}.json"
+    env = {k: v for k, v in os.environ.items() if k not in ("DATABASE_URL", "LOG_DIR", "SLOW_REQUEST_MS")}
+    env["PROFILING_ENABLED"] = "true" if enabled else "false"
+    subprocess.run(
+        [sys.executable, "-m", "bench.loadtest", "--events", str(events), "--attendance-users", "1000",
+         "--json", out],
+        env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    with open(out) as f:
+        return json.load(f)
+
+
+def main(load_events: int) -> None:
+    ok = True
+    expected: dict[tuple[str, str], dict] = {}
+
+    with TestClient(app) as c:
+        def call(method: str, route: str, url: str, **kw):
+            before = dict(_seen)
+            r = c.request(method, url, **kw)
+            e = expected.setdefault((method, route), {"count": 0, "statements": 0, "commits": 0})
+            e["count"] += 1
+            e["statements"] += _seen["statements"] - before["statements"]
+            e["commits"] += _seen["commits"] - before["commits"]
+            return r
+
+        tok = c.post("/auth/login", json={"username": "admin", "password": "adminpw"}).json()["access_token"]
+        H = {"Authorization": f"Bearer {tok}"}
+        co = c.post("/admin/companies", json={"name": "Prof"}, headers=H).json()
+        cid = co["id"]
+        c.post("/admin/owners", headers=H, json={"username": "own", "password": "ownerpw1", "company_id": cid})
+        # startup work (bootstrap, job resume) has settled by now, so the
+        # independent counter only sees the request itself
+        c.delete("/admin/profiling", headers=H)
+        otok = call("POST", "/auth/login", "/auth/login",
+                    json={"username": "own", "password": "ownerpw1"}).json()["access_token"]
+        OH = {"Authorization": f"Bearer {otok}"}
+        for i in range(5):
+            call("POST", "/companies/{company_id}/users", f"/companies/{cid}/users", headers=H,
+                 json={"first_name": f"U{i}", "last_name": "Prof"})
+        for i in range(30):
+            call("POST", "/hooks/hikvision/{edge_key}/acs_events", f"/hooks/hikvision/{co['edge_key']}/acs_events",
+                 json={"AccessControllerEvent": {"employeeNoString": "1"}, "dateTime": "2026-10-01T09:00:00+05:00",
+                       "n": i})
+        call("GET", "/companies/{company_id}/users", f"/companies/{cid}/users", headers=H)
+        events = call("GET", "/companies/{company_id}/events", f"/companies/{cid}/events", headers=OH,
+                      params={"limit": 20}).json()
+        call("GET", "/companies/{company_id}/attendance/days", f"/companies/{cid}/attendance/days", headers=OH,
+             params={"start_date": "2026-10-01", "end_date": "2026-10-01"})
+
+        routes = {(x["method"], x["route"]): x
+                  for x in c.get("/admin/profiling/routes", headers=H, params={"limit": 500}).json()["items"]}
+        print(f"{'route':50} {'count':>5} {'stmts':>6} {'want':>5} {'commits':>7} {'want':>5} {'rows':>5} "
+              f"{'sql ms':>7} {'py ms':>7}")
+        for key, want in expected.items():
+            got = routes.get(key, {})
+            print(f"{key[0] + ' ' + key[1]:50} {got.get('count', 0):5} {got.get('statements', 0):6} "
+                  f"{want['statements']:5} {got.get('commits', 0):7} {want['commits']:5} {got.get('rows', 0):5} "
+                  f"{got.get('sql_ms', 0):7} {got.get('python_ms', 0):7}")
+            ok = ok and all(got.get(k) == want[k] for k in ("count", "statements", "commits"))
+        ev = routes[("GET", "/companies/{company_id}/events")]
+        ok = ok and len(events["items"]) == 20 and ev["rows"] >= 20
+
+        slow = c.get("/admin/profiling/slow", headers=H, params={"limit": 500}).json()["items"]
+        hook = next(s for s in slow if s["route"] == "/hooks/hikvision/{edge_key}/acs_events")
+        print(f"slow log: {len(slow)} requests; a webhook: {hook['statements']} statements, "
+              f"{len(hook['queries'])} queries listed, first: {hook['queries'][0]['sql'][:60]!r}")
+        ok = ok and len(slow) >= sum(e["count"] for e in expected.values())
+        ok = ok and len(hook["queries"]) == hook["statements"] > 0
+        c.delete("/admin/profiling", headers=H)
+        # only the DELETE itself (recorded after it ran) is left
+        left = c.get("/admin/profiling/slow", headers=H).json()["items"]
+        ok = ok and [x["method"] + " " + x["route"] for x in left] == ["DELETE /admin/profiling"]
+
+    if load_events:
+        runs = {enabled: _load(load_events, enabled)["ingest"] for enabled in (False, True)}
+        for enabled, r in runs.items():
+            print(f"load, profiling {'on ' if enabled else 'off'}: {r['events_per_s']:.1f} events/s "
+                  f"p50={r['p50_ms']:.1f} ms p99={r['p99_ms']:.1f} ms")
+
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3000)
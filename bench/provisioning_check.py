@@ -0,0 +1,95 @@
+"""End-to-end check of user provisioning against fake ISAPI terminals.
+
+Starts three fake terminals (one flaky: 30% of requests answer 503), runs
+the app in-process on a temp SQLite DB, registers the terminals, imports
+users, then creates / renames / deletes a few. Waits for the queue to
+drain and checks every terminal's roster matches the users table, no
+terminal saw more than PROVISION_DEVICE_CONCURRENCY parallel requests, and
+every user ended `active`.
+
+Run:
+    python -m bench.provisioning_check [users]
+"""
+
+import sys
+import time
+
+from ._env import setup_env
+
+setup_env("prov", PROVISIONING_ENABLED="true", PROVISION_BACKOFF_SECONDS="0.02", PROVISION_RETRIES="6")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.main import app  # noqa: E402
+
+from .fake_isapi import FakeISAPI, serve_in_thread  # noqa: E402
+
+PORT = 18141
+
+
+def _wait_drained(c: TestClient, H: dict, timeout: float = 120) -> dict:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        st = c.get("/admin/provisioning/stats", headers=H).json()
+        if st["queued"] == 0 and st["in_flight"] == 0:
+            return st
+        time.sleep(0.05)
+    raise SystemExit(f"queue did not drain: {st}")
+
+
+def main(n: int) -> None:
+    fakes = [FakeISAPI(latency=0.01), FakeISAPI(latency=0.01), FakeISAPI(latency=0.02, fail_rate=0.3)]
+    urls = serve_in_thread(fakes, PORT)
+
+    with TestClient(app) as c:
+        tok = c.post("/auth/login", json={"username": "admin", "password": "adminpw"}).json()["access_token"]
+        H = {"Authorization": f"Bearer {tok}"}
+        cid = c.post("/admin/companies", json={"name": "Prov"}, headers=H).json()["id"]
+        for i, url in enumerate(urls):
+            r = c.post(f"/companies/{cid}/devices", headers=H, json={
+                "name": f"gate-{i}", "base_url": url, "username": "admin", "password": "secret",
+            })
+            assert r.status_code == 200, r.text
+
+        csv = "first_name,last_name,phone\n" + "".join(f"U{i},Imported,99890{i:07d}\n" for i in range(n))
+        t0 = time.perf_counter()
+        r = c.post(f"/companies/{cid}/users/import", content=csv, headers={**H, "Content-Type": "text/csv"})
+        assert r.status_code == 200, r.text
+        ids = [u["id"] for u in r.json()["users"]]
+        extra = [c.post(f"/companies/{cid}/users", headers=H, json={"first_name": f"New{i}", "last_name": "X"}).json()["id"]
+                 for i in range(5)]
+        for uid in ids[:10]:
+            c.put(f"/companies/{cid}/users/{uid}", headers=H, json={"first_name": "Renamed"})
+        for uid in ids[10:20] + extra[:2]:
+            c.delete(f"/companies/{cid}/users/{uid}", headers=H)
+        stats = _wait_drained(c, H)
+        elapsed = time.perf_counter() - t0
+
+        users, page = [], 1
+        while True:
+            items = c.get(f"/companies/{cid}/users", headers=H, params={"limit": 200, "page": page}).json()["items"]
+            users += items
+            if len(items) < 200:
+                break
+            page += 1
+        want = {u["employee_no"]: u for u in users}
+        bad_status = [u["id"] for u in users if u["status"] != "active"]
+
+    print(f"users={len(want)}  devices={len(fakes)}  drained in {elapsed:.2f}s")
+    print("stats:", {k: v for k, v in stats.items() if k not in ("queued", "in_flight")})
+    ok = not bad_status
+    for i, f in enumerate(fakes):
+        same = set(f.users) == set(want)
+        renamed = sum(1 for u in f.users.values() if u["name"].startswith("Renamed"))
+        print(f"gate-{i}: roster_match={same} users={len(f.users)} renamed={renamed} "
+              f"requests={f.requests} challenges={f.challenges} 503s={f.failures} max_in_flight={f.max_in_flight}")
+        ok = ok and same and renamed == 10 and f.max_in_flight <= settings.PROVISION_DEVICE_CONCURRENCY
+    if bad_status:
+        print("not active:", bad_status[:10])
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
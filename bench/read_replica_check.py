@@ -0,0 +1,157 @@
+"""Read-replica routing with two SQLite files.
+
+DATABASE_URL is primary.db and DATABASE_READ_URL is replica.db, a copy of
+the primary taken after seeding (sqlite3 backup API). Rows written to the
+primary afterwards exist only there, so each response shows which database
+answered it. Checks that older ranges of /events and /attendance/*, /users
+and the admin listings come from the replica, while open-ended or recent
+ranges fall back to the primary (lag guard).
+
+Then measures webhook latency while another thread runs the attendance
+event scan in a loop, first against the primary and then against the
+replica.
+
+Run:
+    python -m bench.read_replica_check [users] [events]
+"""
+
+import datetime as dt
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from zoneinfo import ZoneInfo
+
+from ._env import setup_env
+
+_tmp = setup_env("replica", DATABASE_URL="sqlite:///{tmp}/primary.db", DATABASE_READ_URL="sqlite:///{tmp}/replica.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.core.db import ReadSessionLocal, SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import EventLog  # noqa: E402
+
+NOW = dt.datetime.now(dt.timezone.utc)
+
+
+def _events(cid: int, ids: list[int], n: int, start: dt.datetime, span: dt.timedelta, tag: str) -> None:
+    db = SessionLocal()
+    step = span / max(n, 1)
+    rows = [
+        {"event_id": f"{tag}{i}", "company_id": cid, "user_id": ids[i % len(ids)],
+         "employee_no": str(ids[i % len(ids)]), "event_type": "access", "payload": {}, "ts": start + step * i}
+        for i in range(n)
+    ]
+    for i in range(0, n, 10_000):
+        db.execute(insert(EventLog), rows[i:i + 10_000])
+    db.commit()
+    db.close()
+
+
+def _snapshot() -> None:
+    src = sqlite3.connect(f"{_tmp}/primary.db")
+    dst = sqlite3.connect(f"{_tmp}/replica.db")
+    src.backup(dst)
+    src.close()
+    dst.close()
+
+
+def _webhook_latency(c: TestClient, edge_key: str, factory, seconds: float) -> list[float]:
+    stop = threading.Event()
+    scans = [0]
+
+    def scan():
+        while not stop.is_set():
+            db = factory()
+            try:
+                db.query(EventLog.user_id, EventLog.ts).filter(EventLog.user_id.isnot(None)).all()
+            finally:
+                db.close()
+            scans[0] += 1
+
+    th = threading.Thread(target=scan)
+    th.start()
+    lat, t_end, k = [], time.perf_counter() + seconds, 0
+    while time.perf_counter() < t_end:
+        p = {"AccessControllerEvent": {"employeeNoString": "1"}, "dateTime": NOW.isoformat(), "n": k}
+        t = time.perf_counter()
+        c.post(f"/hooks/hikvision/{edge_key}/acs_events", json=p)
+        lat.append((time.perf_counter() - t) * 1000)
+        k += 1
+    stop.set()
+    th.join()
+    lat.sort()
+    print(f"  scans={scans[0]} webhooks={len(lat)} p50={statistics.median(lat):.1f} ms "
+          f"p99={lat[int(len(lat) * 0.99)]:.1f} ms max={lat[-1]:.1f} ms")
+    return lat
+
+
+def main(n_users: int, n_events: int) -> None:
+    ok = True
+    with TestClient(app) as c:
+        tok = c.post("/auth/login", json={"username": "admin", "password": "adminpw"}).json()["access_token"]
+        H = {"Authorization": f"Bearer {tok}"}
+        co = c.post("/admin/companies", json={"name": "Replica"}, headers=H).json()
+        cid = co["id"]
+        c.post("/admin/owners", headers=H, json={"username": "own", "password": "ownerpw1", "company_id": cid})
+        csv = "first_name,last_name\n" + "".join(f"U{i},Rep\n" for i in range(n_users))
+        r = c.post(f"/companies/{cid}/users/import", content=csv, headers={**H, "Content-Type": "text/csv"})
+        ids = [u["id"] for u in r.json()["users"]]
+        _events(cid, ids, n_events, NOW - dt.timedelta(days=30), dt.timedelta(days=27), "old")
+        _snapshot()
+
+        # Only on the primary from here on.
+        _events(cid, ids, 500, NOW - dt.timedelta(days=20), dt.timedelta(hours=1), "late")
+        _events(cid, ids, 300, NOW - dt.timedelta(minutes=5), dt.timedelta(minutes=4), "recent")
+        c.post(f"/companies/{cid}/users", headers=H, json={"first_name": "New", "last_name": "Primary"})
+        c.post("/admin/companies", json={"name": "Primary only"}, headers=H)
+
+        otok = c.post("/auth/login", json={"username": "own", "password": "ownerpw1"}).json()["access_token"]
+        OH = {"Authorization": f"Bearer {otok}"}
+        old_end = (NOW - dt.timedelta(days=2)).date().isoformat()
+        old_start = (NOW - dt.timedelta(days=31)).date().isoformat()
+        today = NOW.astimezone(ZoneInfo(settings.COMPANY_TZ)).date().isoformat()
+
+        def total(path: str, headers: dict, **params) -> int:
+            return c.get(path, headers=headers, params=params).json()["total"]
+
+        def att(path: str, **params) -> int:
+            items = c.get(f"/companies/{cid}/attendance/{path}", headers=OH, params=params).json()["items"]
+            return sum(x["events_count"] for x in items)
+
+        per_user = n_events // n_users
+        # (check, value, value if read from the replica, value if read from the primary)
+        checks = [
+            ("events, old range", total(f"/companies/{cid}/events", OH, start=old_start, end=old_end),
+             n_events, n_events + 500),
+            ("events, open-ended", total(f"/companies/{cid}/events", OH), n_events, n_events + 800),
+            ("attendance/days, old range", att("days", user_id=ids[0], start_date=old_start, end_date=old_end),
+             per_user, per_user + 1),
+            ("attendance/range, old range", att("range", user_id=ids[0], start_date=old_start, end_date=old_end),
+             per_user, per_user + 1),
+            ("attendance/days, today", att("days", user_id=ids[0], start_date=today, end_date=today), 0, 1),
+            ("users", total(f"/companies/{cid}/users", H), n_users, n_users + 1),
+            ("admin companies", total("/admin/companies", H), 1, 2),
+        ]
+        want = {"events, open-ended": "primary", "attendance/days, today": "primary"}
+        for name, got, replica, primary in checks:
+            src = {replica: "replica", primary: "primary"}.get(got, "?")
+            print(f"{name:28} {got:7} -> {src}")
+            ok = ok and src == want.get(name, "replica")
+
+        print("webhook latency while the attendance scan runs on the primary:")
+        on_primary = _webhook_latency(c, co["edge_key"], SessionLocal, 5.0)
+        print("... and on the replica:")
+        on_replica = _webhook_latency(c, co["edge_key"], ReadSessionLocal, 5.0)
+        ok = ok and on_replica and on_primary
+
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000, int(sys.argv[2]) if len(sys.argv) > 2 else 200_000)
@@ -0,0 +1,109 @@
+"""Roster reconciliation against drifted fake ISAPI terminals.
+
+Seeds N users, fills three fake terminals with their roster directly, then
+drifts them: gate-0 stays in sync; gate-1 loses some users, has some
+renamed on the device and gains foreign ones; gate-2 is wiped and answers
+503 on 20% of requests. Runs a dry run, a real run and a second real run,
+and checks each roster ends identical to the users table while only the
+differences were written.
+
+Run:
+    python -m bench.reconcile_check [users]
+"""
+
+import sys
+import time
+
+from ._env import setup_env
+
+# provisioning stays off: rosters are seeded directly
+setup_env("recon", PROVISION_BACKOFF_SECONDS="0.02", PROVISION_RETRIES="6")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.isapi import user_info  # noqa: E402
+from app.main import app  # noqa: E402
+
+from .fake_isapi import FakeISAPI, serve_in_thread  # noqa: E402
+
+PORT = 18161
+
+
+def _run(c: TestClient, H: dict, cid: int, dry_run: bool) -> dict:
+    job = c.post(f"/companies/{cid}/devices/reconcile", headers=H, json={"dry_run": dry_run}).json()
+    while job["status"] not in ("done", "failed"):
+        time.sleep(0.05)
+        job = c.get(f"/companies/{cid}/jobs/{job['id']}", headers=H).json()
+    assert job["status"] == "done", job
+    return job["result"]
+
+
+def _show(title: str, res: dict) -> None:
+    print(f"{title}: total {res['total_ms']:.0f} ms (load {res['load_ms']:.0f} ms)")
+    for d in res["devices"]:
+        print(f"  {d['name']}: device={d.get('device_users')} pages={d.get('pages')} "
+              f"add={d.get('added', 0)}/{d.get('to_add')} upd={d.get('updated', 0)}/{d.get('to_update')} "
+              f"del={d.get('deleted', 0)}/{d.get('to_delete')} in_sync={d.get('in_sync')} "
+              f"ms={d['timings_ms']} errors={len(d['errors'])}")
+
+
+def main(n: int) -> None:
+    fakes = [FakeISAPI(), FakeISAPI(), FakeISAPI(fail_rate=0.2)]
+    urls = serve_in_thread(fakes, PORT)
+    ok = True
+
+    with TestClient(app) as c:
+        tok = c.post("/auth/login", json={"username": "admin", "password": "adminpw"}).json()["access_token"]
+        H = {"Authorization": f"Bearer {tok}"}
+        cid = c.post("/admin/companies", json={"name": "Recon"}, headers=H).json()["id"]
+        for i, url in enumerate(urls):
+            c.post(f"/companies/{cid}/devices", headers=H, json={
+                "name": f"gate-{i}", "base_url": url, "username": "admin", "password": "secret",
+            })
+        csv = "first_name,last_name\n" + "".join(f"U{i},Roster\n" for i in range(n))
+        r = c.post(f"/companies/{cid}/users/import", content=csv, headers={**H, "Content-Type": "text/csv"})
+        roster = {str(u["id"]): user_info(str(u["id"]), f"U{u['row'] - 1} Roster") for u in r.json()["users"]}
+
+        for f in fakes[:2]:
+            f.users = {k: dict(v) for k, v in roster.items()}
+        enos = sorted(roster, key=int)
+        for e in enos[:50]:
+            del fakes[1].users[e]
+        for e in enos[100:120]:
+            fakes[1].users[e]["name"] = "Edited On Device"
+        for i in range(30):
+            fakes[1].users[f"x{i}"] = user_info(f"x{i}", "Visitor")
+        expect = [(0, 0, 0), (50, 20, 30), (n, 0, 0)]
+
+        before = [f.requests for f in fakes]
+        res = _run(c, H, cid, dry_run=True)
+        _show("dry run", res)
+        for d, (a, u, x) in zip(res["devices"], expect):
+            ok = ok and (d["to_add"], d["to_update"], d["to_delete"]) == (a, u, x)
+        ok = ok and len(fakes[1].users) == n - 50 + 30 and not fakes[2].users
+
+        res = _run(c, H, cid, dry_run=False)
+        _show("reconcile", res)
+        for i, f in enumerate(fakes):
+            same = f.users.keys() == roster.keys() and all(
+                f.users[k]["name"] == roster[k]["name"] for k in roster
+            )
+            print(f"  gate-{i}: roster_match={same} requests={f.requests - before[i]} 503s={f.failures}")
+            ok = ok and same
+
+        before = [f.requests for f in fakes]
+        res = _run(c, H, cid, dry_run=False)
+        _show("second run", res)
+        writes = sum(d["added"] + d["updated"] + d["deleted"] for d in res["devices"])
+        print(f"  writes={writes} requests={[f.requests - b for f, b in zip(fakes, before)]}")
+        ok = ok and writes == 0
+
+        jobs = c.get("/admin/jobs", headers=H, params={"kind": "reconcile"}).json()
+        ok = ok and jobs["total"] == 3
+
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,161 @@
+"""Terminal registry: attribution, buffered counters, online/offline.
+
+Posts events from three terminals of one company (identified by MAC, by
+serial only, by IP only), plus a retried duplicate, and checks:
+- the webhook still issues the same number of statements (the registry is
+  memory only until flushed; measured with /admin/profiling),
+- GET /companies/{id}/terminals shows them before any flush (this
+  worker's buffer) and after it (rows), with the same counts,
+- a flush whose write fails keeps the sightings, merged with posts made
+  meanwhile, for the next one (and /admin/terminals/stats counts it),
+- event_logs.device_id carries the terminal key,
+- a terminal silent for DEVICE_OFFLINE_SECONDS is reported offline.
+
+Then seeds N events and times the listing against the GROUP BY over
+event_logs it replaces.
+
+Run:
+    python -m bench.terminal_registry_check [events]
+"""
+
+import datetime as dt
+import sys
+import time
+
+from ._env import setup_env
+
+setup_env(
+    "terminals",
+    PROFILING_ENABLED="true",
+    DEVICE_FLUSH_SECONDS="3600",  # flushed explicitly below
+    DEVICE_OFFLINE_SECONDS="2",
+)
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import func, insert  # noqa: E402
+
+from app import terminals  # noqa: E402
+from app.core.db import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import EventLog, Terminal  # noqa: E402
+from app.terminals import terminal_registry  # noqa: E402
+
+TERMINALS = {
+    "aa:bb:cc:00:00:01": {"macAddress": "AA:BB:CC:00:00:01", "ipAddress": "10.0.0.11"},
+    "DS-K1T671-0002": {"serialNumber": "DS-K1T671-0002", "ipAddress": "10.0.0.12"},
+    "10.0.0.13": {"ipAddress": "10.0.0.13"},
+}
+HOOK = "/hooks/hikvision/{edge_key}/acs_events"
+
+
+def _payload(ident: dict, n: int, emp: str = "1") -> dict:
+    return {**ident, "dateTime": "2026-10-01T09:00:00+05:00",
+            "AccessControllerEvent": {"employeeNoString": emp, "deviceName": "Gate", "serialNo": n}}
+
+
+def _counts(c: TestClient, cid: int, H: dict) -> dict:
+    body = c.get(f"/companies/{cid}/terminals", headers=H).json()
+    return {t["device_key"]: (t["event_count"], t["online"]) for t in body["items"]}
+
+
+def main(n_events: int) -> None:
+    ok = True
+    with TestClient(app) as c:
+        tok = c.post("/auth/login", json={"username": "admin", "password": "adminpw"}).json()["access_token"]
+        H = {"Authorization": f"Bearer {tok}"}
+        co = c.post("/admin/companies", json={"name": "Gates"}, headers=H).json()
+        cid = co["id"]
+        c.post(f"/companies/{cid}/users", headers=H, json={"first_name": "A", "last_name": "B"})
+        c.post("/admin/owners", headers=H, json={"username": "own", "password": "ownerpw1", "company_id": cid})
+        otok = c.post("/auth/login", json={"username": "own", "password": "ownerpw1"}).json()["access_token"]
+        OH = {"Authorization": f"Bearer {otok}"}
+        url = HOOK.format(edge_key=co["edge_key"])
+
+        c.delete("/admin/profiling", headers=H)
+        sent = {}
+        for k, (key, ident) in enumerate(TERMINALS.items()):
+            sent[key] = k + 2
+            for n in range(sent[key]):
+                c.post(url, json=_payload(ident, n))
+        c.post(url, json=_payload(TERMINALS["10.0.0.13"], 0))  # retry: alive, not counted
+        c.post(url, json={"dateTime": "2026-10-01T09:00:00+05:00"})  # no identifiers
+        hook = next(r for r in c.get("/admin/profiling/routes", headers=H).json()["items"]
+                    if r["route"] == HOOK)
+        print(f"webhook: {hook['count']} posts, {hook['avg_statements']} statements each on average")
+        ok = ok and hook["avg_statements"] <= 5
+
+        want = {key: (n, True) for key, n in sent.items()}
+        before = _counts(c, cid, OH)
+        print(f"before flush (buffer): {before}")
+        ok = ok and before == want
+
+        def broken(db, rows):
+            # a post lands while the failing write is in progress
+            c.post(url, json=_payload(TERMINALS["10.0.0.13"], 100))
+            raise RuntimeError("database unavailable")
+
+        upsert, terminals._upsert = terminals._upsert, broken
+        try:
+            terminal_registry.flush()
+        except RuntimeError:
+            pass
+        finally:
+            terminals._upsert = upsert
+        sent["10.0.0.13"] += 1
+        want = {key: (n, True) for key, n in sent.items()}
+        kept = _counts(c, cid, OH)
+        stats = c.get("/admin/terminals/stats", headers=H).json()
+        print(f"after a failed flush (buffer): {kept}, stats={stats}")
+        ok = ok and kept == want and stats["pending"] == 3 and stats["flush_failures"] == 1
+
+        flushed = terminal_registry.flush()
+        after = _counts(c, cid, OH)
+        print(f"after flush ({flushed} rows): {after}")
+        ok = ok and after == want and flushed == 3
+
+        db = SessionLocal()
+        by_device = dict(db.query(EventLog.device_id, func.count(EventLog.id))
+                         .filter(EventLog.company_id == cid).group_by(EventLog.device_id))
+        db.close()
+        print(f"event_logs by device_id: {by_device}")
+        ok = ok and by_device == {**sent, None: 1}
+
+        time.sleep(2.5)
+        c.post(url, json=_payload(TERMINALS["aa:bb:cc:00:00:01"], 99))
+        body = c.get(f"/companies/{cid}/terminals", headers=OH).json()
+        status = {t["device_key"]: t["online"] for t in body["items"]}
+        print(f"after 2.5 s, one terminal posting again: online={body['online']}/{body['total']} {status}")
+        ok = ok and body["online"] == 1 and status["aa:bb:cc:00:00:01"]
+        ok = ok and c.get(f"/companies/{cid}/terminals", headers=H).status_code == 200
+        terminal_registry.flush()
+
+        db = SessionLocal()
+        t0 = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc)
+        keys = list(TERMINALS)
+        rows = [{"event_id": f"bulk-{i}", "company_id": cid, "user_id": None, "employee_no": None,
+                 "device_id": keys[i % 3], "event_type": "access", "payload": {}, "ts": t0 + dt.timedelta(seconds=i)}
+                for i in range(n_events)]
+        for i in range(0, n_events, 10_000):
+            db.execute(insert(EventLog), rows[i:i + 10_000])
+        db.commit()
+
+        t = time.perf_counter()
+        for _ in range(20):
+            c.get(f"/companies/{cid}/terminals", headers=OH)
+        listing = (time.perf_counter() - t) / 20 * 1000
+        t = time.perf_counter()
+        for _ in range(5):
+            db.query(EventLog.device_id, func.count(EventLog.id), func.max(EventLog.ts)) \
+                .filter(EventLog.company_id == cid).group_by(EventLog.device_id).all()
+        scan = (time.perf_counter() - t) / 5 * 1000
+        stored = db.query(func.count()).select_from(Terminal).scalar()
+        db.close()
+        print(f"with {n_events} events: GET /terminals {listing:.1f} ms vs GROUP BY over event_logs "
+              f"{scan:.1f} ms ({stored} terminal rows)")
+
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,144 @@
+"""user_activity: correctness of incremental maintenance + user list latency.
+
+Seeds a company with N users and M events (SQLite), builds user_activity
+with the rebuild command's function, ingests more events through the
+webhook, and checks the table equals a fresh aggregate over event_logs.
+Then times GET /users with enrolled=true|false and sort=-last_seen against
+the previous correlated EXISTS query over event_logs.
+
+Run:
+    python -m bench.user_activity_check [users] [events]
+"""
+
+import datetime as dt
+import random
+import statistics
+import sys
+import time
+
+from ._env import setup_env
+
+setup_env("activity")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import func, insert  # noqa: E402
+
+from app.core.db import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import EventLog, User, UserActivity  # noqa: E402
+from app.user_activity import rebuild  # noqa: E402
+
+T0 = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc)
+
+
+def _median_ms(fn, n: int = 7) -> float:
+    xs = []
+    for _ in range(n):
+        t = time.perf_counter()
+        fn()
+        xs.append((time.perf_counter() - t) * 1000)
+    return statistics.median(xs)
+
+
+def _old_list(cid: int, enrolled: bool) -> None:
+    """The list_users_ep query before user_activity (count + first page)."""
+    db = SessionLocal()
+    try:
+        qry = db.query(User.id, User.first_name, User.last_name).filter(User.company_id == cid)
+        ex = db.query(EventLog.id).filter(EventLog.company_id == cid, EventLog.user_id == User.id).exists()
+        qry = qry.filter(ex) if enrolled else qry.filter(~ex)
+        qry.count()
+        qry.order_by(User.id.desc()).limit(50).all()
+    finally:
+        db.close()
+
+
+def _aggregate(cid: int) -> dict:
+    db = SessionLocal()
+    try:
+        rows = (
+            db.query(EventLog.user_id, func.min(EventLog.ts), func.max(EventLog.ts), func.count(EventLog.id))
+            .filter(EventLog.company_id == cid, EventLog.user_id.is_not(None))
+            .group_by(EventLog.user_id)
+        )
+        return {r[0]: (str(r[1]), str(r[2]), r[3]) for r in rows}
+    finally:
+        db.close()
+
+
+def _table(cid: int) -> dict:
+    db = SessionLocal()
+    try:
+        rows = db.query(UserActivity).filter(UserActivity.company_id == cid)
+        return {a.user_id: (str(a.first_seen_at), str(a.last_seen_at), a.event_count) for a in rows}
+    finally:
+        db.close()
+
+
+def main(n_users: int, n_events: int) -> None:
+    ok = True
+    with TestClient(app) as c:
+        tok = c.post("/auth/login", json={"username": "admin", "password": "adminpw"}).json()["access_token"]
+        H = {"Authorization": f"Bearer {tok}"}
+        co = c.post("/admin/companies", json={"name": "Activity"}, headers=H).json()
+        cid = co["id"]
+        csv = "first_name,last_name\n" + "".join(f"U{i},Act\n" for i in range(n_users))
+        r = c.post(f"/companies/{cid}/users/import", content=csv, headers={**H, "Content-Type": "text/csv"})
+        ids = [u["id"] for u in r.json()["users"]]
+        seen = ids[: int(len(ids) * 0.7)]
+
+        t = time.perf_counter()
+        db = SessionLocal()
+        batch = []
+        for i in range(n_events):
+            uid = random.choice(seen) if random.random() < 0.95 else None
+            batch.append({
+                "event_id": f"seed{i}", "company_id": cid, "user_id": uid,
+                "employee_no": str(uid) if uid else "999999", "event_type": "access", "payload": {},
+                "ts": T0 + dt.timedelta(seconds=random.randint(0, 86400 * 200)),
+            })
+            if len(batch) == 10_000:
+                db.execute(insert(EventLog), batch)
+                batch = []
+        if batch:
+            db.execute(insert(EventLog), batch)
+        db.commit()
+        seed_s = time.perf_counter() - t
+
+        t = time.perf_counter()
+        n = rebuild(db, cid)
+        db.close()
+        print(f"seeded {n_users} users / {n_events} events in {seed_s:.1f}s; "
+              f"rebuild: {n} users with events in {(time.perf_counter() - t) * 1000:.0f} ms")
+
+        # Incremental path: webhook events for seen and never-seen users, plus duplicates.
+        for i in range(300):
+            uid = random.choice(ids)
+            ts = T0 + dt.timedelta(days=random.randint(-30, 230), seconds=i)
+            p = {"AccessControllerEvent": {"employeeNoString": str(uid)}, "dateTime": ts.isoformat()}
+            for _ in range(2 if i % 10 == 0 else 1):  # every 10th is sent twice
+                assert c.post(f"/hooks/hikvision/{co['edge_key']}/acs_events", json=p).status_code == 200
+        same = _table(cid) == _aggregate(cid)
+        print(f"incremental == aggregate over event_logs: {same}")
+        ok = ok and same
+
+        enrolled = c.get(f"/companies/{cid}/users", headers=H, params={"enrolled": "true", "limit": 1}).json()["total"]
+        ok = ok and enrolled == len(_aggregate(cid))
+        items = c.get(f"/companies/{cid}/users", headers=H, params={"sort": "-last_seen", "limit": 200}).json()["items"]
+        lasts = [x["last_seen_at"] for x in items]
+        ok = ok and lasts == sorted(lasts, reverse=True) and items[0]["event_count"] > 0
+
+        for enr in (True, False):
+            old = _median_ms(lambda: _old_list(cid, enr), n=1)
+            new = _median_ms(lambda: c.get(f"/companies/{cid}/users", headers=H, params={"enrolled": str(enr).lower()}))
+            print(f"enrolled={str(enr).lower():5}  old EXISTS query {old:7.1f} ms   GET /users {new:6.1f} ms")
+        new = _median_ms(lambda: c.get(f"/companies/{cid}/users", headers=H, params={"sort": "-last_seen"}))
+        base = _median_ms(lambda: c.get(f"/companies/{cid}/users", headers=H))
+        print(f"sort=-last_seen GET /users {new:6.1f} ms   (default sort {base:.1f} ms)")
+
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000, int(sys.argv[2]) if len(sys.argv) > 2 else 100_000)
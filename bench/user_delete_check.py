@@ -0,0 +1,112 @@
+"""User delete: fast response, batched event unlinking in the background.
+
+Seeds two users with N events each (SQLite). User A is unlinked the old
+way, one UPDATE inside the request transaction, to time it. User B (the
+newest id) is deleted through the API. While the unlink job runs, a new
+user is created (SQLite hands out B's id again) and webhook events are
+posted for that employee number. Checks: B's old events end unmapped,
+A's other rows and the new user's events are untouched, progress was
+visible, and reports webhook latency during the job.
+
+Run:
+    python -m bench.user_delete_check [events]
+"""
+
+import datetime as dt
+import statistics
+import sys
+import time
+
+from ._env import setup_env
+
+setup_env("delete", JOB_PROGRESS_FLUSH_SECONDS="0.1")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import func, insert, update  # noqa: E402
+
+from app.core.db import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import EventLog  # noqa: E402
+
+T0 = dt.datetime(2026, 1, 1, tzinfo=dt.timezone.utc)
+
+
+def _seed(cid: int, uid: int, n: int) -> None:
+    db = SessionLocal()
+    rows = [
+        {"event_id": f"s{uid}-{i}", "company_id": cid, "user_id": uid, "employee_no": str(uid),
+         "event_type": "access", "payload": {}, "ts": T0 + dt.timedelta(seconds=i)}
+        for i in range(n)
+    ]
+    for i in range(0, n, 10_000):
+        db.execute(insert(EventLog), rows[i:i + 10_000])
+    db.commit()
+    db.close()
+
+
+def _linked(cid: int, uid: int) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(func.count(EventLog.id)).filter(EventLog.company_id == cid, EventLog.user_id == uid).scalar()
+    finally:
+        db.close()
+
+
+def main(n: int) -> None:
+    ok = True
+    with TestClient(app) as c:
+        tok = c.post("/auth/login", json={"username": "admin", "password": "adminpw"}).json()["access_token"]
+        H = {"Authorization": f"Bearer {tok}"}
+        co = c.post("/admin/companies", json={"name": "Delete"}, headers=H).json()
+        cid = co["id"]
+        a = c.post(f"/companies/{cid}/users", headers=H, json={"first_name": "A", "last_name": "Old"}).json()["id"]
+        b = c.post(f"/companies/{cid}/users", headers=H, json={"first_name": "B", "last_name": "New"}).json()["id"]
+        _seed(cid, a, n)
+        _seed(cid, b, n)
+
+        db = SessionLocal()
+        t = time.perf_counter()
+        db.execute(
+            update(EventLog).where(EventLog.company_id == cid, EventLog.user_id == a).values(user_id=None)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        db.close()
+        print(f"old: one UPDATE of {n} events held the write lock {(time.perf_counter() - t) * 1000:.0f} ms")
+
+        t = time.perf_counter()
+        r = c.delete(f"/companies/{cid}/users/{b}", headers=H).json()
+        print(f"new: DELETE /users/{b} answered in {(time.perf_counter() - t) * 1000:.0f} ms, job {r['job_id']}")
+
+        new = c.post(f"/companies/{cid}/users", headers=H, json={"first_name": "C", "last_name": "Reuse"}).json()["id"]
+        print(f"new user got id {new} (deleted id was {b})")
+
+        lat, seen, k = [], set(), 0
+        while True:
+            job = c.get(f"/companies/{cid}/jobs/{r['job_id']}", headers=H).json()
+            if job["progress"].get("unlinked"):
+                seen.add(job["progress"]["unlinked"])
+            if job["status"] in ("done", "failed"):
+                break
+            p = {"AccessControllerEvent": {"employeeNoString": str(new)}, "dateTime": T0.isoformat(), "k": k}
+            t = time.perf_counter()
+            assert c.post(f"/hooks/hikvision/{co['edge_key']}/acs_events", json=p).status_code == 200
+            lat.append((time.perf_counter() - t) * 1000)
+            k += 1
+        print(f"job {job['status']}: {job['result']} progress snapshots={len(seen)}")
+        if lat:
+            lat.sort()
+            print(f"webhook during job: n={len(lat)} p50={statistics.median(lat):.1f} ms "
+                  f"max={lat[-1]:.1f} ms")
+        ok = ok and job["status"] == "done" and job["result"]["unlinked"] == n and len(seen) > 1
+
+        left = _linked(cid, b) if new != b else _linked(cid, b) - k
+        print(f"old events still linked to deleted user: {left}; new user's events linked: {_linked(cid, new)}/{k}")
+        ok = ok and left == 0 and _linked(cid, new) == k
+
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
@@ -0,0 +1,135 @@
+"""Multi-worker WebSocket fan-out check.
+
+Starts two uvicorn processes (standing in for two workers) that share one
+SQLite database and one broadcast backend, connects a dashboard socket to
+each, posts webhook events to worker B only and verifies that every event
+reaches the sockets on both workers. Prints delivery counts and latency.
+
+Run:
+    python -m bench.ws_multiworker [unix|postgres] [events]
+
+For postgres, set WS_PG_URL to a reachable database (it is only used for
+LISTEN/NOTIFY; the app data still goes to a temp SQLite file).
+"""
+
+import asyncio
+import datetime as dt
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import websockets
+
+PORTS = (18031, 18032)
+
+
+def _http(port: int, method: str, path: str, body=None, token=None):
+    req = urllib.request.Request(
+        f"http://127.0.0.1:{port}{path}",
+        method=method,
+        data=json.dumps(body).encode() if body is not None else None,
+        headers={"Content-Type": "application/json", **({"Authorization": f"Bearer {token}"} if token else {})},
+    )
+    with urllib.request.urlopen(req, timeout=10) as r:
+        return json.loads(r.read() or b"null")
+
+
+def _wait_up(port: int, proc: subprocess.Popen) -> None:
+    for _ in range(100):
+        if proc.poll() is not None:
+            raise SystemExit(f"worker on :{port} exited with {proc.returncode}")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return
+        except Exception:
+            time.sleep(0.1)
+    raise SystemExit(f"worker on :{port} did not start")
+
+
+async def _collect(url: str, want: int, sink: list, ready: asyncio.Event) -> None:
+    async with websockets.connect(url) as ws:
+        ready.set()
+        while len(sink) < want:
+            msg = json.loads(await asyncio.wait_for(ws.recv(), timeout=10))
+            if msg["type"] == "events.access":
+                sink.append((time.perf_counter(), msg["data"]["payload"]["seq"]))
+
+
+async def _run(n: int, token: str, cid: int, edge_key: str) -> None:
+    got_a: list = []
+    got_b: list = []
+    ready_a, ready_b = asyncio.Event(), asyncio.Event()
+    tasks = [
+        asyncio.create_task(_collect(f"ws://127.0.0.1:{PORTS[0]}/ws/company/{cid}?token={token}", n, got_a, ready_a)),
+        asyncio.create_task(_collect(f"ws://127.0.0.1:{PORTS[1]}/ws/company/{cid}?token={token}", n, got_b, ready_b)),
+    ]
+    await ready_a.wait()
+    await ready_b.wait()
+    await asyncio.sleep(0.2)
+
+    sent_at = {}
+    base = dt.datetime(2026, 10, 19, 8, 0, tzinfo=dt.timezone.utc)
+    for i in range(n):
+        p = {
+            "AccessControllerEvent": {"employeeNoString": "999"},
+            "dateTime": (base + dt.timedelta(seconds=i)).isoformat(),
+            "seq": i,
+        }
+        sent_at[i] = time.perf_counter()
+        await asyncio.to_thread(_http, PORTS[1], "POST", f"/hooks/hikvision/{edge_key}/acs_events", p)
+    try:
+        await asyncio.wait_for(asyncio.gather(*tasks), timeout=15)
+    except asyncio.TimeoutError:
+        pass
+
+    for name, got in (("worker A (remote)", got_a), ("worker B (local)", got_b)):
+        lat = sorted((t - sent_at[s]) * 1000 for t, s in got)
+        p50 = lat[len(lat) // 2] if lat else float("nan")
+        print(f"{name:18s} received {len(got)}/{n}  p50 {p50:.1f} ms")
+    ok = sorted(s for _, s in got_a) == list(range(n)) and sorted(s for _, s in got_b) == list(range(n))
+    print("OK" if ok else "FAILED")
+    if not ok:
+        raise SystemExit(1)
+
+
+def main() -> None:
+    backend = sys.argv[1] if len(sys.argv) > 1 else "unix"
+    n = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    tmp = tempfile.mkdtemp(prefix="ws-mw-")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp}/app.db",
+        "ROOT_ADMIN_PASSWORD": "adminpw",
+        "PASSWORD_PBKDF2_ITERATIONS": "1000",
+        "LOG_DIR": f"{tmp}/logs",
+        "LOG_LEVEL": "WARNING",
+        "WS_BACKEND": backend,
+        "WS_UNIX_SOCKET": f"{tmp}/ws.sock",
+    }
+    procs = []
+    try:
+        for port in PORTS:  # sequential: both run create_all/bootstrap on startup
+            p = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+                env=env,
+            )
+            procs.append(p)
+            _wait_up(port, p)
+
+        a = PORTS[0]
+        token = _http(a, "POST", "/auth/login", {"username": "admin", "password": "adminpw"})["access_token"]
+        co = _http(a, "POST", "/admin/companies", {"name": "Acme"}, token)
+        asyncio.run(_run(n, token, co["id"], co["edge_key"]))
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+
+
+if __name__ == "__main__":
+    main()
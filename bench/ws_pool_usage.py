@@ -0,0 +1,98 @@
+"""Open many dashboard sockets and check they hold no DB pool connections.
+
+Starts the app under uvicorn (SQLite file DB, default pool: 5 + 10 overflow),
+connects N websockets for one company (half with a bearer token, half with
+the legacy api_key, which always queries the DB), then reads /admin/ws/stats
+and times an ordinary API request while all sockets are open.
+
+Run:
+    python -m bench.ws_pool_usage [sockets]
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+import websockets
+
+PORT = 18037
+
+
+def _http(method: str, path: str, body=None, token=None):
+    req = urllib.request.Request(
+        f"http://127.0.0.1:{PORT}{path}",
+        method=method,
+        data=json.dumps(body).encode() if body is not None else None,
+        headers={"Content-Type": "application/json", **({"Authorization": f"Bearer {token}"} if token else {})},
+    )
+    with urllib.request.urlopen(req, timeout=30) as r:
+        return json.loads(r.read() or b"null")
+
+
+async def _run(n: int, token: str, co: dict) -> None:
+    base = f"ws://127.0.0.1:{PORT}/ws/company/{co['id']}"
+    urls = [f"{base}?token={token}", f"{base}?api_key={co['api_key']}"]
+    gate = asyncio.Semaphore(50)
+
+    async def connect(i: int):
+        url = urls[i % 2]
+        async with gate:
+            ws = await websockets.connect(url, max_queue=None)
+            hello = json.loads(await ws.recv())
+            assert hello["type"] == "ws.hello", hello
+            return ws
+
+    t0 = time.perf_counter()
+    socks = await asyncio.gather(*(connect(i) for i in range(n)))
+    print(f"{len(socks)} sockets open in {time.perf_counter() - t0:.1f}s")
+
+    stats = await asyncio.to_thread(_http, "GET", "/admin/ws/stats", None, token)
+    t0 = time.perf_counter()
+    await asyncio.to_thread(_http, "GET", "/auth/me", None, token)
+    me_ms = (time.perf_counter() - t0) * 1000
+    print(f"clients={stats['clients']} db_pool_checked_out={stats['db_pool_checked_out']} "
+          f"(incl. the stats request itself)  GET /auth/me {me_ms:.1f} ms")
+    await asyncio.gather(*(ws.close() for ws in socks))
+    ok = stats["clients"] == n and stats["db_pool_checked_out"] <= 1
+    print("OK" if ok else "FAILED")
+    if not ok:
+        raise SystemExit(1)
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    tmp = tempfile.mkdtemp(prefix="ws-pool-")
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{tmp}/app.db",
+        "ROOT_ADMIN_PASSWORD": "adminpw",
+        "PASSWORD_PBKDF2_ITERATIONS": "1000",
+        "LOG_DIR": f"{tmp}/logs",
+        "LOG_LEVEL": "WARNING",
+    }
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT), "--log-level", "warning"],
+        env=env,
+    )
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{PORT}/docs", timeout=1)
+                break
+            except Exception:
+                time.sleep(0.1)
+        token = _http("POST", "/auth/login", {"username": "admin", "password": "adminpw"})["access_token"]
+        co = _http("POST", "/admin/companies", {"name": "Acme"}, token)
+        asyncio.run(_run(n, token, co))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()